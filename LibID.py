@@ -9,22 +9,32 @@
 
 import argparse
 import datetime
+import os
+import resource
 import subprocess
 import time
+from collections import OrderedDict
 from itertools import izip, repeat
 from multiprocessing import Pool
-from os import path
+from os import makedirs, path
 
 import glob2
 from datasketch import MinHashLSHEnsemble
 
-from module import profiler
+from module import call_graph_matching, profiler, server
 from module.analyzer import LibAnalyzer
-from module.config import (DEX2JAR_PATH, LOGGER, LSH_PERM_NUM, LSH_THRESHOLD,
-                           MODE)
+from module.catalogue import LibraryCatalogue
+from module.config import (BIP_SOLVER, BIP_THREADS, DEX2JAR_PATH,
+                           LIB_MATCHING_THREADS, LOGGER, LSH_PERM_NUM,
+                           LSH_THRESHOLD, MODE)
 
 LSH = None
 LIB_RELATIONSHIP_GRAPHS = dict()
+# The libraries and classes of the LSH, shared by all apps
+LIB_CATALOGUE = None
+
+# The app binaries that can be detected without profiling them first
+APP_BINARY_EXTENSIONS = (".apk", ".dex")
 
 # Helper methods
 # ----------------------------------------------
@@ -37,11 +47,73 @@ def _get_output_path(file_path, output_folder):
     return output_path
 
 
-def _export_result_to_json(analyzer, output_path, start_time):
+def _find_profiles(folder):
+    profiles = []
+    for (extension, _) in profiler.PROFILE_FORMATS.values():
+        profiles += glob2.glob(path.join(folder, "**/*" + extension))
+
+    return profiles
+
+
+def _find_apps(folder):
+    # An app profile is preferred to the binary it was created from
+    apps = OrderedDict()
+    for extension in APP_BINARY_EXTENSIONS:
+        for app_path in glob2.glob(path.join(folder, "**/*" + extension)):
+            apps[path.splitext(path.basename(app_path))[0]] = app_path
+    for app_path in _find_profiles(folder):
+        apps[path.splitext(path.basename(app_path))[0]] = app_path
+
+    return apps.values()
+
+
+def _get_result_json_info(analyzer, start_time):
     json_info = analyzer.get_matched_libs_json_info()
 
     end_time = time.time()
     json_info["time"] = end_time - start_time
+
+    return json_info
+
+
+def _get_memory_usage():
+    """Get the memory usage of the current process.
+
+    Returns:
+        tuple: (the resident set size, the private resident memory not shared with other processes) in MB. The private memory is None if it is unknown, in which case the peak resident set size is returned.
+    """
+    usage = dict()
+    try:
+        with open("/proc/self/smaps_rollup") as fd:
+            for line in fd:
+                fields = line.split()
+                if len(fields) == 3 and fields[2] == "kB":
+                    usage[fields[0][:-1]] = int(fields[1]) / 1024.0
+    except IOError:
+        # ru_maxrss is in KB on Linux
+        return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+                None)
+
+    return (usage["Rss"], usage["Private_Clean"] + usage["Private_Dirty"])
+
+
+def _log_workers_memory_usage(results):
+    workers = dict()
+    for pid, rss, private in results:
+        if pid not in workers or rss > workers[pid][0]:
+            workers[pid] = (rss, private)
+
+    for pid in sorted(workers):
+        (rss, private) = workers[pid]
+        if private is None:
+            LOGGER.info("Worker %d: peak RSS %.1fMB", pid, rss)
+        else:
+            LOGGER.info("Worker %d: RSS %.1fMB, private %.1fMB", pid, rss,
+                        private)
+
+
+def _export_result_to_json(analyzer, output_path, start_time):
+    json_info = _get_result_json_info(analyzer, start_time)
     profiler.write_to_json(output_path, json_info)
 
     LOGGER.info("The result of %s is stored at %s", path.basename(output_path),
@@ -52,8 +124,11 @@ def _export_result_to_json(analyzer, output_path, start_time):
 # ----------------------------------------------
 
 
-def load_LSH(lib_profiles, mode=MODE.SCALABLE, repackage=False,
-             processes=None):
+def load_LSH(lib_profiles,
+             mode=MODE.SCALABLE,
+             repackage=False,
+             processes=None,
+             freeze=False):
     """Load library profiles to an LSH object.
     
     Args:
@@ -61,9 +136,10 @@ def load_LSH(lib_profiles, mode=MODE.SCALABLE, repackage=False,
         mode (<enum 'MODE'>, optional): Defaults to MODE.SCALABLE. The detection mode. Either MODE.ACCURATE or MODE.SCALABLE. See the paper for more details.
         repackage (bool, optional): Defaults to False. Should LibID consider classes repackaging? This should only be enabled if already know classes repackaging is applied. 
         processes (int, optional): Defaults to None. The number of processes to use. If processes is None then the number returned by cpu_count() is used.
+        freeze (bool, optional): Defaults to False. Should the LSH be converted to a compact read-only representation (as if it was saved and opened by `open_LSH`)? A frozen LSH stays shared by the worker processes forked after loading.
     """
 
-    global LSH, LIB_RELATIONSHIP_GRAPHS
+    global LSH, LIB_RELATIONSHIP_GRAPHS, LIB_CATALOGUE
 
     weights = (0.5, 0.5) if repackage else (0.1, 0.9)
     LSH = MinHashLSHEnsemble(
@@ -83,11 +159,170 @@ def load_LSH(lib_profiles, mode=MODE.SCALABLE, repackage=False,
 
     start_time = time.time()
     LSH.index(minhash_list)
+    if freeze:
+        LSH = LSH.freeze()
+    LIB_CATALOGUE = LibraryCatalogue(LSH)
     end_time = time.time()
 
     LOGGER.info("LSH indexed. Duration: %fs", end_time - start_time)
 
 
+def open_LSH(lib_index, mode=MODE.SCALABLE, repackage=False, processes=None):
+    """Open an LSH index file created by `build_LSH_index`.
+
+    The index file is memory mapped, so the library MinHashes are neither recomputed nor copied, and worker processes share the same pages.
+
+    Args:
+        lib_index (str): The path of the LSH index file.
+        mode (<enum 'MODE'>, optional): Defaults to MODE.SCALABLE. The detection mode. Either MODE.ACCURATE or MODE.SCALABLE. See the paper for more details.
+        repackage (bool, optional): Defaults to False. Should LibID consider classes repackaging? This should only be enabled if already know classes repackaging is applied.
+        processes (int, optional): Defaults to None. The number of processes to use. If processes is None then the number returned by cpu_count() is used.
+    """
+
+    global LSH, LIB_RELATIONSHIP_GRAPHS, LIB_CATALOGUE
+
+    start_time = time.time()
+    LSH = MinHashLSHEnsemble.load(lib_index)
+    LIB_CATALOGUE = LibraryCatalogue(LSH)
+    end_time = time.time()
+
+    LOGGER.info("LSH index %s opened. Duration: %fs", lib_index,
+                end_time - start_time)
+
+    if LSH.metadata["repackage"] != repackage:
+        LOGGER.warning(
+            "The LSH index was built %s considering classes repackaging. Rebuild it with%s -r for the best results",
+            "with" if LSH.metadata["repackage"] else "without",
+            "" if repackage else "out")
+
+    if mode == MODE.ACCURATE:
+        LIB_RELATIONSHIP_GRAPHS = profiler.parallel_load_libs_relationship_graphs(
+            lib_profiles=LSH.metadata["profiles"],
+            repackage=repackage,
+            processes=processes)
+
+
+def build_LSH_index(lib_folder=None,
+                    lib_profiles=None,
+                    output_path='libs.lsh',
+                    repackage=False,
+                    processes=None):
+    """Index library profiles and save the LSH to a file, which can be used by `search_libs_in_apps` instead of the library profiles.
+
+    Must provide either `lib_folder` or `lib_profiles`.
+
+    Args:
+        lib_folder (str, optional): Defaults to None. The folder that contains library profiles.
+        lib_profiles (list, optional): Defaults to None. The list of library profiles.
+        output_path (str, optional): Defaults to 'libs.lsh'. The path of the LSH index file.
+        repackage (bool, optional): Defaults to False. Should LibID consider classes repackaging? This should only be enabled if already know classes repackaging is applied.
+        processes (int, optional): Defaults to None. The number of processes to use. If processes is None then the number returned by cpu_count() is used.
+    """
+
+    if not lib_profiles:
+        if lib_folder:
+            lib_profiles = _find_profiles(lib_folder)
+
+    if not lib_profiles:
+        LOGGER.error("No library profiles found.")
+        return
+
+    load_LSH(
+        lib_profiles,
+        mode=MODE.SCALABLE,
+        repackage=repackage,
+        processes=processes)
+
+    output_dir = path.dirname(output_path)
+    if output_dir and not path.exists(output_dir):
+        makedirs(output_dir)
+
+    LSH.save(
+        output_path,
+        metadata={
+            "profiles": [path.abspath(p) for p in lib_profiles],
+            "repackage": repackage
+        })
+
+    LOGGER.info("The LSH index is stored at %s", output_path)
+
+
+def update_LSH_index(lib_index,
+                     lib_folder=None,
+                     lib_profiles=None,
+                     removed_libs=None,
+                     output_path=None,
+                     processes=None):
+    """Add library profiles to, or remove libraries from, an LSH index file created by `build_LSH_index` without rebuilding it.
+
+    A library that is already indexed is replaced by its new profile.
+
+    Args:
+        lib_index (str): The path of the LSH index file.
+        lib_folder (str, optional): Defaults to None. The folder that contains the library profiles to add.
+        lib_profiles (list, optional): Defaults to None. The list of library profiles to add.
+        removed_libs (list, optional): Defaults to None. The libraries to remove, named as "$(name)_$(version)" (e.g., okhttp_3.0.0).
+        output_path (str, optional): Defaults to None. The path of the updated LSH index file. If output_path is None then `lib_index` is overwritten.
+        processes (int, optional): Defaults to None. The number of processes to use. If processes is None then the number returned by cpu_count() is used.
+    """
+
+    global LSH
+
+    if not lib_profiles:
+        if lib_folder:
+            lib_profiles = _find_profiles(lib_folder)
+        else:
+            lib_profiles = []
+
+    LSH = MinHashLSHEnsemble.load(lib_index)
+    repackage = LSH.metadata["repackage"]
+
+    minhash_list = []
+    if lib_profiles:
+        (minhash_list, _) = profiler.parallel_load_libs_profile(
+            lib_profiles=lib_profiles,
+            mode=MODE.SCALABLE,
+            repackage=repackage,
+            processes=processes)
+
+    # Libraries that are already indexed are replaced
+    removed_libs = set(removed_libs or []).union(
+        key.split("|")[0] for key, _, _ in minhash_list)
+
+    LOGGER.info("Start updating LSH ...")
+
+    start_time = time.time()
+
+    removed_keys = [
+        key for key in LSH.keys() if key.split("|")[0] in removed_libs
+    ]
+    for key in removed_keys:
+        LSH.remove(key)
+
+    for key, minhash, size in minhash_list:
+        LSH.insert(key, minhash, size)
+
+    end_time = time.time()
+
+    LOGGER.info("LSH updated. Removed classes: %d, added classes: %d, duration: %fs",
+                len(removed_keys), len(minhash_list), end_time - start_time)
+
+    profiles = [
+        p for p in LSH.metadata["profiles"]
+        if path.splitext(path.basename(p))[0] not in removed_libs
+    ] + [path.abspath(p) for p in lib_profiles]
+
+    output_path = output_path if output_path else lib_index
+    LSH.save(
+        output_path,
+        metadata={
+            "profiles": profiles,
+            "repackage": repackage
+        })
+
+    LOGGER.info("The LSH index is stored at %s", output_path)
+
+
 # Profiling related methods
 # ----------------------------------------------
 
@@ -95,21 +330,25 @@ def load_LSH(lib_profiles, mode=MODE.SCALABLE, repackage=False,
 def _profile_apps(apk_files,
                   output_folder=None,
                   processes=None,
-                  overwrite=False):
+                  overwrite=False,
+                  profile_format="json"):
     if apk_files:
         profiler.parallel_profiling_binaries(
             apk_files,
             output_folder,
             "app",
             processes=processes,
-            overwrite=overwrite)
+            overwrite=overwrite,
+            profile_format=profile_format)
 
 
 def _profile_libs(dex_files,
                   jar_files,
                   output_folder="profiles",
                   processes=None,
-                  overwrite=False):
+                  overwrite=False,
+                  profile_format="json",
+                  minhash=False):
     # Convert jar file to dex file
     for f in jar_files:
         dex_file_path = path.join(
@@ -136,15 +375,19 @@ def _profile_libs(dex_files,
             output_folder,
             "lib",
             processes=processes,
-            overwrite=overwrite)
+            overwrite=overwrite,
+            profile_format=profile_format,
+            minhash=minhash)
 
 
 def profile_binaries(base_path=None,
                      file_paths=None,
                      output_folder='profiles',
                      processes=None,
-                     overwrite=False):
-    """Profile app/library binaries to JSON files.
+                     overwrite=False,
+                     profile_format="json",
+                     minhash=False):
+    """Profile app/library binaries to JSON (or binary) files.
 
     Must provide either `base_path` or `file_paths`. 
 
@@ -154,6 +397,8 @@ def profile_binaries(base_path=None,
         output_folder (str, optional): Defaults to 'profiles'. The folder to store profiles.
         processes (int, optional): Defaults to None. The number of processes to use. If processes is None then the number returned by cpu_count() is used.
         overwrite (bool, optional): Defaults to False. Should LibID overwrite the output file if it exists?
+        profile_format (str, optional): Defaults to "json". The profile format. Either "json" or "binary".
+        minhash (bool, optional): Defaults to False. Should LibID store the MinHashes of library classes in library profiles? This speeds up loading library profiles.
     """
 
     if not file_paths:
@@ -172,44 +417,108 @@ def profile_binaries(base_path=None,
         apk_files,
         output_folder=output_folder,
         processes=processes,
-        overwrite=overwrite)
+        overwrite=overwrite,
+        profile_format=profile_format)
     _profile_libs(
         dex_files,
         jar_files,
         output_folder=output_folder,
         processes=processes,
-        overwrite=overwrite)
+        overwrite=overwrite,
+        profile_format=profile_format,
+        minhash=minhash)
 
 
 # Searching related methods
 # ----------------------------------------------
 
 
-def _search_libs_in_app(profile_n_mode_n_output_n_repackage_n_exclude):
+def _get_libraries_in_app(app_path,
+                          mode,
+                          repackage,
+                          exclude_builtin,
+                          profile_folder=None,
+                          profile_format="json",
+                          solver=None,
+                          bip_cache_path=None,
+                          lib_threads=None,
+                          bip_threads=None):
     global LSH
 
-    (app_profile, mode, output_folder, repackage,
-     exclude_builtin) = profile_n_mode_n_output_n_repackage_n_exclude
+    analyzer = LibAnalyzer(app_path)
+    # App binaries (rather than profiles) are profiled on the fly
+    analyzer.get_classes_signatures()
+    if profile_folder and path.splitext(app_path)[1] in APP_BINARY_EXTENSIONS:
+        profiler.write_profile(
+            analyzer,
+            profiler.get_profile_path(app_path, profile_folder, "app",
+                                      profile_format),
+            "app",
+            profile_format=profile_format)
+
+    analyzer.get_libraries(
+        LSH,
+        mode=mode,
+        repackage=repackage,
+        LIB_RELATIONSHIP_GRAPHS=LIB_RELATIONSHIP_GRAPHS,
+        exclude_builtin=exclude_builtin,
+        solver=solver,
+        catalogue=LIB_CATALOGUE,
+        bip_cache_path=bip_cache_path,
+        lib_threads=lib_threads,
+        bip_threads=bip_threads)
+
+    return analyzer
+
+
+def _search_libs_in_app(search_info):
+    (app_profile, mode, output_folder, repackage, exclude_builtin,
+     profile_folder, profile_format, solver, bip_cache_path,
+     lib_threads, bip_threads) = search_info
 
     output_path = _get_output_path(app_profile, output_folder)
 
     try:
         start_time = time.time()
-        analyzer = LibAnalyzer(app_profile)
-        analyzer.get_libraries(
-            LSH,
-            mode=mode,
-            repackage=repackage,
-            LIB_RELATIONSHIP_GRAPHS=LIB_RELATIONSHIP_GRAPHS,
-            exclude_builtin=exclude_builtin)
+        analyzer = _get_libraries_in_app(
+            app_profile,
+            mode,
+            repackage,
+            exclude_builtin,
+            profile_folder=profile_folder,
+            profile_format=profile_format,
+            solver=solver,
+            bip_cache_path=bip_cache_path,
+            lib_threads=lib_threads,
+            bip_threads=bip_threads)
 
         _export_result_to_json(analyzer, output_path, start_time)
     except Exception:
         LOGGER.exception("%s failed", app_profile)
 
+    return (os.getpid(), ) + _get_memory_usage()
+
+
+def _detect_libs_in_app(detect_info):
+    (app_path, mode, repackage, exclude_builtin, solver, bip_cache_path,
+     lib_threads, bip_threads) = detect_info
+
+    try:
+        start_time = time.time()
+        analyzer = _get_libraries_in_app(
+            app_path, mode, repackage, exclude_builtin, solver=solver,
+            bip_cache_path=bip_cache_path, lib_threads=lib_threads,
+            bip_threads=bip_threads)
+
+        return _get_result_json_info(analyzer, start_time)
+    except Exception:
+        LOGGER.exception("%s failed", app_path)
+        raise
+
 
 def search_libs_in_apps(lib_folder=None,
                         lib_profiles=None,
+                        lib_index=None,
                         app_folder=None,
                         app_profiles=None,
                         mode=MODE.SCALABLE,
@@ -217,33 +526,48 @@ def search_libs_in_apps(lib_folder=None,
                         output_folder='outputs',
                         repackage=False,
                         processes=None,
-                        exclude_builtin=True):
+                        exclude_builtin=True,
+                        profile_folder=None,
+                        profile_format="json",
+                        solver=None,
+                        bip_cache_path=None,
+                        lib_threads=None,
+                        bip_threads=None):
     """Find if specified libraries are used in specified apps. Results will be stored in the `output_folder` as JSON files.
 
-    Must provide either `lib_folder` or `lib_profiles`.
+    Apps can be given as profiles or as binaries (.apk/.dex). Binaries are profiled and checked in the same worker process, without writing their profiles unless `profile_folder` is provided.
+
+    Must provide either `lib_folder`, `lib_profiles` or `lib_index`.
 
     Must provide either `app_folder` or `app_profiles`.
 
     Args:
         lib_folder (str, optional): Defaults to None. The folder that contains library binaries.
         lib_profiles (list, optional): Defaults to None. The list of library profiles.
-        app_folder (str, optional): Defaults to None. The folder that contains app binaries.
-        app_profiles (list, optional): Defaults to None. The list of app profiles.
+        lib_index (str, optional): Defaults to None. The LSH index file created by `build_LSH_index`.
+        app_folder (str, optional): Defaults to None. The folder that contains app profiles or binaries. If both the profile and the binary of an app are found, the profile is used.
+        app_profiles (list, optional): Defaults to None. The list of app profiles or binaries.
         mode (<enum 'MODE'>, optional): Defaults to MODE.SCALABLE. The detection mode. Either MODE.ACCURATE or MODE.SCALABLE. See the paper for more details.
         overwrite (bool, optional): Defaults to False. Should LibID overwrite the output file if it exists?
         output_folder (str, optional): Defaults to 'outputs'. The folder to store results.
         repackage (bool, optional): Defaults to False. Should LibID consider classes repackaging? This should only be enabled if already know classes repackaging is applied. 
         processes (int, optional): Defaults to None. The number of processes to use. If processes is None then the number returned by cpu_count() is used.
         exclude_builtin (bool, optional): Defaults to True. Should LibID exclude builtin Android libraries (e.g., Android Support V14)? Enable this option can speed up the detection process.
+        profile_folder (str, optional): Defaults to None. The folder to store the profiles of app binaries. If profile_folder is None then no profiles are stored.
+        profile_format (str, optional): Defaults to "json". The format of the stored profiles. Either "json" or "binary".
+        solver (str, optional): Defaults to None. The solver of the class matching BIP problem. Either "gurobi", "cbc", "greedy" or "assignment". If solver is None then BIP_SOLVER in module/config.py is used.
+        bip_cache_path (str, optional): Defaults to None. The SQLite database that caches the solved BIP problems across apps and runs. If bip_cache_path is None then BIP_CACHE_PATH in module/config.py is used (no cache by default).
+        lib_threads (int, optional): Defaults to None. The number of threads that match different libraries to an app in parallel. They only speed up the detection while the solver releases the GIL (Gurobi and CBC, but not "greedy" or "assignment"). If lib_threads is None then LIB_MATCHING_THREADS in module/config.py is used.
+        bip_threads (int, optional): Defaults to None. The number of threads that solve the independent parts of a BIP problem in parallel with the "gurobi" or "cbc" solver. If bip_threads is None then BIP_THREADS in module/config.py is used.
     """
 
     if not app_profiles:
         if app_folder:
-            app_profiles = glob2.glob(path.join(app_folder, "**/*.json"))
+            app_profiles = _find_apps(app_folder)
 
     if not lib_profiles:
         if lib_folder:
-            lib_profiles = glob2.glob(path.join(lib_folder, "**/*.json"))
+            lib_profiles = _find_profiles(lib_folder)
 
     if not overwrite:
         original_profile_num = len(app_profiles)
@@ -258,30 +582,123 @@ def search_libs_in_apps(lib_folder=None,
                 "Ignored %i app profiles because the output files already exist. Use -w to overwrite",
                 ignored_profile_num)
 
-    if app_profiles and lib_profiles:
+    if app_profiles and (lib_profiles or lib_index):
         start_time = time.time()
-        load_LSH(
-            lib_profiles, mode=mode, repackage=repackage, processes=processes)
-
+        if lib_index:
+            open_LSH(
+                lib_index, mode=mode, repackage=repackage, processes=processes)
+        else:
+            load_LSH(
+                lib_profiles,
+                mode=mode,
+                repackage=repackage,
+                processes=processes,
+                freeze=processes != 1)
+
+        # The workers are forked after the LSH is loaded and share it
         if processes == 1:
-            map(
+            results = map(
                 _search_libs_in_app,
                 izip(app_profiles, repeat(mode), repeat(output_folder),
-                     repeat(repackage), repeat(exclude_builtin)))
+                     repeat(repackage), repeat(exclude_builtin),
+                     repeat(profile_folder), repeat(profile_format),
+                     repeat(solver), repeat(bip_cache_path),
+                     repeat(lib_threads), repeat(bip_threads)))
         else:
-            pool = Pool(processes=None)
-            pool.map(
+            pool = Pool(processes=processes)
+            results = pool.map(
                 _search_libs_in_app,
                 izip(app_profiles, repeat(mode), repeat(output_folder),
-                     repeat(repackage), repeat(exclude_builtin)))
+                     repeat(repackage), repeat(exclude_builtin),
+                     repeat(profile_folder), repeat(profile_format),
+                     repeat(solver), repeat(bip_cache_path),
+                     repeat(lib_threads), repeat(bip_threads)))
+            pool.close()
+            pool.join()
 
         end_time = time.time()
 
+        _log_workers_memory_usage(results)
+
         LOGGER.info("Finished. Numer of apps: %d, date: %s, duration: %fs",
                     len(app_profiles),
                     datetime.datetime.now().ctime(), end_time - start_time)
 
 
+def serve(lib_folder=None,
+          lib_profiles=None,
+          lib_index=None,
+          mode=MODE.SCALABLE,
+          repackage=False,
+          processes=None,
+          exclude_builtin=True,
+          host='127.0.0.1',
+          port=8000,
+          queue_size=64,
+          solver=None,
+          bip_cache_path=None,
+          lib_threads=None,
+          bip_threads=None):
+    """Run a detection daemon that loads the libraries once and detects them in apps on request.
+
+    The daemon listens for HTTP requests on `host`:`port`. A POST /detect request with the body {"path": "<app profile or binary>"}, or with an app profile as the body, returns the detection result as JSON (the same as the output files of `search_libs_in_apps`). GET /status returns the server status.
+
+    Must provide either `lib_folder`, `lib_profiles` or `lib_index`.
+
+    Args:
+        lib_folder (str, optional): Defaults to None. The folder that contains library binaries.
+        lib_profiles (list, optional): Defaults to None. The list of library profiles.
+        lib_index (str, optional): Defaults to None. The LSH index file created by `build_LSH_index`.
+        mode (<enum 'MODE'>, optional): Defaults to MODE.SCALABLE. The detection mode. Either MODE.ACCURATE or MODE.SCALABLE. See the paper for more details.
+        repackage (bool, optional): Defaults to False. Should LibID consider classes repackaging? This should only be enabled if already know classes repackaging is applied.
+        processes (int, optional): Defaults to None. The number of worker processes to use. If processes is None then the number returned by cpu_count() is used.
+        exclude_builtin (bool, optional): Defaults to True. Should LibID exclude builtin Android libraries (e.g., Android Support V14)? Enable this option can speed up the detection process.
+        host (str, optional): Defaults to '127.0.0.1'. The address to listen on.
+        port (int, optional): Defaults to 8000. The port to listen on.
+        queue_size (int, optional): Defaults to 64. The maximum number of queued and running requests.
+        solver (str, optional): Defaults to None. The solver of the class matching BIP problem. Either "gurobi", "cbc", "greedy" or "assignment". If solver is None then BIP_SOLVER in module/config.py is used.
+        bip_cache_path (str, optional): Defaults to None. The SQLite database that caches the solved BIP problems across apps and runs. If bip_cache_path is None then BIP_CACHE_PATH in module/config.py is used (no cache by default).
+        lib_threads (int, optional): Defaults to None. The number of threads that match different libraries to an app in parallel. They only speed up the detection while the solver releases the GIL (Gurobi and CBC, but not "greedy" or "assignment"). If lib_threads is None then LIB_MATCHING_THREADS in module/config.py is used.
+        bip_threads (int, optional): Defaults to None. The number of threads that solve the independent parts of a BIP problem in parallel with the "gurobi" or "cbc" solver. If bip_threads is None then BIP_THREADS in module/config.py is used.
+    """
+
+    if not lib_profiles:
+        if lib_folder:
+            lib_profiles = _find_profiles(lib_folder)
+
+    if lib_index:
+        open_LSH(lib_index, mode=mode, repackage=repackage, processes=processes)
+    elif lib_profiles:
+        load_LSH(
+            lib_profiles,
+            mode=mode,
+            repackage=repackage,
+            processes=processes,
+            freeze=True)
+    else:
+        LOGGER.error("No library profiles or index provided.")
+        return
+
+    # The workers are forked after the libraries are loaded
+    detection_server = server.DetectionServer(
+        (host, port),
+        _detect_libs_in_app,
+        detect_args=(mode, repackage, exclude_builtin, solver, bip_cache_path,
+                     lib_threads, bip_threads),
+        processes=processes,
+        queue_size=queue_size)
+
+    LOGGER.info("Serving on http://%s:%d with %d worker processes ...", host,
+                port, detection_server.processes)
+
+    try:
+        detection_server.serve_forever()
+    except KeyboardInterrupt:
+        LOGGER.info("Shutting down ...")
+    finally:
+        detection_server.server_close()
+
+
 # Command line arguments parser
 # ----------------------------------------------
 
@@ -309,6 +726,16 @@ def parse_arguments():
         type=int,
         default=None,
         help='the number of processes to use [default: the number of CPUs in the system]')
+    parser_profiling.add_argument(
+        '--format',
+        type=str,
+        choices=profiler.PROFILE_FORMATS.keys(),
+        default='json',
+        help='the profile format [default: json]')
+    parser_profiling.add_argument(
+        '-m',
+        help='store the MinHashes of library classes in library profiles',
+        action='store_true')
     parser_profiling.add_argument(
         '-v', help='show debug information', action='store_true')
 
@@ -355,17 +782,58 @@ def parse_arguments():
         action='store_true')
     parser_detection.add_argument(
         '-r', help='consider classes repackaging', action='store_true')
+    parser_detection.add_argument(
+        '--solver',
+        type=str,
+        choices=call_graph_matching.SOLVERS,
+        default=BIP_SOLVER,
+        help='the solver of the class matching BIP [default: %s]' % BIP_SOLVER)
+    parser_detection.add_argument(
+        '--bip-cache',
+        metavar='FILE',
+        type=str,
+        default=None,
+        help='cache the solved BIP problems in the SQLite database (e.g., ~/.cache/LibID/bip_cache.sqlite) [default: no cache]')
+    parser_detection.add_argument(
+        '--lib-threads',
+        metavar='N',
+        type=int,
+        default=None,
+        help='the number of threads that match different libraries to an app in parallel, which only helps while the gurobi or cbc solver releases the GIL [default: %d]' % LIB_MATCHING_THREADS)
+    parser_detection.add_argument(
+        '--bip-threads',
+        metavar='N',
+        type=int,
+        default=None,
+        help='the number of threads that solve the independent parts of a BIP problem in parallel with the gurobi or cbc solver [default: %d]' % BIP_THREADS)
     parser_detection.add_argument(
         '-v', help='show debug information', action='store_true')
 
+    parser_detection.add_argument(
+        '--save-profiles',
+        metavar='FOLDER',
+        type=str,
+        default=None,
+        help='store the profiles of app binaries in the folder')
+    parser_detection.add_argument(
+        '--format',
+        type=str,
+        choices=profiler.PROFILE_FORMATS.keys(),
+        default='json',
+        help='the format of the stored profiles [default: json]')
+
     group = parser_detection.add_mutually_exclusive_group(required=True)
     group.add_argument(
-        '-af', metavar='FILE', type=str, nargs='+', help='the app profiles')
+        '-af',
+        metavar='FILE',
+        type=str,
+        nargs='+',
+        help='the app profiles or binaries (.apk/.dex)')
     group.add_argument(
         '-ad',
         metavar='FOLDER',
         type=str,
-        help='the folder that contains app profiles')
+        help='the folder that contains app profiles or binaries')
 
     group = parser_detection.add_mutually_exclusive_group(required=True)
     group.add_argument(
@@ -379,8 +847,149 @@ def parse_arguments():
         metavar='FOLDER',
         type=str,
         help='the folder that contains library profiles')
+    group.add_argument(
+        '-li',
+        metavar='FILE',
+        type=str,
+        help='the library index created by the index subcommand')
 
-    return parser.parse_args()
+    parser_serve = subparsers.add_parser(
+        'serve', help='run a daemon that detects the libraries in apps on request')
+    parser_serve.add_argument(
+        '--host',
+        metavar='HOST',
+        type=str,
+        default='127.0.0.1',
+        help='the address to listen on [default: 127.0.0.1]')
+    parser_serve.add_argument(
+        '--port',
+        metavar='PORT',
+        type=int,
+        default=8000,
+        help='the port to listen on [default: 8000]')
+    parser_serve.add_argument(
+        '-q',
+        metavar='N',
+        type=int,
+        default=64,
+        help='the maximum number of queued requests [default: 64]')
+    parser_serve.add_argument(
+        '-b',
+        help='considering build-in Android libraries',
+        action='store_true')
+    parser_serve.add_argument(
+        '-p',
+        metavar='N',
+        type=int,
+        default=None,
+        help='the number of worker processes to use [default: the number of CPUs in the system]')
+    parser_serve.add_argument(
+        '-A',
+        help='run program in Lib-A mode [default: LibID-S mode]',
+        action='store_true')
+    parser_serve.add_argument(
+        '-r', help='consider classes repackaging', action='store_true')
+    parser_serve.add_argument(
+        '--solver',
+        type=str,
+        choices=call_graph_matching.SOLVERS,
+        default=BIP_SOLVER,
+        help='the solver of the class matching BIP [default: %s]' % BIP_SOLVER)
+    parser_serve.add_argument(
+        '--bip-cache',
+        metavar='FILE',
+        type=str,
+        default=None,
+        help='cache the solved BIP problems in the SQLite database (e.g., ~/.cache/LibID/bip_cache.sqlite) [default: no cache]')
+    parser_serve.add_argument(
+        '--lib-threads',
+        metavar='N',
+        type=int,
+        default=None,
+        help='the number of threads that match different libraries to an app in parallel, which only helps while the gurobi or cbc solver releases the GIL [default: %d]' % LIB_MATCHING_THREADS)
+    parser_serve.add_argument(
+        '--bip-threads',
+        metavar='N',
+        type=int,
+        default=None,
+        help='the number of threads that solve the independent parts of a BIP problem in parallel with the gurobi or cbc solver [default: %d]' % BIP_THREADS)
+    parser_serve.add_argument(
+        '-v', help='show debug information', action='store_true')
+
+    group = parser_serve.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        '-lf',
+        metavar='FILE',
+        type=str,
+        nargs='+',
+        help='the library profiles')
+    group.add_argument(
+        '-ld',
+        metavar='FOLDER',
+        type=str,
+        help='the folder that contains library profiles')
+    group.add_argument(
+        '-li',
+        metavar='FILE',
+        type=str,
+        help='the library index created by the index subcommand')
+
+    parser_index = subparsers.add_parser(
+        'index', help='index the library profiles to a file')
+    parser_index.add_argument(
+        '-o',
+        metavar='FILE',
+        type=str,
+        default=None,
+        help='specify output file [default: libs.lsh, or the updated index]')
+    parser_index.add_argument(
+        '-u',
+        metavar='FILE',
+        type=str,
+        default=None,
+        help='add the library profiles to an existing index instead of building a new one')
+    parser_index.add_argument(
+        '-x',
+        metavar='LIB',
+        type=str,
+        nargs='+',
+        default=None,
+        help='remove the libraries ($(name)_$(version)) from the existing index given by -u')
+    parser_index.add_argument(
+        '-p',
+        metavar='N',
+        type=int,
+        default=None,
+        help=
+        'the number of processes to use [default: the number of CPUs in the system]'
+    )
+    parser_index.add_argument(
+        '-r', help='consider classes repackaging', action='store_true')
+    parser_index.add_argument(
+        '-v', help='show debug information', action='store_true')
+
+    group = parser_index.add_mutually_exclusive_group()
+    group.add_argument(
+        '-lf',
+        metavar='FILE',
+        type=str,
+        nargs='+',
+        help='the library profiles')
+    group.add_argument(
+        '-ld',
+        metavar='FOLDER',
+        type=str,
+        help='the folder that contains library profiles')
+
+    args = parser.parse_args()
+
+    if args.subparser_name == 'index':
+        if args.x and not args.u:
+            parser_index.error("argument -x: requires -u")
+        if not (args.lf or args.ld or args.x):
+            parser_index.error("one of the arguments -lf -ld -x is required")
+
+    return args
 
 
 if __name__ == '__main__':
@@ -400,11 +1009,45 @@ if __name__ == '__main__':
             file_paths=args.f,
             output_folder=args.o,
             processes=args.p,
-            overwrite=args.w)
+            overwrite=args.w,
+            profile_format=args.format,
+            minhash=args.m)
+    elif args.subparser_name == 'index' and args.u:
+        update_LSH_index(
+            args.u,
+            lib_folder=args.ld,
+            lib_profiles=args.lf,
+            removed_libs=args.x,
+            output_path=args.o,
+            processes=args.p)
+    elif args.subparser_name == 'index':
+        build_LSH_index(
+            lib_folder=args.ld,
+            lib_profiles=args.lf,
+            output_path=args.o if args.o else 'libs.lsh',
+            repackage=args.r,
+            processes=args.p)
+    elif args.subparser_name == 'serve':
+        serve(
+            lib_folder=args.ld,
+            lib_profiles=args.lf,
+            lib_index=args.li,
+            mode=MODE.ACCURATE if args.A else MODE.SCALABLE,
+            repackage=args.r,
+            processes=args.p,
+            exclude_builtin=not args.b,
+            host=args.host,
+            port=args.port,
+            queue_size=args.q,
+            solver=args.solver,
+            bip_cache_path=args.bip_cache,
+            lib_threads=args.lib_threads,
+            bip_threads=args.bip_threads)
     else:
         search_libs_in_apps(
             lib_folder=args.ld,
             lib_profiles=args.lf,
+            lib_index=args.li,
             app_folder=args.ad,
             app_profiles=args.af,
             mode=MODE.ACCURATE if args.A else MODE.SCALABLE,
@@ -412,4 +1055,10 @@ if __name__ == '__main__':
             output_folder=args.o,
             repackage=args.r,
             processes=args.p,
-            exclude_builtin=not args.b)
+            exclude_builtin=not args.b,
+            profile_folder=args.save_profiles,
+            profile_format=args.format,
+            solver=args.solver,
+            bip_cache_path=args.bip_cache,
+            lib_threads=args.lib_threads,
+            bip_threads=args.bip_threads)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python2
+
+# @Description: Benchmark of the BIP solvers of LibID on synthetic class matching problems
+
+"""Compare the match quality and solve time of the BIP solvers.
+
+Every problem is a synthetic library whose classes are renamed (and
+possibly repackaged or flattened into one package) in the app, with random
+method calls, superclasses and interfaces, and decoy potential class
+matches. All solvers get the same problems. The solvers whose dependencies
+are missing (e.g., gurobipy) are skipped.
+
+For every solver and case, the script prints the mean objective value, the
+number of class matches, the number of correct class matches (those of the
+renaming) and the solve time.
+"""
+
+import argparse
+import logging
+import random
+import time
+from collections import OrderedDict
+
+from module import call_graph_matching
+from module.call_graph_matching import Method, match
+
+PARAMETERS = ['I', 'J', 'Z', 'Ljava/lang/String;', 'Ljava/lang/Object;']
+
+# case: (use_pkg_hierarchy, assume_flattened_package, with relationships)
+CASES = OrderedDict([
+    ('hierarchy', (True, False, True)),
+    ('repackaged', (False, False, True)),
+    ('flattened', (False, True, True)),
+    ('scalable', (True, False, False)),
+])
+
+
+def generate_problem(rng, class_num, decoy_num, flattened):
+    """Generate a synthetic class matching problem.
+
+    Returns:
+        tuple: (the keyword arguments of `call_graph_matching.match`, the set of correct class matches)
+    """
+    lib_pkgs = ['org/lib', 'org/lib/core', 'org/lib/io', 'org/lib/io/util']
+    app_pkgs = dict(zip(lib_pkgs, ['a', 'a/b', 'a/c', 'a/c/d']))
+
+    lib_classnames = ['L%s/Class%d;' % (rng.choice(lib_pkgs), i) for i in xrange(class_num)]
+    truth = dict()
+    for i, lib_class in enumerate(lib_classnames):
+        app_pkg = 'a' if flattened else app_pkgs[lib_class[1:].rsplit('/', 1)[0]]
+        truth[lib_class] = 'L%s/c%d;' % (app_pkg, i)
+    # Some app classes do not belong to the library
+    extra_app_classnames = ['L%s/x%d;' % ('a' if flattened else rng.choice(app_pkgs.values()), i)
+                            for i in xrange(class_num // 5)]
+    app_classnames = sorted(truth.values()) + extra_app_classnames
+
+    potential_class_matches = set(truth.iteritems())
+    for lib_class in lib_classnames:
+        for app_class in rng.sample(app_classnames, decoy_num):
+            potential_class_matches.add((lib_class, app_class))
+
+    app_class_weights = dict((app_class, 1.0 / class_num + 0.0001 * rng.randint(1, 20)) for app_class in app_classnames)
+
+    # The app keeps most of the method calls of the library, with smaller or equal counts
+    lib_method_calls = set()
+    app_method_calls = set()
+    for _ in xrange(class_num * 2):
+        (class1, class2) = (rng.choice(lib_classnames), rng.choice(lib_classnames))
+        (parameters1, parameters2) = (rng.choice(PARAMETERS), rng.choice(PARAMETERS))
+        count = rng.randint(1, 3)
+        lib_method_calls.add(Method(class1, class2, parameters1, parameters2, count))
+        if rng.random() < 0.9:
+            app_method_calls.add(Method(truth[class1], truth[class2], parameters1, parameters2, rng.randint(1, count)))
+
+    lib_class_parents = dict()
+    lib_class_interfaces = dict()
+    for i, lib_class in enumerate(lib_classnames[1:], 1):
+        if rng.random() < 0.2:
+            lib_class_parents[lib_class] = rng.choice(lib_classnames[:i])
+        if rng.random() < 0.1:
+            lib_class_interfaces[lib_class] = [rng.choice(lib_classnames[:i])]
+    app_class_parents = dict((truth[c], truth[p]) for (c, p) in lib_class_parents.iteritems())
+    app_class_interfaces = dict((truth[c], [truth[i] for i in interfaces])
+                                for (c, interfaces) in lib_class_interfaces.iteritems())
+
+    match_args = dict(lib_classnames=lib_classnames,
+                      app_classnames=app_classnames,
+                      potential_class_matches=potential_class_matches,
+                      lib_method_calls=sorted(lib_method_calls),
+                      app_method_calls=sorted(app_method_calls),
+                      app_class_weights=app_class_weights,
+                      lib_class_parents=lib_class_parents,
+                      app_class_parents=app_class_parents,
+                      lib_class_interfaces=lib_class_interfaces,
+                      app_class_interfaces=app_class_interfaces)
+
+    return match_args, set(truth.iteritems())
+
+
+def run_benchmark(solvers, problem_num, class_num, decoy_num, seed):
+    rng = random.Random(seed)
+
+    for (case, (use_pkg_hierarchy, assume_flattened_package, with_relationships)) in CASES.iteritems():
+        results = OrderedDict((solver, []) for solver in solvers)
+        for _ in xrange(problem_num):
+            match_args, truth = generate_problem(rng, class_num, decoy_num, assume_flattened_package)
+            match_args.update(use_pkg_hierarchy=use_pkg_hierarchy, assume_flattened_package=assume_flattened_package)
+            if not with_relationships:
+                # The BIP of the LibID-S mode
+                match_args.update(lib_method_calls=[], app_method_calls=[], lib_class_parents=None, app_class_parents=None,
+                                  lib_class_interfaces=None, app_class_interfaces=None)
+
+            for solver in solvers:
+                start_time = time.time()
+                objective, class_matches, status = match(solver=solver, **match_args)
+                solve_time = time.time() - start_time
+                if class_matches is None:
+                    (objective, class_matches) = (0, set())
+                results[solver].append((objective, len(class_matches), len(class_matches & truth), solve_time, status))
+
+        print '%s (%d problems of %d classes):' % (case, problem_num, class_num)
+        print '  %-12s %10s %8s %8s %9s  %s' % ('solver', 'objective', 'matches', 'correct', 'time (s)', 'status')
+        for (solver, solver_results) in results.iteritems():
+            columns = zip(*solver_results)
+            means = [sum(column) / float(problem_num) for column in columns[:4]]
+            statuses = ','.join(sorted(set(columns[4])))
+            print '  %-12s %10.4f %8.1f %8.1f %9.3f  %s' % tuple([solver] + means + [statuses])
+
+
+def get_available_solvers():
+    available_solvers = []
+    for solver in call_graph_matching.SOLVERS:
+        try:
+            if solver == 'gurobi':
+                import gurobipy
+            elif solver == 'cbc':
+                import pulp
+        except ImportError:
+            print 'Skipping %s: not installed' % solver
+            continue
+        available_solvers.append(solver)
+
+    return available_solvers
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Benchmark the BIP solvers on synthetic class matching problems')
+    parser.add_argument(
+        '-s',
+        metavar='SOLVER',
+        nargs='+',
+        dest='solvers',
+        choices=call_graph_matching.SOLVERS,
+        help='the solvers to compare [default: all installed solvers]')
+    parser.add_argument(
+        '-n',
+        metavar='N',
+        type=int,
+        dest='problem_num',
+        default=5,
+        help='the number of problems of every case [default: 5]')
+    parser.add_argument(
+        '-c',
+        metavar='N',
+        type=int,
+        dest='class_num',
+        default=50,
+        help='the number of library classes of every problem [default: 50]')
+    parser.add_argument(
+        '-d',
+        metavar='N',
+        type=int,
+        dest='decoy_num',
+        default=4,
+        help='the number of decoy potential matches of every library class [default: 4]')
+    parser.add_argument(
+        '--seed',
+        metavar='N',
+        type=int,
+        default=0,
+        help='the random seed [default: 0]')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    # PuLP logs every CBC command line
+    logging.getLogger('pulp').setLevel(logging.WARNING)
+    run_benchmark(args.solvers or get_available_solvers(), args.problem_num, args.class_num, args.decoy_num, args.seed)
@@ -1,5 +1,7 @@
 from collections import defaultdict
 
+import numpy as np
+
 
 _integration_precision = 0.001
 def _integration(f, a, b):
@@ -13,9 +15,11 @@ def _integration(f, a, b):
 
 try:
     from scipy.integrate import quad as integrate
+    from scipy.special import beta, betainc
 except ImportError:
     # For when no scipy installed
     integrate = _integration
+    beta = betainc = None
 
 
 def _false_positive_probability(threshold, b, r):
@@ -36,6 +40,9 @@ def _optimal_param(threshold, num_perm, false_positive_weight,
     Compute the optimal `MinHashLSH` parameter that minimizes the weighted sum
     of probabilities of false positive and false negative.
     '''
+    if betainc is not None:
+        return _optimal_param_closed_form(threshold, num_perm,
+                false_positive_weight, false_negative_weight)
     min_error = float("inf")
     opt = (0, 0)
     for b in range(1, num_perm+1):
@@ -50,6 +57,71 @@ def _optimal_param(threshold, num_perm, false_positive_weight,
     return opt
 
 
+def _optimal_param_closed_form(threshold, num_perm, false_positive_weight,
+        false_negative_weight):
+    '''
+    The same as :func:`_optimal_param`, with the probabilities of all
+    parameters computed at once in closed form: substituting u = s**r,
+    the integral of (1 - s**r)**b over [0, x] is the incomplete beta
+    function B(x**r; 1/r, b+1) / r.
+    '''
+    errors = np.empty((num_perm, num_perm))
+    errors.fill(np.inf)
+    for r in range(1, num_perm+1):
+        bs = np.arange(1, num_perm // r + 1, dtype=np.float64)
+        full = beta(1.0 / r, bs + 1) / r
+        lower = full * betainc(1.0 / r, bs + 1, threshold**r)
+        fp = threshold - lower
+        fn = full - lower
+        errors[:len(bs), r-1] = fp*false_positive_weight + fn*false_negative_weight
+    # The first minimum in the order (b, r) as in _optimal_param
+    i = int(np.argmin(errors))
+    return (i // num_perm + 1, i % num_perm + 1)
+
+
+# FNV-1a parameters used to fold a band of hash values into a 64-bit integer
+_fnv_offset_basis = np.uint64(14695981039346656037)
+_fnv_prime = np.uint64(1099511628211)
+# The number of bits of a tagged band key used for the band number
+_band_tag_bits = 16
+
+
+def _band_hashes(hashvalues, start, end):
+    '''
+    Fold the band `[start, end)` of every row in `hashvalues` into a 64-bit
+    integer key.
+
+    Args:
+        hashvalues (numpy.array): Either the hash values of a single MinHash
+            or a 2-D array with one MinHash per row.
+        start (int): The first hash value of the band.
+        end (int): The end (exclusive) of the band.
+
+    Returns:
+        numpy.array: One `uint64` key per row.
+    '''
+    # One contiguous row per hash value of the band
+    columns = np.atleast_2d(hashvalues)[:, start:end].T.astype(np.uint64)
+    h = np.empty(columns.shape[1], dtype=np.uint64)
+    h.fill(_fnv_offset_basis)
+    for column in columns:
+        np.bitwise_xor(h, column, out=h)
+        np.multiply(h, _fnv_prime, out=h)
+    return h
+
+
+def _tag_bands(hashes, bands):
+    '''
+    Replace the top `_band_tag_bits` bits of every band key in `hashes`
+    by its band number in `bands`, so that the keys of all bands of an
+    index can be kept in a single sorted array.
+    '''
+    return np.bitwise_or(
+        np.right_shift(hashes, np.uint64(_band_tag_bits)),
+        np.left_shift(np.asarray(bands, dtype=np.uint64),
+                      np.uint64(64 - _band_tag_bits)))
+
+
 class MinHashLSH(object):
     '''
     The :ref:`minhash_lsh` index. 
@@ -103,8 +175,6 @@ class MinHashLSH(object):
         self.hashtables = [defaultdict(list) for _ in range(self.b)]
         self.hashranges = [(i*self.r, (i+1)*self.r) for i in range(self.b)]
         self.keys = dict()
-        # Custom field for LibID
-        self.minhashes = dict()
 
     def insert(self, key, minhash):
         '''
@@ -121,11 +191,9 @@ class MinHashLSH(object):
                     % (self.h, len(minhash)))
         if key in self.keys:
             raise ValueError("The given key already exists")
-        self.keys[key] = [self._H(minhash.hashvalues[start:end]) 
-                for start, end in self.hashranges]
+        self.keys[key] = self._H(minhash.hashvalues, self.b)
         for H, hashtable in zip(self.keys[key], self.hashtables):
             hashtable[H].append(key)
-        self.minhashes[key] = minhash
 
     def query(self, minhash):
         '''
@@ -143,8 +211,7 @@ class MinHashLSH(object):
             raise ValueError("Expecting minhash with length %d, got %d"
                     % (self.h, len(minhash)))
         candidates = set()
-        for (start, end), hashtable in zip(self.hashranges, self.hashtables):
-            H = self._H(minhash.hashvalues[start:end])
+        for H, hashtable in zip(self._H(minhash.hashvalues, self.b), self.hashtables):
             if H in hashtable:
                 for key in hashtable[H]:
                     candidates.add(key)
@@ -182,8 +249,44 @@ class MinHashLSH(object):
         '''
         return any(len(t) == 0 for t in self.hashtables)
 
-    def _H(self, hs):
-        return bytes(hs.byteswap().data)
+    def _H(self, hashvalues, b):
+        '''
+        Fold the first `b` bands of the hash values into 64-bit integer keys
+        (see :func:`_band_hashes`).
+        '''
+        bands = np.asarray(hashvalues[:b*self.r]).reshape(b, -1)
+        return _band_hashes(bands, 0, bands.shape[1]).tolist()
+
+    def _insert_ids(self, ids, hashvalues):
+        '''
+        Add entry ids to the hash tables only, without recording them in
+        `keys`. It is used by tables whose keys, sizes and hash values are
+        kept once in a store shared by several tables (see
+        :class:`datasketch.MinHashLSHEnsemble`), so that each table holds
+        nothing but the ids.
+
+        Args:
+            ids (list): The entry ids, passing the same `int` objects to every
+                table that shares them.
+            hashvalues (numpy.array): The hash values of the entries, one
+                per row.
+        '''
+        n = len(ids)
+        bands = np.asarray(hashvalues[:, :self.b*self.r]).reshape(n*self.b, -1)
+        Hs = _band_hashes(bands, 0, bands.shape[1]).reshape(n, self.b).tolist()
+        for i, row in zip(ids, Hs):
+            for H, hashtable in zip(row, self.hashtables):
+                hashtable[H].append(i)
+
+    def _remove_id(self, i, hashvalues):
+        '''
+        Remove an entry id added by :func:`_insert_ids`, given the hash values
+        of the entry.
+        '''
+        for H, hashtable in zip(self._H(hashvalues, self.b), self.hashtables):
+            hashtable[H].remove(i)
+            if not hashtable[H]:
+                del hashtable[H]
 
     def _query_b(self, minhash, b):
         if len(minhash) != self.h:
@@ -192,10 +295,177 @@ class MinHashLSH(object):
         if b > len(self.hashtables):
             raise ValueError("b must be less or equal to the number of hash tables")
         candidates = set()
-        for (start, end), hashtable in zip(self.hashranges[:b], self.hashtables[:b]):
-            H = self._H(minhash.hashvalues[start:end])
+        for H, hashtable in zip(self._H(minhash.hashvalues, b), self.hashtables):
             if H in hashtable:
                 for key in hashtable[H]:
                     candidates.add(key)
         return candidates
 
+    def _query_many_b(self, hashvalues, b):
+        '''
+        Query the first `b` bands with many MinHashes at once.
+
+        Args:
+            hashvalues (numpy.array): The hash values of the query MinHashes,
+                one per row.
+            b (int): The number of bands to query.
+
+        Returns:
+            `list` of `set` of keys, one per row of `hashvalues`.
+        '''
+        if b > len(self.hashtables):
+            raise ValueError("b must be less or equal to the number of hash tables")
+        n = len(hashvalues)
+        bands = np.asarray(hashvalues[:, :b*self.r]).reshape(n*b, -1)
+        Hs = _band_hashes(bands, 0, bands.shape[1]).reshape(n, b).tolist()
+        results = []
+        for row in Hs:
+            candidates = set()
+            for H, hashtable in zip(row, self.hashtables):
+                if H in hashtable:
+                    candidates.update(hashtable[H])
+            results.append(candidates)
+        return results
+
+
+
+class FrozenMinHashLSH(object):
+    '''
+    A :class:`datasketch.MinHashLSH` backed by flat arrays, e.g.,
+    arrays mapped from an index file written by
+    :func:`datasketch.MinHashLSHEnsemble.save`.
+
+    The band keys (see :func:`_band_hashes`) of all bands are tagged with
+    their band number (see :func:`_tag_bands`) and stored in one sorted array
+    with a parallel array of entry ids. A query is then a single vectorized
+    binary search and no Python object is created per indexed key.
+
+    The arrays are never modified: entry ids inserted later are kept in an
+    in-memory :class:`datasketch.MinHashLSH` delta (see
+    :func:`datasketch.MinHashLSH._insert_ids`) and removed entry ids are
+    recorded in `removed`. Apart from :func:`query`, the table deals with
+    entry ids only; their keys, sizes and hash values are kept by the owner
+    of the table.
+
+    Args:
+        num_perm (int): The number of permutation functions.
+        params (tuple): The LSH parameters (number of bands, size of each band).
+        bands (numpy.array): The sorted tagged band keys.
+        ids (numpy.array): The entry id of every tagged band key.
+        keys: A sequence that maps an entry id to its key.
+        id_range (tuple): The range `[start, end)` of the entry ids stored
+            in the arrays of this table.
+        removed (set, optional): The removed entry ids, which may be shared
+            by several tables.
+    '''
+
+    def __init__(self, num_perm, params, bands, ids, keys, id_range, removed=None):
+        self.h = num_perm
+        self.b, self.r = params
+        self.bands = bands
+        self.ids = ids
+        self.keys = keys
+        self.id_range = id_range
+        self.removed = set() if removed is None else removed
+        self.delta = None
+
+    def _insert_ids(self, ids, hashvalues):
+        '''
+        Add entry ids to the in-memory delta of the table
+        (see :func:`datasketch.MinHashLSH._insert_ids`).
+        '''
+        if self.delta is None:
+            self.delta = MinHashLSH(num_perm=self.h, params=(self.b, self.r))
+        self.delta._insert_ids(ids, hashvalues)
+
+    def _remove_id(self, i, hashvalues):
+        '''
+        Remove an entry id, given the hash values of the entry.
+        '''
+        if self.id_range[0] <= i < self.id_range[1]:
+            self.removed.add(i)
+        else:
+            self.delta._remove_id(i, hashvalues)
+
+    def query(self, minhash):
+        '''
+        Giving the MinHash of the query set, retrieve
+        the keys that references sets with Jaccard
+        similarities greater than the threshold.
+
+        Args:
+            minhash (datasketch.MinHash): The MinHash of the query set.
+
+        Returns:
+            `list` of keys.
+        '''
+        return [self.keys[i] for i in self._query_b(minhash, self.b)]
+
+    def _query_b(self, minhash, b):
+        '''
+        Query the first `b` bands.
+
+        Returns:
+            `set` of entry ids.
+        '''
+        if len(minhash) != self.h:
+            raise ValueError("Expecting minhash with length %d, got %d"
+                    % (self.h, len(minhash)))
+        if b > self.b:
+            raise ValueError("b must be less or equal to the number of hash tables")
+        hs = _band_hashes(minhash.hashvalues[:b*self.r].reshape(b, self.r),
+                          0, self.r)
+        hs = _tag_bands(hs, np.arange(b))
+        lo = self.bands.searchsorted(hs, side='left')
+        hi = self.bands.searchsorted(hs, side='right')
+        candidates = set()
+        for i in np.flatnonzero(hi > lo):
+            candidates.update(self.ids[lo[i]:hi[i]].tolist())
+        if self.removed:
+            candidates -= self.removed
+        if self.delta is not None:
+            candidates.update(self.delta._query_b(minhash, b))
+        return candidates
+
+    def _query_many_b(self, hashvalues, b):
+        '''
+        Query the first `b` bands with many MinHashes at once: the band keys
+        of all queries are computed and searched in a single vectorized pass.
+
+        Args:
+            hashvalues (numpy.array): The hash values of the query MinHashes,
+                one per row.
+            b (int): The number of bands to query.
+
+        Returns:
+            `list` of `set` of entry ids, one per row of `hashvalues`.
+        '''
+        if b > self.b:
+            raise ValueError("b must be less or equal to the number of hash tables")
+        n = len(hashvalues)
+        # The bands of query i are rows i*b to (i+1)*b-1
+        hs = _band_hashes(hashvalues[:, :b*self.r].reshape(n*b, self.r),
+                          0, self.r)
+        hs = _tag_bands(hs, np.tile(np.arange(b), n))
+        lo = self.bands.searchsorted(hs, side='left')
+        hi = self.bands.searchsorted(hs, side='right')
+        # Gather the entry ids of all matched bands, with the query they match
+        hit = np.flatnonzero(hi > lo)
+        counts = (hi - lo)[hit]
+        offsets = np.repeat(lo[hit] - (np.cumsum(counts) - counts), counts)
+        ids = self.ids[offsets + np.arange(counts.sum())].astype(np.int64)
+        rows = np.repeat((hit // b).astype(np.int64), counts)
+        # Remove the duplicated (query, id) pairs, sorted by query
+        pairs = np.unique(np.left_shift(rows, 32) | ids)
+        rows = np.right_shift(pairs, 32)
+        ids = pairs & 0xffffffff
+        if self.removed:
+            alive = ~np.in1d(ids, np.array(sorted(self.removed)))
+            rows, ids = rows[alive], ids[alive]
+        bounds = np.searchsorted(rows, np.arange(n + 1))
+        results = [set(ids[bounds[k]:bounds[k+1]].tolist()) for k in range(n)]
+        if self.delta is not None:
+            for candidates, delta_candidates in zip(
+                    results, self.delta._query_many_b(hashvalues, b)):
+                candidates.update(delta_candidates)
+        return results
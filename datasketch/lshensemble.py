@@ -1,33 +1,100 @@
-from collections import deque
+from collections import defaultdict, deque
+import json, mmap, os, struct
 import numpy as np
-from datasketch.lsh import integrate, MinHashLSH
+from datasketch.lsh import (MinHashLSH, FrozenMinHashLSH,
+                            _band_hashes, _tag_bands)
 
+# The header of an index file written by MinHashLSHEnsemble.save:
+# magic string, format version, reserved, byte size of the JSON header
+_index_file_header = '<8sIIQ'
+_index_file_magic = b'LSHENSBL'
+_index_file_version = 1
+# Every array section in an index file is aligned to this number of bytes
+_index_file_alignment = 8
+# A partition is rebalanced when it grows larger than this factor
+# times the average partition size
+_rebalance_factor = 2
 
-def _false_positive_probability(threshold, b, r, xq):
+
+# The ratios x/q of the indexed and query set sizes the LSH parameters
+# are optimized for
+_xqs = np.exp(np.linspace(-5, 5, 10))
+# The optimal parameters for every x/q in _xqs, precomputed for
+# (threshold, num_perm, m, false positive weight, false negative weight)
+# of the indexes built by LibID (LSH_THRESHOLD, LSH_PERM_NUM and the
+# weights of load_LSH)
+_precomputed_params = {
+    (0.8, 256, 8, 0.1, 0.9): [(1, 8), (1, 8), (1, 8), (1, 8), (1, 8),
+                              (64, 4), (128, 2), (58, 1), (180, 1), (256, 1)],
+    (0.8, 256, 8, 0.5, 0.5): [(1, 8), (1, 8), (1, 8), (1, 8), (1, 8),
+                              (51, 5), (85, 3), (85, 3), (85, 3), (85, 3)],
+}
+# The optimal parameters of other settings are computed once and
+# kept in this file
+_params_cache_path = os.path.join(os.path.expanduser("~"), ".cache",
+                                  "datasketch", "lshensemble_params.json")
+_params_memo = dict()
+
+
+def _quadrature(panels, order):
     '''
-    Compute the false positive probability given the containment threshold.
-    xq is the ratio of x/q.
+    Get the nodes and weights of a composite Gauss-Legendre rule over [0, 1]
+    with `order` nodes in each of `panels` equal panels.
     '''
-    _probability = lambda t : 1 - (1 - (t/(1 + xq - t))**float(r))**float(b)
-    if xq >= threshold:
-        a, err = integrate(_probability, 0.0, threshold) 
-        return a
-    a, err = integrate(_probability, 0.0, xq)
-    return a
+    x, w = np.polynomial.legendre.leggauss(order)
+    edges = np.linspace(0.0, 1.0, panels + 1)
+    h = np.diff(edges)
+    nodes = (edges[:-1, None] + (x[None, :] + 1) * h[:, None] / 2).ravel()
+    weights = (w[None, :] * h[:, None] / 2).ravel()
+    return (nodes, weights)
+
+_quadrature_nodes, _quadrature_weights = _quadrature(64, 8)
 
 
-def _false_negative_probability(threshold, b, r, xq):
+def _candidate_probability(lower, upper, xq, r, bs):
     '''
-    Compute the false negative probability given the containment threshold
+    Integrate the probability of a set being a candidate over the
+    containments in [lower, upper], for every number of bands in `bs`
+    with `r` hash values each. xq is the ratio of x/q.
+
+    Returns:
+        numpy.array: One integral per number of bands.
     '''
-    _probability = lambda t : 1 - (1 - (1 - (t/(1 + xq - t))**float(r))**float(b))
-    if xq >= 1.0:
-        a, err = integrate(_probability, threshold, 1.0)
-        return a
-    if xq >= threshold:
-        a, err = integrate(_probability, threshold, xq)
-        return a
-    return 0.0
+    t = lower + (upper - lower) * _quadrature_nodes
+    # The probability of not being a candidate is (1 - s**r)**b, where
+    # s is the Jaccard similarity of the containment t
+    log_miss = np.log1p(-(t / (1 + xq - t))**r)
+    return (upper - lower) * (1 - np.exp(np.outer(bs, log_miss))).dot(
+        _quadrature_weights)
+
+
+def _optimal_params(threshold, num_perm, max_r, xqs, false_positive_weight,
+        false_negative_weight):
+    '''
+    Compute the optimal parameters that minimizes the weighted sum
+    of probabilities of false positive and false negative, for every x/q
+    in `xqs`. The probabilities of all parameters are integrated at once
+    by a fixed quadrature rule.
+
+    Returns:
+        `list` of `tuple`: The parameters (b, r) for every x/q.
+    '''
+    params = []
+    for xq in xqs:
+        errors = np.empty((num_perm, max_r))
+        errors.fill(np.inf)
+        for r in range(1, max_r+1):
+            bs = np.arange(1, num_perm // r + 1)
+            fp = _candidate_probability(0.0, min(xq, threshold), xq, r, bs)
+            fn = 0.0
+            if xq >= threshold:
+                upper = min(xq, 1.0)
+                fn = upper - threshold - _candidate_probability(threshold, upper, xq, r, bs)
+            errors[:len(bs), r-1] = fp*false_positive_weight + fn*false_negative_weight
+        # The first minimum in the order (b, r)
+        i = int(np.argmin(errors))
+        params.append((i // max_r + 1, i % max_r + 1))
+    return params
 
 
 def _optimal_param(threshold, num_perm, max_r, xq, false_positive_weight,
@@ -37,19 +104,56 @@ def _optimal_param(threshold, num_perm, max_r, xq, false_positive_weight,
     of probabilities of false positive and false negative.
     xq is the ratio of x/q.
     '''
-    min_error = float("inf")
-    opt = (0, 0)
-    for b in range(1, num_perm+1):
-        for r in range(1, max_r+1):
-            if b*r > num_perm:
-                continue
-            fp = _false_positive_probability(threshold, b, r, xq)
-            fn = _false_negative_probability(threshold, b, r, xq)
-            error = fp*false_positive_weight + fn*false_negative_weight
-            if error < min_error:
-                min_error = error
-                opt = (b, r)
-    return opt
+    return _optimal_params(threshold, num_perm, max_r, [xq],
+                           false_positive_weight, false_negative_weight)[0]
+
+
+def _cached_optimal_params(threshold, num_perm, max_r, false_positive_weight,
+        false_negative_weight):
+    '''
+    Get the optimal parameters for every x/q in `_xqs`: precomputed,
+    computed before by this process, or cached in `_params_cache_path`.
+    Otherwise they are computed and added to the cache file.
+    '''
+    key = (threshold, num_perm, max_r, false_positive_weight, false_negative_weight)
+    if key in _precomputed_params:
+        return _precomputed_params[key]
+    if key in _params_memo:
+        return _params_memo[key]
+    name = json.dumps(key)
+    cache = _read_params_cache()
+    if name not in cache:
+        cache[name] = _optimal_params(threshold, num_perm, max_r, _xqs,
+                                      false_positive_weight, false_negative_weight)
+        _write_params_cache(cache)
+    _params_memo[key] = [tuple(param) for param in cache[name]]
+    return _params_memo[key]
+
+
+def _read_params_cache():
+    try:
+        with open(_params_cache_path) as fd:
+            cache = json.load(fd)
+    except (IOError, ValueError):
+        return dict()
+    # The cached parameters are only valid for the same x/q
+    if cache.get("xqs") != _xqs.tolist():
+        return dict()
+    return cache["params"]
+
+
+def _write_params_cache(params):
+    # The cache is only an optimization, e.g., the home directory may
+    # be read only
+    tmp_path = "%s.%d.tmp" % (_params_cache_path, os.getpid())
+    try:
+        if not os.path.exists(os.path.dirname(_params_cache_path)):
+            os.makedirs(os.path.dirname(_params_cache_path))
+        with open(tmp_path, 'w') as fd:
+            json.dump({"xqs": _xqs.tolist(), "params": params}, fd)
+        os.rename(tmp_path, _params_cache_path)
+    except (IOError, OSError):
+        pass
 
 
 class MinHashLSHEnsemble(object):
@@ -112,19 +216,27 @@ class MinHashLSHEnsemble(object):
         self.indexes = [dict((r, MinHashLSH(num_perm=self.h, params=(int(self.h/r), r))) for r in rs)
                         for _ in range(0, num_part)] 
         self.lowers = [None for _ in self.indexes]
+        # The keys, sizes and hash values of the indexed sets, which
+        # the LSH indexes refer to by entry ids
+        self._store = _KeyStore(self.h)
+        # The seed of the indexed MinHashes
+        self.seed = None
+        # Set when inserted sets made the partitions unbalanced
+        self._unbalanced = False
+        # User defined information stored together with a saved index
+        self.metadata = None
 
     def _init_optimal_params(self, weights):
         false_positive_weight, false_negative_weight = weights
-        self.xqs = np.exp(np.linspace(-5, 5, 10))
-        self.params = np.array([_optimal_param(self.threshold, self.h, self.m, 
-                                               xq, 
-                                               false_positive_weight,
-                                               false_negative_weight) 
-                                for xq in self.xqs], dtype=np.int)
+        self.xqs = _xqs
+        self.params = np.array(_cached_optimal_params(self.threshold, self.h, self.m,
+                                                      false_positive_weight,
+                                                      false_negative_weight),
+                               dtype=np.int)
         # Find all unique r
         rs = set()
         for _, r in self.params:
-            rs.add(r)
+            rs.add(int(r))
         return rs
 
     def _get_optimal_param(self, x, q):
@@ -161,14 +273,174 @@ class MinHashLSHEnsemble(object):
         entries.sort(key=lambda e : e[2])
         if entries[0][2] < 0:
             raise ValueError("Non-positive set size found in entries")
-        part_size = int(len(entries) / len(self.indexes)) + 1
+        if self.seed is None:
+            self.seed = entries[0][1].seed
+        self._partition([key for key, _, _ in entries],
+                        np.array([minhash.hashvalues for _, minhash, _ in entries],
+                                 dtype=np.uint64).reshape((len(entries), self.h)),
+                        np.array([size for _, _, size in entries], dtype=np.int64))
+
+    def _partition(self, keys, hashvalues, sizes):
+        '''
+        Distribute the sets, sorted by size, evenly over the partitions of
+        an empty index. The partitions are built as sorted band keys (see
+        :class:`datasketch.lsh.FrozenMinHashLSH`) in a single vectorized
+        pass, over a key store whose loaded sets are these sets.
+        '''
+        self._store = _KeyStore(self.h, _KeyList(keys), hashvalues, sizes)
+        part_size = int(len(keys) / len(self.indexes)) + 1
         for i, index in enumerate(self.indexes):
-            if part_size*i >= len(entries):
-                continue
-            self.lowers[i] = entries[part_size*i][2]
+            start = min(part_size*i, len(keys))
+            end = min(part_size*(i+1), len(keys))
+            if start < end:
+                self.lowers[i] = int(sizes[start])
             for r in index:
-                for key, minhash, size in entries[part_size*i:part_size*(i+1)]:
-                    index[r].insert(key, minhash)
+                bands, ids = self._band_keys(hashvalues[start:end], start, r)
+                index[r] = FrozenMinHashLSH(self.h, (int(self.h/r), r), bands, ids,
+                                            self._store, (start, end),
+                                            self._store.removed)
+
+    def insert(self, key, minhash, size):
+        '''
+        Insert a unique key to the index, together with the MinHash and
+        the size of the set referenced by the key.
+        Unlike :func:`datasketch.MinHashLSHEnsemble.index`, it can be called
+        at any time, e.g., after the index is loaded from a file.
+
+        The set is added to the partition whose lower bound is the closest
+        one below its size. Partitions of a loaded index keep the inserted
+        sets in an in-memory delta, which is merged by
+        :func:`datasketch.MinHashLSHEnsemble.save`. If a partition grows
+        much larger than the others, the partitions are rebalanced lazily
+        when the index is saved, or by calling
+        :func:`datasketch.MinHashLSHEnsemble.rebalance`.
+
+        Args:
+            key (hashable): The unique identifier of the set.
+            minhash (datasketch.MinHash): The MinHash of the set.
+            size (int): The size or number of unique items in the set.
+        '''
+        if size <= 0:
+            raise ValueError("Set size must be positive")
+        if key in self:
+            raise ValueError("The given key already exists")
+        i = self._find_partition(size)
+        hashvalues = np.array(minhash.hashvalues, dtype=np.uint64).reshape((1, self.h))
+        ids = self._store.add([key], hashvalues, [size], i)
+        for r in self.indexes[i]:
+            self.indexes[i][r]._insert_ids(ids, hashvalues)
+        if self.lowers[i] is None or size < self.lowers[i]:
+            self.lowers[i] = size
+        if self.seed is None:
+            self.seed = minhash.seed
+        if self._is_unbalanced(i):
+            self._unbalanced = True
+
+    def remove(self, key):
+        '''
+        Remove the key from the index.
+
+        Args:
+            key (hashable): The unique identifier of a set.
+        '''
+        j = self._store.index(key)
+        i = self._partition_of(j)
+        hashvalues = self._store.hashvalues(np.array([j]))[0]
+        for r in self.indexes[i]:
+            self.indexes[i][r]._remove_id(j, hashvalues)
+        self._store.discard(j)
+        if self._partition_size(i) == 0:
+            self.lowers[i] = None
+
+    def keys(self):
+        '''
+        Returns:
+            `iterator` of all keys in the index.
+        '''
+        for i in range(len(self.indexes)):
+            for j in self._partition_ids(i):
+                yield self._store[j]
+
+    def key_ids(self):
+        '''
+        Returns:
+            `iterator` of `(key, entry id)` of all keys in the index. The
+            entry ids are the ones returned by
+            :func:`datasketch.MinHashLSHEnsemble.query_many_ids`. They are
+            kept until the index is rebalanced.
+        '''
+        for i in range(len(self.indexes)):
+            for j in self._partition_ids(i).tolist():
+                yield (self._store[j], j)
+
+    def rebalance(self):
+        '''
+        Redistribute all indexed sets evenly over the partitions,
+        as if they were indexed at once by
+        :func:`datasketch.MinHashLSHEnsemble.index`.
+        '''
+        entries = [self._partition_entries(i) for i in range(len(self.indexes))
+                   if self._partition_size(i)]
+        self.indexes = [dict((r, MinHashLSH(num_perm=self.h, params=(int(self.h/r), r)))
+                             for r in index) for index in self.indexes]
+        self.lowers = [None for _ in self.indexes]
+        self._store = _KeyStore(self.h)
+        self._unbalanced = False
+        if entries:
+            keys = [key for part_keys, _, _ in entries for key in part_keys]
+            sizes = np.concatenate([e[2] for e in entries])
+            order = np.argsort(sizes, kind='mergesort')
+            self._partition([keys[j] for j in order],
+                            np.concatenate([e[1] for e in entries])[order],
+                            sizes[order])
+
+    def _find_partition(self, size):
+        '''
+        Find the partition a new set of the given size belongs to.
+        '''
+        found = None
+        for i, lower in enumerate(self.lowers):
+            if lower is None:
+                continue
+            if found is None or lower <= size:
+                found = i
+        return 0 if found is None else found
+
+    def _partition_size(self, i):
+        size = self._store.counts[i]
+        lsh = next(iter(self.indexes[i].values()))
+        if isinstance(lsh, FrozenMinHashLSH):
+            start, end = lsh.id_range
+            size += end - start - sum(1 for j in lsh.removed if start <= j < end)
+        return size
+
+    def _partition_of(self, j):
+        '''
+        Find the partition of the set with entry id `j`.
+        '''
+        if j >= self._store.start:
+            return self._store.partition(j)
+        for i, index in enumerate(self.indexes):
+            start, end = next(iter(index.values())).id_range
+            if start <= j < end:
+                return i
+
+    def _partition_ids(self, i):
+        '''
+        Get the entry ids of the sets in partition `i`: the sets of a loaded
+        partition that have not been removed, followed by the sets inserted
+        in memory.
+        '''
+        lsh = next(iter(self.indexes[i].values()))
+        ids = self._store.members(i)
+        if isinstance(lsh, FrozenMinHashLSH):
+            ids = np.concatenate([np.arange(*lsh.id_range)[self._alive(lsh)], ids])
+        return ids
+
+    def _is_unbalanced(self, i):
+        total = sum(self._partition_size(j) for j in range(len(self.indexes)))
+        fair_size = float(total) / len(self.indexes)
+        return self._partition_size(i) > _rebalance_factor * (fair_size + 1)
 
     def query(self, minhash, size):
         '''
@@ -188,8 +460,65 @@ class MinHashLSHEnsemble(object):
             if u is None:
                 continue
             b, r = self._get_optimal_param(u, size)
-            for key in index[r]._query_b(minhash, b):
-                yield key
+            for j in index[r]._query_b(minhash, b):
+                yield self._store[j]
+
+    def query_many(self, minhashes, sizes):
+        '''
+        Query the index with many sets at once. It returns the same keys as
+        calling :func:`datasketch.MinHashLSHEnsemble.query` for every set,
+        but the queries are grouped by the partition and the LSH parameters
+        they use, and every group is queried in one vectorized pass.
+
+        Args:
+            minhashes: The MinHashes of the query sets, either a `list` of
+                :class:`datasketch.MinHash` or a 2-D `numpy.array` of their
+                hash values (one per row).
+            sizes (`list` of `int`): The sizes of the query sets.
+
+        Returns:
+            `list` of `set` of keys, one per query set.
+        '''
+        return [set(self._store[j] for j in ids.tolist())
+                for ids in self.query_many_ids(minhashes, sizes)]
+
+    def query_many_ids(self, minhashes, sizes):
+        '''
+        The same as :func:`datasketch.MinHashLSHEnsemble.query_many`, but
+        the sets found are given by their entry ids (see
+        :func:`datasketch.MinHashLSHEnsemble.key_ids`), so that no key is
+        looked up.
+
+        Returns:
+            `list` of sorted `numpy.array` of `int32` entry ids, one per
+            query set.
+        '''
+        if isinstance(minhashes, np.ndarray):
+            hashvalues = minhashes
+        else:
+            hashvalues = np.array([minhash.hashvalues for minhash in minhashes],
+                                  dtype=np.uint64)
+        hashvalues = hashvalues.reshape((len(sizes), self.h))
+        sizes = np.asarray(sizes, dtype=np.float64)
+        results = [set() for _ in range(len(sizes))]
+        for i, index in enumerate(self.indexes):
+            u = self.lowers[i]
+            if u is None or len(sizes) == 0:
+                continue
+            params = self._get_optimal_params(u, sizes)
+            for b, r in set(map(tuple, params.tolist())):
+                rows = np.flatnonzero((params[:, 0] == b) & (params[:, 1] == r))
+                for row, ids in zip(rows.tolist(),
+                                    index[r]._query_many_b(hashvalues[rows], b)):
+                    results[row].update(ids)
+        return [np.array(sorted(ids), dtype=np.int32) for ids in results]
+
+    def _get_optimal_params(self, x, qs):
+        '''
+        The vectorized :func:`_get_optimal_param` for the query sizes `qs`.
+        '''
+        i = np.searchsorted(self.xqs, float(x)/qs, side='left')
+        return self.params[np.minimum(i, len(self.params) - 1)]
 
     def __contains__(self, key):
         '''
@@ -199,16 +528,494 @@ class MinHashLSHEnsemble(object):
         Returns: 
             bool: True only if the key exists in the index.
         '''
-        return any(any(key in index[r] for r in index)
-                   for index in self.indexes)
+        return key in self._store
+
+    def _partition_entries(self, i):
+        '''
+        Get the keys, the hash values (as a 2-D array) and the sizes of
+        the sets indexed in partition `i`.
+        '''
+        ids = self._partition_ids(i)
+        return ([self._store[j] for j in ids], self._store.hashvalues(ids),
+                self._store.sizes(ids))
+
+    def _alive(self, lsh):
+        '''
+        Get the mask of the entries of a loaded partition that have not
+        been removed.
+        '''
+        start, end = lsh.id_range
+        alive = np.ones(end - start, dtype=bool)
+        # The removed entry ids are shared by all partitions
+        removed = [j - start for j in lsh.removed if start <= j < end]
+        if removed:
+            alive[removed] = False
+        return alive
+
+    def _band_keys(self, hashvalues, start, r):
+        '''
+        Compute the sorted tagged band keys, and their entry ids, of the sets
+        with the given hash values, whose entry ids start from `start`.
+        '''
+        b = int(self.h / r)
+        bands = np.concatenate([
+            _tag_bands(_band_hashes(hashvalues, j*r, (j+1)*r), j)
+            for j in range(b)])
+        ids = np.tile(np.arange(start, start + len(hashvalues), dtype=np.int32), b)
+        order = np.argsort(bands, kind='mergesort')
+        return (bands[order], ids[order])
+
+    def _merge_delta(self, i, r, start):
+        '''
+        Merge the removed entries and the in-memory delta of the loaded table
+        `r` of partition `i` into its sorted band keys, without recomputing
+        the keys of the unmodified entries. The entry ids of the merged table
+        start from `start`, in the order given by `_partition_entries`.
+        '''
+        lsh = self.indexes[i][r]
+        id_start = lsh.id_range[0]
+        alive = self._alive(lsh)
+        new_ids = np.cumsum(alive) - 1 + start
+        mask = alive[lsh.ids - id_start]
+        bands = lsh.bands[mask]
+        ids = new_ids[lsh.ids[mask] - id_start]
+        delta = self._store.members(i)
+        if len(delta):
+            delta_bands, delta_ids = self._band_keys(
+                self._store.hashvalues(delta), start + int(alive.sum()), r)
+            positions = np.searchsorted(bands, delta_bands, side='right')
+            bands = np.insert(bands, positions, delta_bands)
+            ids = np.insert(ids, positions, delta_ids)
+        return (bands, ids.astype(np.int32))
+
+    def _rebalanced_entries(self):
+        '''
+        Get the entries of every partition after redistributing all
+        indexed sets evenly, in the same way as
+        :func:`datasketch.MinHashLSHEnsemble.index`.
+        '''
+        entries = [self._partition_entries(i) for i in range(len(self.indexes))
+                   if self._partition_size(i)]
+        keys = [key for part_keys, _, _ in entries for key in part_keys]
+        hashvalues = np.concatenate([e[1] for e in entries])
+        sizes = np.concatenate([e[2] for e in entries])
+        order = np.argsort(sizes, kind='mergesort')
+        part_size = int(len(keys) / len(self.indexes)) + 1
+        partitioned = []
+        for i in range(len(self.indexes)):
+            part = order[part_size*i:part_size*(i+1)]
+            if len(part) == 0:
+                partitioned.append(None)
+                continue
+            partitioned.append(([keys[j] for j in part], hashvalues[part],
+                                sizes[part]))
+        return partitioned
+
+    def _sections(self):
+        '''
+        Build the parameters and the array sections that represent the
+        index in a saved file: the keys (as a string table), the sizes and
+        the hash values of the indexed sets, followed by the sorted (tagged)
+        band keys of every partition and band size.
+        '''
+        if self.is_empty():
+            raise ValueError("Cannot save an empty index")
+        rs = sorted(self.indexes[0].keys())
+        if self._unbalanced:
+            partitioned = self._rebalanced_entries()
+            frozen = [False for _ in self.indexes]
+        else:
+            partitioned = [self._partition_entries(i) if self._partition_size(i) else None
+                           for i in range(len(self.indexes))]
+            frozen = [isinstance(index[rs[0]], FrozenMinHashLSH)
+                      for index in self.indexes]
+        sections = []
+        keys = []
+        hashvalues = []
+        sizes = []
+        partitions = []
+        lowers = []
+        for i, entries in enumerate(partitioned):
+            if entries is None:
+                partitions.append((len(keys), len(keys)))
+                lowers.append(None)
+                continue
+            part_keys, part_hashvalues, part_sizes = entries
+            start = len(keys)
+            keys.extend(part_keys)
+            hashvalues.append(part_hashvalues)
+            sizes.append(part_sizes)
+            partitions.append((start, len(keys)))
+            lowers.append(int(part_sizes.min()))
+            for r in rs:
+                if frozen[i]:
+                    bands, ids = self._merge_delta(i, r, start)
+                else:
+                    bands, ids = self._band_keys(part_hashvalues, start, r)
+                sections.append(("bands.%d.%d" % (i, r), bands))
+                sections.append(("ids.%d.%d" % (i, r), ids))
+        encoded_keys = [key.encode('utf8') for key in keys]
+        key_offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        key_offsets[1:] = np.cumsum([len(key) for key in encoded_keys])
+        sections = [("hashvalues", np.concatenate(hashvalues).astype(np.uint32)),
+                    ("sizes", np.concatenate(sizes).astype(np.int64)),
+                    ("key_offsets", key_offsets),
+                    ("key_data", np.frombuffer(b''.join(encoded_keys), dtype=np.uint8))] + sections
+        header = {
+            "threshold": self.threshold,
+            "num_perm": self.h,
+            "m": self.m,
+            "seed": self.seed,
+            "xqs": self.xqs.tolist(),
+            "params": self.params.tolist(),
+            "lowers": lowers,
+            "rs": rs,
+            "partitions": partitions,
+        }
+        return (header, sections)
+
+    def save(self, path, metadata=None):
+        '''
+        Save the index to a file, which can be opened with
+        :func:`datasketch.MinHashLSHEnsemble.load`.
+
+        The file starts with a fixed-size header and a JSON document that
+        describes the parameters of the index and the location of every
+        array section. The sections store the keys (as a string table),
+        the sizes and the hash values of the indexed sets, followed by the
+        sorted (tagged) band keys of every partition and band size. All sections
+        are aligned, so that they can be mapped into memory without copying.
+
+        The changes made to a loaded index are merged into its sorted
+        arrays, and unbalanced partitions are redistributed in the saved
+        file (this index itself is not modified).
+
+        Args:
+            path (str): The path of the index file.
+            metadata (dict, optional): JSON serializable information stored
+                together with the index, available as the `metadata`
+                attribute of the loaded index.
+        '''
+        header, sections = self._sections()
+        offset = 0
+        section_info = dict()
+        for name, array in sections:
+            section_info[name] = (offset, array.dtype.str, array.shape)
+            offset += _aligned(array.nbytes)
+        header["sections"] = section_info
+        header["metadata"] = metadata
+        header = json.dumps(header).encode('utf8')
+        header_size = struct.calcsize(_index_file_header) + len(header)
+        # The file is written next to the destination and then renamed,
+        # so that an index loaded from `path` stays valid while saving
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as fd:
+            fd.write(struct.pack(_index_file_header, _index_file_magic,
+                                 _index_file_version, 0, len(header)))
+            fd.write(header)
+            fd.write(b'\0' * (_aligned(header_size) - header_size))
+            for name, array in sections:
+                data = np.ascontiguousarray(array).tobytes()
+                fd.write(data)
+                fd.write(b'\0' * (_aligned(len(data)) - len(data)))
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Open an index file written by :func:`datasketch.MinHashLSHEnsemble.save`.
+
+        The file is mapped into memory (read only) and the returned index
+        queries it in place, so loading is fast regardless of the index size
+        and processes that open the same file share its pages.
+
+        Args:
+            path (str): The path of the index file.
+
+        Returns:
+            datasketch.MinHashLSHEnsemble: The loaded index.
+        '''
+        with open(path, 'rb') as fd:
+            buf = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        fixed_size = struct.calcsize(_index_file_header)
+        magic, version, _, header_size = struct.unpack(
+            _index_file_header, buf[:fixed_size])
+        if magic != _index_file_magic:
+            raise ValueError("%s is not an LSH Ensemble index file" % path)
+        if version != _index_file_version:
+            raise ValueError("Unsupported LSH Ensemble index file version %d"
+                             % version)
+        header = json.loads(buf[fixed_size:fixed_size+header_size].decode('utf8'))
+        data_start = _aligned(fixed_size + header_size)
+
+        def section(name):
+            offset, dtype, shape = header["sections"][name]
+            count = int(np.prod(shape))
+            if count == 0:
+                return np.empty(shape, dtype=dtype)
+            return np.frombuffer(buf, dtype=dtype, count=count,
+                                 offset=data_start+offset).reshape(shape)
+
+        lsh = cls._from_sections(header, section)
+        lsh._buffer = buf
+        return lsh
+
+    def freeze(self):
+        '''
+        Convert the index into the read-only representation of a loaded
+        index file, without writing the file.
+
+        All keys, hash values and band keys are then held in a few numpy
+        arrays rather than in many small Python objects. Their memory is
+        never written by reference counting, so processes forked after
+        freezing keep sharing it (copy-on-write) instead of gradually
+        copying the whole index.
+
+        Returns:
+            datasketch.MinHashLSHEnsemble: The frozen index. It can still
+            be updated like a loaded index.
+        '''
+        header, sections = self._sections()
+        header["metadata"] = self.metadata
+        arrays = dict(sections)
+        return self._from_sections(header, arrays.__getitem__)
+
+    @classmethod
+    def _from_sections(cls, header, section):
+        '''
+        Create an index from the parameters and the array sections built
+        by :func:`datasketch.MinHashLSHEnsemble._sections`. `section` returns
+        the array of a section given its name.
+        '''
+        lsh = object.__new__(cls)
+        lsh.threshold = header["threshold"]
+        lsh.h = header["num_perm"]
+        lsh.m = header["m"]
+        lsh.xqs = np.array(header["xqs"])
+        lsh.params = np.array(header["params"], dtype=np.int)
+        lsh.lowers = header["lowers"]
+        lsh.seed = header["seed"]
+        lsh._unbalanced = False
+        lsh.metadata = header["metadata"]
+        lsh._store = _KeyStore(lsh.h,
+                               _KeyTable(section("key_offsets"), section("key_data")),
+                               section("hashvalues"), section("sizes"))
+        lsh.indexes = []
+        for i, id_range in enumerate(header["partitions"]):
+            index = dict()
+            for r in header["rs"]:
+                b = int(lsh.h / r)
+                if lsh.lowers[i] is None:
+                    bands = np.empty(0, dtype=np.uint64)
+                    ids = np.empty(0, dtype=np.int32)
+                else:
+                    bands = section("bands.%d.%d" % (i, r))
+                    ids = section("ids.%d.%d" % (i, r))
+                index[r] = FrozenMinHashLSH(lsh.h, (b, r), bands, ids, lsh._store,
+                                            tuple(id_range), lsh._store.removed)
+            lsh.indexes.append(index)
+        return lsh
 
     def is_empty(self):
         '''
         Returns:
             bool: Check if the index is empty.
         '''
-        return all(all(index[r].is_empty() for r in index) 
-                   for index in self.indexes) 
+        return all(self._partition_size(i) == 0 for i in range(len(self.indexes)))
+
+
+def _aligned(size):
+    '''Round `size` up to a multiple of the index file section alignment.'''
+    return -(-size // _index_file_alignment) * _index_file_alignment
+
+
+class _KeyTable(object):
+    '''
+    The keys of a loaded index, decoded on access from a string table.
+
+    Args:
+        offsets (numpy.array): The start offset of every key in `data`,
+            followed by the total size of `data`.
+        data (numpy.array): The UTF-8 encoded keys as an array of bytes.
+    '''
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+        self._ids = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i+1]].tobytes().decode('utf8')
+
+    def index(self, key):
+        # The reverse mapping is only needed by membership tests,
+        # so it is built on first use
+        if self._ids is None:
+            self._ids = dict((self[i], i) for i in range(len(self)))
+        try:
+            return self._ids[key]
+        except KeyError:
+            raise ValueError("The given key does not exist")
+
+    def __contains__(self, key):
+        try:
+            self.index(key)
+        except ValueError:
+            return False
+        return True
+
+
+class _KeyList(list):
+    '''
+    The keys of the sets given to :func:`MinHashLSHEnsemble.index`, with
+    the same lookup by key as :class:`_KeyTable`.
+    '''
+
+    _ids = None
+
+    def index(self, key):
+        if self._ids is None:
+            self._ids = dict((k, i) for i, k in enumerate(self))
+        try:
+            return self._ids[key]
+        except KeyError:
+            raise ValueError("The given key does not exist")
+
+class _KeyStore(object):
+    '''
+    The keys, sizes and hash values of the sets indexed by a
+    :class:`MinHashLSHEnsemble`. They are kept once for all partitions and
+    band sizes, whose LSH indexes only hold the entry ids of the sets.
+
+    The entry ids `[0, start)` are the sets of a loaded index, stored in
+    the arrays mapped from the index file. The sets inserted in memory
+    get the following ids, and their hash values and sizes are appended
+    to growing arrays.
+
+    Args:
+        num_perm (int): The number of permutation functions.
+        base_keys (optional): The keys of the loaded sets (see :class:`_KeyTable`).
+        base_hashvalues (numpy.array, optional): The hash values of the
+            loaded sets, one per row.
+        base_sizes (numpy.array, optional): The sizes of the loaded sets.
+    '''
+
+    def __init__(self, num_perm, base_keys=(), base_hashvalues=None,
+                 base_sizes=None):
+        self.base_keys = base_keys
+        self.base_hashvalues = base_hashvalues
+        self.base_sizes = base_sizes
+        self.start = len(base_keys)
+        # The entry ids of the removed loaded sets, shared with the
+        # loaded LSH indexes
+        self.removed = set()
+        # The keys of the sets inserted in memory, None once removed
+        self.keys = []
+        self._ids = dict()
+        self._hashvalues = np.empty((0, num_perm), dtype=np.uint64)
+        self._sizes = np.empty(0, dtype=np.int64)
+        self._partitions = np.empty(0, dtype=np.int32)
+        # The number of sets inserted in memory in every partition
+        self.counts = defaultdict(int)
+
+    def add(self, keys, hashvalues, sizes, partition):
+        '''
+        Add sets to a partition.
+
+        Returns:
+            `list` of the entry ids of the sets.
+        '''
+        n = len(self.keys)
+        end = n + len(keys)
+        if end > len(self._sizes):
+            # Grow geometrically, so that inserting sets one by one
+            # does not copy the arrays every time
+            capacity = max(end, 2 * len(self._sizes))
+            self._hashvalues = _grown(self._hashvalues, n, capacity)
+            self._sizes = _grown(self._sizes, n, capacity)
+            self._partitions = _grown(self._partitions, n, capacity)
+        self._hashvalues[n:end] = hashvalues
+        self._sizes[n:end] = sizes
+        self._partitions[n:end] = partition
+        ids = list(range(self.start + n, self.start + end))
+        self._ids.update(zip(keys, ids))
+        self.keys.extend(keys)
+        self.counts[partition] += len(keys)
+        return ids
+
+    def discard(self, i):
+        '''
+        Remove the set with entry id `i`. The hash values of a set inserted
+        in memory are kept until the index is rebalanced or saved.
+        '''
+        if i < self.start:
+            self.removed.add(i)
+            return
+        j = i - self.start
+        del self._ids[self.keys[j]]
+        self.keys[j] = None
+        self.counts[int(self._partitions[j])] -= 1
+        self._partitions[j] = -1
+
+    def index(self, key):
+        i = self._ids.get(key)
+        if i is not None:
+            return i
+        if self.start:
+            i = self.base_keys.index(key)
+            if i not in self.removed:
+                return i
+        raise ValueError("The given key does not exist")
+
+    def __contains__(self, key):
+        try:
+            self.index(key)
+        except ValueError:
+            return False
+        return True
+
+    def __getitem__(self, i):
+        if i < self.start:
+            return self.base_keys[i]
+        return self.keys[i - self.start]
+
+    def partition(self, i):
+        '''Get the partition of a set inserted in memory.'''
+        return int(self._partitions[i - self.start])
+
+    def members(self, partition):
+        '''
+        Get the entry ids of the sets inserted in memory in a partition,
+        in the order they were inserted.
+        '''
+        return np.flatnonzero(self._partitions[:len(self.keys)] == partition) + self.start
+
+    def hashvalues(self, ids):
+        '''Get the hash values of the sets with the given entry ids.'''
+        return self._gather(ids, self.base_hashvalues, self._hashvalues)
+
+    def sizes(self, ids):
+        '''Get the sizes of the sets with the given entry ids.'''
+        return self._gather(ids, self.base_sizes, self._sizes)
+
+    def _gather(self, ids, base, inserted):
+        ids = np.asarray(ids, dtype=np.int64)
+        values = np.empty((len(ids), ) + inserted.shape[1:], dtype=inserted.dtype)
+        loaded = ids < self.start
+        if loaded.any():
+            values[loaded] = base[ids[loaded]]
+        values[~loaded] = inserted[ids[~loaded] - self.start]
+        return values
+
+
+def _grown(array, n, capacity):
+    '''Copy the first `n` rows of `array` into a new array of `capacity` rows.'''
+    grown = np.empty((capacity, ) + array.shape[1:], dtype=array.dtype)
+    grown[:n] = array[:n]
+    return grown
 
 
 if __name__ == "__main__":
@@ -10,6 +10,61 @@ _mersenne_prime = (1 << 61) - 1
 _max_hash = (1 << 32) - 1
 _hash_range = (1 << 32)
 
+# The permutation function parameters only depend on the seed and the number
+# of permutation functions, so they are generated once per process and
+# shared (read-only) by every MinHash created with the same arguments.
+_permutations_cache = dict()
+
+# The maximum number of (value, permutation) rows hashed at once by the
+# batch methods, which bounds the size of the temporary 2-D arrays.
+_batch_rows = 8192
+
+
+def _get_permutations(num_perm, seed):
+    '''Get the permutation function parameters for the given seed and
+    number of permutation functions, generating them on the first call.
+
+    Args:
+        num_perm (int): Number of random permutation functions.
+        seed (int): The random seed.
+
+    Returns:
+        numpy.array: A read-only array of shape `(2, num_perm)`.
+    '''
+    key = (seed, num_perm)
+    permutations = _permutations_cache.get(key)
+    if permutations is None:
+        generator = np.random.RandomState(seed)
+        # Create parameters for a random bijective permutation function
+        # that maps a 32-bit hash value to another 32-bit hash value.
+        # http://en.wikipedia.org/wiki/Universal_hashing
+        permutations = np.array([(generator.randint(1, _mersenne_prime, dtype=np.uint64),
+                                  generator.randint(0, _mersenne_prime, dtype=np.uint64))
+                                 for _ in range(num_perm)], dtype=np.uint64).T
+        permutations.setflags(write=False)
+        _permutations_cache[key] = permutations
+    return permutations
+
+
+def _hash_values(b, hashobj):
+    '''Hash every value in `b` into a 32-bit integer.'''
+    digests = b''.join(hashobj(v).digest()[:4] for v in b)
+    return np.frombuffer(digests, dtype='<u4').astype(np.uint64)
+
+
+def _permute(hv, permutations):
+    '''Apply all permutation functions to every hash value in `hv`.
+
+    Returns:
+        numpy.array: An array of shape `(num_perm, len(hv))`. Each row holds
+            one permutation function, so reductions over the values of a
+            set run along contiguous memory.
+    '''
+    a, b = permutations
+    return np.bitwise_and((a[:, np.newaxis] * hv + b[:, np.newaxis]) % _mersenne_prime,
+                          np.uint64(_max_hash))
+
+
 class MinHash(object):
     '''MinHash is a probabilistic data structure for computing 
     `Jaccard similarity`_ between sets.
@@ -28,7 +83,8 @@ class MinHash(object):
             initialization using the existing state from another MinHash. 
         permutations (optional): The permutation function parameters. This argument
             can be specified for faster initialization using the existing
-            state from another MinHash.
+            state from another MinHash. If not given, the parameters are
+            taken from a process-wide cache keyed by `seed` and `num_perm`.
     
     Note:
         To save memory usage, consider using :class:`datasketch.LeanMinHash`.
@@ -73,13 +129,7 @@ class MinHash(object):
         if permutations is not None:
             self.permutations = permutations
         else:
-            generator = np.random.RandomState(self.seed)
-            # Create parameters for a random bijective permutation function
-            # that maps a 32-bit hash value to another 32-bit hash value.
-            # http://en.wikipedia.org/wiki/Universal_hashing
-            self.permutations = np.array([(generator.randint(1, _mersenne_prime, dtype=np.uint64),
-                                           generator.randint(0, _mersenne_prime, dtype=np.uint64))
-                                          for _ in range(num_perm)], dtype=np.uint64).T
+            self.permutations = _get_permutations(num_perm, self.seed)
         if len(self) != len(self.permutations[0]):
             raise ValueError("Numbers of hash values and permutations mismatch")
 
@@ -107,6 +157,80 @@ class MinHash(object):
         phv = np.bitwise_and((a * hv + b) % _mersenne_prime, np.uint64(_max_hash))
         self.hashvalues = np.minimum(phv, self.hashvalues)
 
+    def update_batch(self, b):
+        '''Update this MinHash with multiple values at once. The values are
+        hashed into a 2-D array and reduced with a single vectorized minimum,
+        which is much faster than calling :meth:`update` for each value.
+
+        Args:
+            b (list): The values of type `bytes`.
+
+        Example:
+            To update with multiple string values:
+
+            .. code-block:: python
+
+                minhash.update_batch([s.encode('utf-8') for s in values])
+        '''
+        if len(b) == 0:
+            return
+        phv = _permute(_hash_values(b, self.hashobj), self.permutations)
+        self.hashvalues = np.minimum(phv.min(axis=1), self.hashvalues)
+
+    @classmethod
+    def bulk(cls, b, num_perm=128, seed=1, hashobj=sha1):
+        '''Create MinHash objects for many sets at once. The values of
+        consecutive sets are hashed together into 2-D arrays and every set
+        is reduced with one vectorized minimum per batch of rows.
+
+        Args:
+            b (list): A list of sets, each is a list of values of type `bytes`.
+            num_perm (int, optional): Number of random permutation functions.
+            seed (int, optional): The random seed.
+            hashobj (optional): The hash function used by the MinHash objects.
+
+        Returns:
+            list: A list of :class:`datasketch.MinHash`, one for each set in `b`.
+
+        Example:
+            To create MinHash objects for a list of string sets:
+
+            .. code-block:: python
+
+                minhashes = MinHash.bulk([[s.encode('utf-8') for s in values]
+                                          for values in sets], num_perm=256)
+        '''
+        permutations = _get_permutations(num_perm, seed)
+        minhashes = []
+        batch = []
+        batch_rows = 0
+        for values in b:
+            batch.append(values)
+            batch_rows += len(values)
+            if batch_rows >= _batch_rows:
+                minhashes.extend(cls._bulk_batch(batch, num_perm, seed,
+                                                 hashobj, permutations))
+                batch = []
+                batch_rows = 0
+        if batch:
+            minhashes.extend(cls._bulk_batch(batch, num_perm, seed, hashobj,
+                                             permutations))
+        return minhashes
+
+    @classmethod
+    def _bulk_batch(cls, b, num_perm, seed, hashobj, permutations):
+        lengths = np.array([len(values) for values in b], dtype=np.int64)
+        hashvalues = np.ones((len(b), num_perm), dtype=np.uint64)*_max_hash
+        non_empty = np.flatnonzero(lengths)
+        if len(non_empty):
+            hv = _hash_values([v for values in b for v in values], hashobj)
+            phv = _permute(hv, permutations)
+            # Offsets of the first row of every non-empty set
+            offsets = (np.cumsum(lengths) - lengths)[non_empty]
+            hashvalues[non_empty] = np.minimum.reduceat(phv, offsets, axis=1).T
+        return [cls(seed=seed, hashobj=hashobj, hashvalues=hvs,
+                    permutations=permutations) for hvs in hashvalues]
+
     def jaccard(self, other):
         '''Estimate the `Jaccard similarity`_ (resemblance) between the sets
         represented by this MinHash and the other.
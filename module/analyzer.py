@@ -11,15 +11,21 @@ import os
 import re
 import time
 from collections import Counter, OrderedDict
+from itertools import imap
+from multiprocessing.pool import ThreadPool
 
 import networkx as nx
+import numpy as np
 from datasketch import MinHash
+from networkx.algorithms import bipartite
 from tqdm import tqdm
 
 import module.config as config
 from androguard.core.analysis import analysis
 from androguard.core.bytecodes import apk, dvm
 from androguard.util import read
+from module import binary_profile, bip_cache, solvers
+from module.catalogue import LibraryCatalogue
 from module.call_graph_matching import Method, match
 from module.config import FILE_LOGGER, LOGGER, MODE
 
@@ -39,6 +45,9 @@ class LibAnalyzer(object):
         self._classes_interfaces = dict()
         self._classes_superclass = dict()
 
+        # The MinHashes precomputed in a library profile (see profiler.py)
+        self.classes_minhashes = None
+
         self.LIB_RELATIONSHIP_GRAPHS = dict()
 
         LOGGER.info("Start loading %s ...", os.path.basename(file_path))
@@ -70,14 +79,31 @@ class LibAnalyzer(object):
         self._lib_shrink_percentage = dict()
         self._lsh_classes = set()
 
+        # The libraries and classes of the LSH (see catalogue.py)
+        self.catalogue = None
+        # The candidates of the library matches below are keyed by library id in the catalogue
         self._pmatch_app_classes = dict()
         self._pmatch_lib_classes = dict()
         self._pmatch_lib_app_classes = dict()
 
+        # The class matches of the last matched version of each library (see _match_libraries)
+        self._warm_start_class_matches = dict()
+        # The app relationships between the candidate classes of the versions of each library
+        self._app_relationships = dict()
+        # The BIP solves stopped at the time or node limit (see _match_relationship_graph_for_lib)
+        self._bip_timeouts = []
+
         self.mode = None
         self.consider_classes_repackaging = True
         self.shrink_threshold = None
         self.similarity_threshold = None
+        self.solver = None
+        # The results of the BIP problems solved by all analyzers (and processes), None for no cache
+        self.bip_cache = None
+        # The number of threads that match different libraries in parallel
+        self.lib_threads = 1
+        # The number of threads that solve the independent parts of a BIP problem in parallel
+        self.bip_threads = 1
 
     # Initialization related methods
     # ---------------------------------------------------------
@@ -111,9 +137,17 @@ class LibAnalyzer(object):
             self.dx = [_dx]
             self.classes_names = self._get_classes_names()
 
-        elif file_type == ".json":
-            with open(file_path) as fd:
-                data = json.load(fd)
+            # A dex file has no manifest (when it is analysed as an app)
+            self.filename = os.path.basename(file_path)
+            self.appID = None
+            self.permissions = []
+
+        elif file_type in (".json", binary_profile.EXTENSION):
+            if file_type == ".json":
+                with open(file_path) as fd:
+                    data = json.load(fd)
+            else:
+                data = binary_profile.read_binary_profile(file_path)
 
             # If this is an app profile
             if "appID" in data:
@@ -126,6 +160,7 @@ class LibAnalyzer(object):
                 self.lib_version = data["version"]
                 self.category = data["category"]
                 self.root_package = data["root_package"]
+                self.classes_minhashes = data.get("classes_minhashes")
 
             self._classes_signatures = data["classes_signatures"]
             self.classes_names = self._classes_signatures.keys()
@@ -404,12 +439,6 @@ class LibAnalyzer(object):
 
         return "/".join(string.split("/")[:level])
 
-    def _update_dict_value_with_key(self, d, k, v):
-        if k in d:
-            d[k].add(v)
-        else:
-            d[k] = set([v])
-
     def _get_interfaces_num(self, class_name, lib_name=None):
         interface_graph = self.LIB_RELATIONSHIP_GRAPHS[lib_name][1] if lib_name else self._interface_graph
 
@@ -418,36 +447,34 @@ class LibAnalyzer(object):
 
         return 0
 
-    def _get_raw_class_matches(self, class_name, lsh):
-        if not self._classes_signatures:
-            self.get_classes_signatures()
-
-        class_signatures = self._classes_signatures[class_name]
-
-        if class_signatures:
-            self._lsh_classes.update([class_name])
-
-            m = MinHash(num_perm=config.LSH_PERM_NUM)
-            for signature in class_signatures:
-                m.update(signature.encode('utf8'))
-
-            matches = lsh.query(m, len(class_signatures))
-
-            return set(matches)
-        else:
-            return set()
-
     def _get_raw_classes_matches(self, lsh, exclude_builtin):
         start_time = time.time()
         LOGGER.info("Start matching classes ...")
 
-        for class_name in tqdm(self.classes_names):
+        if not self._classes_signatures:
+            self.get_classes_signatures()
+
+        query_classes = []
+        for class_name in self.classes_names:
             # Exclude builtin libraries can speed up the matching
             if exclude_builtin and class_name.startswith(("Landroid/support", "Lcom/google/android/gms")):
-                self._class_libs_matches[class_name] = set()
+                self._class_libs_matches[class_name] = np.empty(0, dtype=np.int32)
+            elif not self._classes_signatures[class_name]:
+                self._class_libs_matches[class_name] = np.empty(0, dtype=np.int32)
             else:
-                matches = self._get_raw_class_matches(class_name, lsh)
-                self._class_libs_matches[class_name] = matches
+                query_classes.append(class_name)
+
+        minhashes = MinHash.bulk(
+            [[signature.encode('utf8') for signature in self._classes_signatures[class_name]]
+             for class_name in query_classes],
+            num_perm=config.LSH_PERM_NUM,
+            seed=config.LSH_SEED)
+
+        # All classes are queried at once, and the matched lib classes are given by their ids in the catalogue
+        sizes = [len(self._classes_signatures[class_name]) for class_name in query_classes]
+        for class_name, matches in zip(query_classes, lsh.query_many_ids(minhashes, sizes)):
+            self._lsh_classes.add(class_name)
+            self._class_libs_matches[class_name] = matches
 
         end_time = time.time()
 
@@ -463,9 +490,9 @@ class LibAnalyzer(object):
         return shrink_percentage
 
     def _is_pmatch_reach_threshold(self, lib):
-        lib_signature_num = int(lib.split("|")[3])
+        lib_signature_num = int(self.catalogue.signature_nums[lib])
 
-        LOGGER.debug("shrink percentage (before matching): %s, %f", lib, self._get_shrink_percentage(
+        LOGGER.debug("shrink percentage (before matching): %s, %f", self.catalogue.names[lib], self._get_shrink_percentage(
             self._pmatch_app_classes[lib], lib_signature_num))
 
         if self._get_shrink_percentage(self._pmatch_app_classes[lib], lib_signature_num) < self.shrink_threshold:
@@ -473,6 +500,29 @@ class LibAnalyzer(object):
 
         return True
 
+    def _get_shrink_percentage_upper_bound(self, lib, lib_signature_num):
+        """Get an upper bound of the shrink percentage that matching the library can reach, without solving the BIP.
+
+        Every app class is matched to at most one lib class (and vice versa), so at most as many app classes as the maximum matching between the potential class matches (ignoring all other constraints) can be matched. Their signatures are bounded by the signatures of that number of app classes with the most signatures.
+
+        Args:
+            lib (int): The library id in the catalogue.
+            lib_signature_num (int): The number of signatures in the library.
+
+        Returns:
+            float: The upper bound of the shrink percentage.
+        """
+
+        # Lib and app classes may have the same name
+        G = nx.Graph()
+        G.add_edges_from(((0, lib_class), (1, app_class)) for (lib_class, app_class) in self._pmatch_lib_app_classes[lib])
+        max_matched_classes_num = len(bipartite.maximum_matching(G)) // 2
+
+        signature_nums = sorted((len(self._classes_signatures[class_name]) for class_name in set(self._pmatch_app_classes[lib])), reverse=True)
+        signature_num_upper_bound = sum(signature_nums[:max_matched_classes_num])
+
+        return min(signature_num_upper_bound / float(lib_signature_num), self._get_shrink_percentage(self._pmatch_app_classes[lib], lib_signature_num))
+
     def _get_possible_matches(self):
         """Get all possible libraries in this app.
 
@@ -480,21 +530,32 @@ class LibAnalyzer(object):
         we regard it as a library candidate.
         """
 
-        for class_name in self.classes_names:
-            class_matches = self._class_libs_matches[class_name]
-
-            if class_matches:
-                for lib_class_match in class_matches:
-                    [match_lib, match_class] = lib_class_match.split("->")
-                    lib_name = match_lib.split("|")[0]
-
-                    if self.mode == MODE.SCALABLE or self._get_interfaces_num(class_name) <= self._get_interfaces_num(match_class, lib_name):
-                        self._update_dict_value_with_key(
-                            self._pmatch_app_classes, match_lib, class_name)
-                        self._update_dict_value_with_key(
-                            self._pmatch_lib_classes, match_lib, match_class)
-                        self._update_dict_value_with_key(
-                            self._pmatch_lib_app_classes, match_lib, (match_class, class_name))
+        # All (app class, lib class) candidate pairs, grouped by library below
+        app_class_names = [class_name for class_name in self.classes_names if len(self._class_libs_matches[class_name])]
+        class_matches = [self._class_libs_matches[class_name] for class_name in app_class_names]
+        lib_class_ids = np.concatenate(class_matches) if class_matches else np.empty(0, dtype=np.int32)
+        app_class_ids = np.repeat(np.arange(len(app_class_names)), [len(matches) for matches in class_matches])
+        lib_ids = self.catalogue.class_libs[lib_class_ids]
+
+        if self.mode != MODE.SCALABLE:
+            app_interfaces_nums = [self._get_interfaces_num(class_name) for class_name in app_class_names]
+            keep = np.array([app_interfaces_nums[app_class_id] <= self._get_interfaces_num(
+                self.catalogue.class_names[lib_class_id], self.catalogue.names[lib_id])
+                for app_class_id, lib_class_id, lib_id in zip(app_class_ids.tolist(), lib_class_ids.tolist(), lib_ids.tolist())],
+                dtype=bool)
+            lib_class_ids, app_class_ids, lib_ids = lib_class_ids[keep], app_class_ids[keep], lib_ids[keep]
+
+        order = np.argsort(lib_ids, kind='mergesort')
+        lib_class_ids, app_class_ids, lib_ids = lib_class_ids[order], app_class_ids[order], lib_ids[order]
+        bounds = np.cumsum(np.bincount(lib_ids, minlength=len(self.catalogue))).tolist()
+        for lib, (start, end) in enumerate(zip([0] + bounds[:-1], bounds)):
+            if start == end:
+                continue
+            pairs = set((self.catalogue.class_names[lib_class_id], app_class_names[app_class_id])
+                        for lib_class_id, app_class_id in zip(lib_class_ids[start:end].tolist(), app_class_ids[start:end].tolist()))
+            self._pmatch_lib_app_classes[lib] = pairs
+            self._pmatch_lib_classes[lib] = set(pair[0] for pair in pairs)
+            self._pmatch_app_classes[lib] = set(pair[1] for pair in pairs)
 
         for lib in self._pmatch_lib_classes.keys():
             if not self._is_pmatch_reach_threshold(lib):
@@ -633,43 +694,55 @@ class LibAnalyzer(object):
         else:
             self._package_libs_matches[package] = [lib_name]
 
-    def _check_package_lib_match(self, lib_name, package, matched_classes_pairs, lib_class_num, lib_signature_num):
+    def _get_package_lib_match(self, lib_name, package, matched_classes_pairs, lib_class_num, lib_signature_num):
+        """Check if the library matches the package.
+
+        Returns:
+            tuple: (lib_name, similarity, package) if the similarity reaches the threshold, otherwise None.
+        """
+
         similarity = self._get_lib_match_similarity(
             matched_classes_pairs, lib_name, lib_class_num, lib_signature_num)
 
         LOGGER.debug("similarity: %s : %f", lib_name, similarity)
 
         if similarity > self.similarity_threshold:
-            lib_name_base = lib_name.split("_")[0] + "_"
-
-            # If there are libraries already matched to the package
-            if package in self._package_libs_matches:
-                existed_lib = [
-                    lib for lib in self._package_libs_matches[package] if lib.startswith(lib_name_base)]
-                # If libraries with the same name have matched to the package
-                if existed_lib:
-                    if abs(similarity - self._libs_matches[existed_lib[0]]) < 0.0001:
-                        self._bind_lib_to_package(
-                            lib_name, similarity, package)
-                    elif similarity > self._libs_matches[existed_lib[0]]:
-                        for lib in existed_lib:
-                            del self._libs_matches[lib]
-                            for _package in self._lib_packages_matches[lib]:
-                                self._package_libs_matches[_package].remove(
-                                    lib)
-                            del self._lib_packages_matches[lib]
-
-                        self._bind_lib_to_package(
-                            lib_name, similarity, package)
+            return (lib_name, similarity, package)
 
-                else:
-                    self._bind_lib_to_package(lib_name, similarity, package)
-            else:
-                self._bind_lib_to_package(lib_name, similarity, package)
+        return None
 
-            return True
+    def _bind_package_lib_match(self, lib_name, similarity, package):
+        """Bind the library to the package unless a version of the library with a higher similarity is already bound to it.
 
-        return False
+        The result depends on the order of the bindings, which is the order of the libraries in _match_libraries.
+        """
+
+        lib_name_base = lib_name.split("_")[0] + "_"
+
+        # If there are libraries already matched to the package
+        if package in self._package_libs_matches:
+            existed_lib = [
+                lib for lib in self._package_libs_matches[package] if lib.startswith(lib_name_base)]
+            # If libraries with the same name have matched to the package
+            if existed_lib:
+                if abs(similarity - self._libs_matches[existed_lib[0]]) < 0.0001:
+                    self._bind_lib_to_package(
+                        lib_name, similarity, package)
+                elif similarity > self._libs_matches[existed_lib[0]]:
+                    for lib in existed_lib:
+                        del self._libs_matches[lib]
+                        for _package in self._lib_packages_matches[lib]:
+                            self._package_libs_matches[_package].remove(
+                                lib)
+                        del self._lib_packages_matches[lib]
+
+                    self._bind_lib_to_package(
+                        lib_name, similarity, package)
+
+            else:
+                self._bind_lib_to_package(lib_name, similarity, package)
+        else:
+            self._bind_lib_to_package(lib_name, similarity, package)
 
     def _get_root_package(self, class_names):
         """Get the root package of the classes.
@@ -784,8 +857,15 @@ class LibAnalyzer(object):
 
         lib_method_calls, lib_interfaces, lib_superclasses = self._get_relationship_between_classes(
             lib_class_names, lib_name)
-        app_method_calls, app_interfaces, app_superclasses = self._get_relationship_between_classes(
-            app_class_names)
+
+        # Versions of a library usually share the same candidate app classes
+        lib_name_base = lib_name.split("_")[0]
+        app_relationships = self._app_relationships.setdefault(lib_name_base, dict())
+        app_class_names_key = frozenset(app_class_names)
+        if app_class_names_key not in app_relationships:
+            app_relationships[app_class_names_key] = self._get_relationship_between_classes(
+                app_class_names)
+        app_method_calls, app_interfaces, app_superclasses = app_relationships[app_class_names_key]
 
         app_class_weights = dict()
         for class_name in app_class_names:
@@ -799,20 +879,73 @@ class LibAnalyzer(object):
 
         LOGGER.debug("potential matches: %d, lib calls: %d, method_calls: %d", len(
             potential_class_matches), len(lib_method_calls), len(app_method_calls))
-        
-        return match(lib_classnames=lib_class_names,
-                     app_classnames=app_class_names,
-                     potential_class_matches=potential_class_matches,
-                     lib_method_calls=lib_method_calls,
-                     app_method_calls=app_method_calls,
-                     app_class_weights=app_class_weights,
-                     lib_class_parents=lib_superclasses,
-                     app_class_parents=app_superclasses,
-                     lib_class_interfaces=lib_interfaces,
-                     app_class_interfaces=app_interfaces,
-                     use_pkg_hierarchy=not self.consider_classes_repackaging,
-                     assume_flattened_package=assume_flattened_package,
-                     flattened_app_pkgs_allowed=childless_packages)
+
+        # Start from the class matches of the previous version of this library
+        warm_start_class_matches = self._warm_start_class_matches.setdefault(lib_name_base, dict())
+        start_class_matches = warm_start_class_matches.get(assume_flattened_package)
+        if start_class_matches is not None:
+            LOGGER.debug("warm start: %d of %d class matches reused", len(
+                start_class_matches & potential_class_matches), len(start_class_matches))
+
+        match_args = dict(lib_classnames=lib_class_names,
+                          app_classnames=app_class_names,
+                          potential_class_matches=potential_class_matches,
+                          lib_method_calls=lib_method_calls,
+                          app_method_calls=app_method_calls,
+                          app_class_weights=app_class_weights,
+                          lib_class_parents=lib_superclasses,
+                          app_class_parents=app_superclasses,
+                          lib_class_interfaces=lib_interfaces,
+                          app_class_interfaces=app_interfaces,
+                          use_pkg_hierarchy=not self.consider_classes_repackaging,
+                          assume_flattened_package=assume_flattened_package,
+                          flattened_app_pkgs_allowed=childless_packages,
+                          solver=self.solver,
+                          start_class_matches=start_class_matches,
+                          threads=self.bip_threads)
+
+        # Identical libraries in different apps give identical BIP problems. Only the results of the solvers are cached
+        use_cache = self.bip_cache is not None and self.solver in solvers.SOLVERS
+        cache_key = bip_cache.get_key(match_args) if use_cache else None
+        cached_result = self.bip_cache.get(cache_key) if use_cache else None
+        if cached_result is not None:
+            LOGGER.debug("BIP result of %s found in the cache", lib_name)
+            warm_start_class_matches[assume_flattened_package] = cached_result[1]
+            return cached_result
+
+        weight, class_matches, status = match(**match_args)
+
+        if status == solvers.HEURISTIC:
+            # The heuristic solvers always find a solution, which may not be optimal
+            return weight, class_matches
+
+        if status == solvers.SOLVED:
+            warm_start_class_matches[assume_flattened_package] = class_matches
+            if use_cache:
+                self.bip_cache.put(cache_key, weight, class_matches)
+            return weight, class_matches
+
+        # The solver stopped at the time or node limit
+        fallback = "incumbent"
+        if status == solvers.NO_SOLUTION:
+            if self.mode == MODE.ACCURATE:
+                # Fall back to the LibID-S decision, whose BIP has no relationship constraints
+                LOGGER.warning("No solution of %s within the BIP limits, falling back to LibID-S", lib_name)
+                fallback = "scalable"
+                match_args.update(lib_method_calls=[], app_method_calls=[], lib_class_parents=None, app_class_parents=None,
+                                  lib_class_interfaces=None, app_class_interfaces=None, start_class_matches=None)
+                weight, class_matches, status = match(**match_args)
+
+            if status == solvers.NO_SOLUTION:
+                LOGGER.warning("No solution of %s within the BIP limits", lib_name)
+                fallback = "none"
+                weight, class_matches = 0, set()
+
+        self._bip_timeouts.append(OrderedDict([('library', lib_name),
+                                               ('assume_flattened_package', assume_flattened_package),
+                                               ('fallback', fallback)]))
+
+        return weight, class_matches
     
     def _check_if_library_match(self, lib, lib_name, class_num, signature_num, assume_flattened_package=False):
         start_time = time.time()
@@ -836,38 +969,112 @@ class LibAnalyzer(object):
         if shrink_percentage > self.shrink_threshold:
             matched_root_package = self._get_root_package(
                 matched_app_classes)
-            return self._check_package_lib_match(
+            return self._get_package_lib_match(
                 lib_name, matched_root_package, matched_classes_pairs, int(class_num), int(signature_num))
         else:
-            return False
+            return None
+
+    def _get_lib_version_key(self, lib):
+        """Get the sorting key of a library so that the versions of the same library are sorted next to each other.
+
+        Args:
+            lib (int): The library id in the catalogue.
+
+        Returns:
+            tuple: (the library name, the version numbers and strings).
+        """
+
+        lib_name = self.catalogue.names[lib]
+        version = "_".join(lib_name.split("_")[1:])
+        version_key = tuple(int(part) if part.isdigit() else part for part in re.split(r'(\d+)', version))
+
+        return (lib_name.split("_")[0], version_key)
+
+    def _match_library(self, lib):
+        """Match a library to the app.
+
+        Returns:
+            tuple: (whether the library is skipped by the shrink percentage upper bound, the (lib_name, similarity, package) match or None if the library does not match).
+        """
+
+        lib_name = self.catalogue.names[lib]
+        class_num = int(self.catalogue.class_nums[lib])
+        signature_num = int(self.catalogue.signature_nums[lib])
+
+        # The library cannot match if even the upper bound of its shrink percentage does not reach the threshold
+        shrink_percentage_upper_bound = self._get_shrink_percentage_upper_bound(lib, signature_num)
+        if shrink_percentage_upper_bound <= self.shrink_threshold:
+            LOGGER.debug("Skip %s: shrink percentage upper bound %f", lib_name, shrink_percentage_upper_bound)
+            return True, None
+
+        package_lib_match = self._check_if_library_match(lib, lib_name, class_num, signature_num)
+
+        if not package_lib_match and self.consider_classes_repackaging:
+            LOGGER.debug("Try matching considering class repackaging")
+            LOGGER.debug("---------------------------------------------------")
+            package_lib_match = self._check_if_library_match(lib, lib_name, class_num, signature_num, True)
+
+        return False, package_lib_match
+
+    def _match_library_versions(self, libs):
+        """Match the versions of a library one after another, so that the BIP of each version is warm-started from the previous one."""
+
+        lib_name_base = self.catalogue.names[libs[0]].split("_")[0]
+        results = [self._match_library(lib) for lib in libs]
+
+        self._warm_start_class_matches.pop(lib_name_base, None)
+        self._app_relationships.pop(lib_name_base, None)
+
+        return results
 
     def _match_libraries(self):
         self._get_possible_matches()
 
         library_matching_start = time.time()
         LOGGER.info("Start matching libraries ...")
-        for lib in tqdm(self._pmatch_app_classes):
-            # lib = "lib_name|root_package|class_num|sig_num|category|"
-            [lib_name, root_package, class_num,
-                signature_num, category, _] = lib.split("|")
-            self._lib_info[lib_name] = [root_package, category]
 
-            is_match = self._check_if_library_match(lib, lib_name, class_num, signature_num)
-            
-            if not is_match and self.consider_classes_repackaging:
-                LOGGER.debug("Try matching considering class repackaging")
-                LOGGER.debug("---------------------------------------------------")
-                self._check_if_library_match(lib, lib_name, class_num, signature_num, True)
+        libs = sorted(self._pmatch_app_classes, key=self._get_lib_version_key)
+        libs_versions = OrderedDict()
+        for lib in libs:
+            lib_name = self.catalogue.names[lib]
+            self._lib_info[lib_name] = [self.catalogue.root_packages[lib], self.catalogue.categories[lib]]
+            libs_versions.setdefault(lib_name.split("_")[0], []).append(lib)
+
+        # Different libraries are matched in parallel
+        threads = min(self.lib_threads, len(libs_versions))
+        if threads > 1:
+            pool = ThreadPool(threads)
+            results = pool.imap(self._match_library_versions, libs_versions.values())
+        else:
+            results = imap(self._match_library_versions, libs_versions.values())
+
+        # The results are bound in the order of the libraries, whatever order they are completed in
+        skipped_libs_num = 0
+        for versions_results in tqdm(results, total=len(libs_versions)):
+            for (skipped, package_lib_match) in versions_results:
+                if skipped:
+                    skipped_libs_num += 1
+                elif package_lib_match:
+                    self._bind_package_lib_match(*package_lib_match)
+
+        if threads > 1:
+            pool.close()
+            pool.join()
+
+        lib_indices = dict((self.catalogue.names[lib], i) for i, lib in enumerate(libs))
+        self._bip_timeouts.sort(key=lambda timeout: (lib_indices[timeout['library']], timeout['assume_flattened_package']))
 
         library_matching_end = time.time()
 
+        LOGGER.info("%d of %d libraries skipped by the shrink percentage upper bound", skipped_libs_num, len(self._pmatch_app_classes))
         LOGGER.info("Libraries matching finished. Duration: %fs", library_matching_end - library_matching_start)
 
 
     # LibID core methods (API)
     # ---------------------------------------------------------
 
-    def get_libraries(self, lsh, mode=MODE.SCALABLE, repackage=False, LIB_RELATIONSHIP_GRAPHS=None, exclude_builtin=True):
+    def get_libraries(self, lsh, mode=MODE.SCALABLE, repackage=False, LIB_RELATIONSHIP_GRAPHS=None, exclude_builtin=True, solver=None, catalogue=None,
+                      bip_cache_path=None, lib_threads=None, bip_threads=None):
         """Get all third party libraries used in this app.
         
         Args:
@@ -876,6 +1083,11 @@ class LibAnalyzer(object):
             repackage (bool, optional): Defaults to False. Should LibID consider classes repackaging?
             LIB_RELATIONSHIP_GRAPHS (dict, optional): Defaults to None. A dictionary of the library relation graphs. LIB_RELATIONSHIP_GRAPHS[lib_name] = (call_graph, interface_graph, inheritance graph).
             exclude_builtin (bool, optional): Defaults to True. Should LibID exclude builtin Android libraries?
+            solver (str, optional): Defaults to None. The solver of the class matching BIP problem. One of call_graph_matching.SOLVERS. If solver is None then config.BIP_SOLVER is used.
+            catalogue (LibraryCatalogue, optional): Defaults to None. The catalogue of the libraries and classes in the LSH. If catalogue is None then it is built from the LSH, which takes a while for a large LSH, so it should be built once for all apps.
+            bip_cache_path (str, optional): Defaults to None. The SQLite database that caches the solved BIP problems across apps and runs (see bip_cache.py). If bip_cache_path is None then config.BIP_CACHE_PATH is used, and if that is None too then no cache is used.
+            lib_threads (int, optional): Defaults to None. The number of threads that match different libraries in parallel. The threads only run in parallel while a solver (Gurobi or CBC) holds no GIL, so they do not speed up the other solvers. If lib_threads is None then config.LIB_MATCHING_THREADS is used.
+            bip_threads (int, optional): Defaults to None. The number of threads that solve the independent parts of a BIP problem in parallel with the gurobi or cbc solver. If bip_threads is None then config.BIP_THREADS is used.
         
         Returns:
             dict: Library matches.
@@ -886,6 +1098,12 @@ class LibAnalyzer(object):
         self.consider_classes_repackaging = repackage
         self.shrink_threshold = config.SHRINK_THRESHOLD_ACCURATE if mode == MODE.ACCURATE else config.SHRINK_THRESHOLD_SCALABLE
         self.similarity_threshold = config.PROBABILITY_THRESHOLD_ACCURATE if mode == MODE.ACCURATE else config.PROBABILITY_THRESHOLD_SCALABLE
+        self.solver = solver if solver else config.BIP_SOLVER
+        self.catalogue = catalogue if catalogue is not None else LibraryCatalogue(lsh)
+        bip_cache_path = bip_cache_path if bip_cache_path else config.BIP_CACHE_PATH
+        self.bip_cache = bip_cache.get_cache(bip_cache_path, config.BIP_CACHE_SIZE) if bip_cache_path else None
+        self.lib_threads = lib_threads if lib_threads else config.LIB_MATCHING_THREADS
+        self.bip_threads = bip_threads if bip_threads else config.BIP_THREADS
 
         if not self._package_classes:
             self._build_packages_info()
@@ -929,7 +1147,8 @@ class LibAnalyzer(object):
         json_info = OrderedDict([('filename', self.filename),
                                  ('appID', self.appID),
                                  ('permissions', self.permissions),
-                                 ('libraries', self._get_libs_matches_detail_info())
+                                 ('libraries', self._get_libs_matches_detail_info()),
+                                 ('bip_timeouts', self._bip_timeouts)
                                  ])
 
         return json_info
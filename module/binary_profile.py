@@ -0,0 +1,316 @@
+# @Description: Compact binary profile format for LibID
+
+"""Reading and writing app/library profiles in a compact binary format.
+
+A binary profile holds the same information as a JSON profile. Class names,
+xrefs, interfaces and superclasses are interned in a string table, and class
+signatures (SHA-1 hex strings) are stored as raw digests in one contiguous
+array. The file layout is::
+
+    header:  magic (8s) | version (u32) | digest size (u8)
+    section: tag (4s) | payload length (u64) | payload
+    ...
+
+with the sections:
+
+    META  the JSON encoded profile information (name, version, appID, ...)
+    STRS  the string table: count | end offsets in characters (u32) | size (u32) | utf-8 data
+    SIGS  count | class ids (u32) | signature counts (u32) | digests
+    XREF  count | class ids (u32) | xref counts (u32) | xref ids (u32) | xref weights (u32)
+    INTF  count | class ids (u32) | interface counts (u32) | interface ids (u32)
+    SUPR  count | class ids (u32) | superclass ids (u32)
+    MHSH  (optional) seed (u64) | num_perm (u32) | signature num (u32) | count |
+          class ids (u32) | signature counts (u32) | hash values (u32, count x num_perm)
+
+All integers are little-endian. Unknown sections are skipped by the reader.
+"""
+
+import binascii
+import gc
+import json
+import struct
+from collections import OrderedDict
+
+import numpy as np
+
+EXTENSION = ".lbp"
+
+_magic = b"LIBIDPRF"
+_version = 1
+_header = struct.Struct("<8sIB")
+_section_header = struct.Struct("<4sQ")
+_count = struct.Struct("<I")
+_minhashes_header = struct.Struct("<QII")
+_digest_sizes = (8, 20)
+
+_class_fields = ("classes_signatures", "classes_xref_tos",
+                 "classes_interfaces", "classes_superclass",
+                 "classes_minhashes")
+
+
+class _StringTable(object):
+    '''Interns strings and assigns each of them an integer id.'''
+
+    def __init__(self):
+        self.ids = dict()
+        self.strings = []
+
+    def id(self, string):
+        if string not in self.ids:
+            self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return self.ids[string]
+
+    def ids_of(self, strings):
+        return [self.id(s) for s in strings]
+
+    def pack(self):
+        # The offsets count characters so that the reader can decode the
+        # whole table at once and slice the decoded text
+        text = [s if isinstance(s, unicode) else s.decode('utf8')
+                for s in self.strings]
+        ends = np.cumsum([len(s) for s in text], dtype='<u4')
+        data = u"".join(text).encode('utf8')
+        return (_count.pack(len(text)) + ends.tobytes() +
+                _count.pack(len(data)) + data)
+
+
+def _u4(values):
+    return np.asarray(values, dtype='<u4').tobytes()
+
+
+def _pack_signatures(classes_signatures, strings, digest_size):
+    class_names = classes_signatures.keys()
+    width = 2 * digest_size
+    digests = binascii.unhexlify("".join(
+        signature[:width]
+        for class_name in class_names
+        for signature in classes_signatures[class_name]))
+    return (_count.pack(len(class_names)) + _u4(strings.ids_of(class_names)) +
+            _u4([len(classes_signatures[c]) for c in class_names]) + digests)
+
+
+def _pack_xrefs(classes_xref_tos, strings):
+    class_names = classes_xref_tos.keys()
+    xrefs = [classes_xref_tos[c].items() for c in class_names]
+    return (_count.pack(len(class_names)) + _u4(strings.ids_of(class_names)) +
+            _u4([len(x) for x in xrefs]) +
+            _u4([strings.id(xref) for x in xrefs for xref, _ in x]) +
+            _u4([weight for x in xrefs for _, weight in x]))
+
+
+def _pack_interfaces(classes_interfaces, strings):
+    class_names = classes_interfaces.keys()
+    return (_count.pack(len(class_names)) + _u4(strings.ids_of(class_names)) +
+            _u4([len(classes_interfaces[c]) for c in class_names]) +
+            _u4([strings.id(interface) for c in class_names
+                 for interface in classes_interfaces[c]]))
+
+
+def _pack_superclasses(classes_superclass, strings):
+    class_names = classes_superclass.keys()
+    return (_count.pack(len(class_names)) + _u4(strings.ids_of(class_names)) +
+            _u4(strings.ids_of(classes_superclass[c] for c in class_names)))
+
+
+def _pack_minhashes(classes_minhashes, strings):
+    hashvalues = classes_minhashes["hashvalues"]
+    if isinstance(hashvalues, basestring):
+        hashvalues = binascii.a2b_base64(hashvalues)
+    else:
+        hashvalues = np.asarray(hashvalues, dtype='<u4').tobytes()
+    class_names = classes_minhashes["classes"]
+    return (_minhashes_header.pack(classes_minhashes["seed"],
+                                   classes_minhashes["num_perm"],
+                                   classes_minhashes["signature_num"]) +
+            _count.pack(len(class_names)) + _u4(strings.ids_of(class_names)) +
+            _u4(classes_minhashes["sizes"]) + hashvalues)
+
+
+def write_binary_profile(file_path, obj, digest_size=20):
+    """Write a profile to a binary profile file.
+
+    Args:
+        file_path (str): The path of the binary profile.
+        obj (dict): The profile information, as returned by `LibAnalyzer.get_classes_signatures_json_info` or `LibAnalyzer.get_lib_classes_signatures_json_info`.
+        digest_size (int, optional): Defaults to 20. The number of bytes kept of each SHA-1 signature, either 20 or 8. Profiles with 8-byte signatures can only be matched against profiles with 8-byte signatures.
+    """
+
+    if digest_size not in _digest_sizes:
+        raise ValueError("digest_size must be one of %s" % (_digest_sizes, ))
+
+    strings = _StringTable()
+    meta = OrderedDict(
+        (k, v) for k, v in obj.iteritems() if k not in _class_fields)
+
+    sections = [
+        ("SIGS", _pack_signatures(obj["classes_signatures"], strings,
+                                  digest_size)),
+        ("XREF", _pack_xrefs(obj["classes_xref_tos"], strings)),
+        ("INTF", _pack_interfaces(obj["classes_interfaces"], strings)),
+        ("SUPR", _pack_superclasses(obj["classes_superclass"], strings)),
+    ]
+    if obj.get("classes_minhashes"):
+        sections.append(("MHSH", _pack_minhashes(obj["classes_minhashes"],
+                                                 strings)))
+    sections = [("META", json.dumps(meta)), ("STRS", strings.pack())] + sections
+
+    with open(file_path, 'wb') as fd:
+        fd.write(_header.pack(_magic, _version, digest_size))
+        for tag, payload in sections:
+            fd.write(_section_header.pack(tag, len(payload)))
+            fd.write(payload)
+
+
+class _Reader(object):
+    '''Sequentially reads the arrays of a section payload.'''
+
+    def __init__(self, data, offset):
+        self.data = data
+        self.offset = offset
+
+    def count(self):
+        (n, ) = _count.unpack_from(self.data, self.offset)
+        self.offset += _count.size
+        return n
+
+    def u4(self, n):
+        values = np.frombuffer(
+            self.data, dtype='<u4', count=n, offset=self.offset)
+        self.offset += 4 * n
+        return values
+
+    def bytes(self, n):
+        self.offset += n
+        return self.data[self.offset - n:self.offset]
+
+
+def _read_strings(reader):
+    n = reader.count()
+    ends = reader.u4(n).tolist()
+    text = reader.bytes(reader.count()).decode('utf8')
+    starts = [0] + ends[:-1]
+    return [text[s:e] for s, e in zip(starts, ends)]
+
+
+def _split(values, counts):
+    ends = np.cumsum(counts).tolist()
+    starts = [0] + ends[:-1]
+    return [values[s:e] for s, e in zip(starts, ends)]
+
+
+def _read_signatures(reader, strings, digest_size):
+    n = reader.count()
+    class_names = [strings[i] for i in reader.u4(n).tolist()]
+    counts = reader.u4(n)
+    width = 2 * digest_size
+    hexdigests = binascii.hexlify(reader.bytes(int(counts.sum()) * digest_size))
+    signatures = [
+        hexdigests[i:i + width] for i in xrange(0, len(hexdigests), width)
+    ]
+    return dict(zip(class_names, _split(signatures, counts)))
+
+
+def _read_xrefs(reader, strings):
+    n = reader.count()
+    class_names = [strings[i] for i in reader.u4(n).tolist()]
+    counts = reader.u4(n)
+    total = int(counts.sum())
+    xrefs = [strings[i] for i in reader.u4(total).tolist()]
+    weights = reader.u4(total).tolist()
+    return dict(
+        zip(class_names,
+            [dict(x) for x in _split(zip(xrefs, weights), counts)]))
+
+
+def _read_interfaces(reader, strings):
+    n = reader.count()
+    class_names = [strings[i] for i in reader.u4(n).tolist()]
+    counts = reader.u4(n)
+    interfaces = [strings[i] for i in reader.u4(int(counts.sum())).tolist()]
+    return dict(zip(class_names, _split(interfaces, counts)))
+
+
+def _read_superclasses(reader, strings):
+    n = reader.count()
+    class_names = [strings[i] for i in reader.u4(n).tolist()]
+    return dict(zip(class_names,
+                    [strings[i] for i in reader.u4(n).tolist()]))
+
+
+def _read_minhashes(reader, strings):
+    (seed, num_perm, signature_num) = _minhashes_header.unpack_from(
+        reader.data, reader.offset)
+    reader.offset += _minhashes_header.size
+    n = reader.count()
+    class_names = [strings[i] for i in reader.u4(n).tolist()]
+    sizes = reader.u4(n).tolist()
+    hashvalues = reader.u4(n * num_perm).reshape(n, num_perm)
+    return OrderedDict([('seed', seed), ('num_perm', num_perm),
+                        ('signature_num', signature_num),
+                        ('classes', class_names), ('sizes', sizes),
+                        ('hashvalues', hashvalues)])
+
+
+def read_binary_profile(file_path):
+    """Read a binary profile file.
+
+    Args:
+        file_path (str): The path of the binary profile.
+
+    Raises:
+        ValueError: If the file is not a binary profile or its version is not supported.
+
+    Returns:
+        dict: The profile information, in the same form as a loaded JSON profile.
+    """
+
+    with open(file_path, 'rb') as fd:
+        data = fd.read()
+
+    # The profile is built from many small containers that are never cyclic,
+    # so the cyclic garbage collector would only slow the loading down
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _read_profile(file_path, data)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _read_profile(file_path, data):
+    (magic, version, digest_size) = _header.unpack_from(data, 0)
+    if magic != _magic:
+        raise ValueError("%s is not a binary profile" % file_path)
+    if version != _version or digest_size not in _digest_sizes:
+        raise ValueError("Unsupported binary profile version %d (digest size %d)" %
+                         (version, digest_size))
+
+    sections = dict()
+    offset = _header.size
+    while offset < len(data):
+        (tag, length) = _section_header.unpack_from(data, offset)
+        offset += _section_header.size
+        sections[tag] = (offset, length)
+        offset += length
+
+    (meta_offset, meta_length) = sections["META"]
+    profile = json.loads(
+        data[meta_offset:meta_offset + meta_length],
+        object_pairs_hook=OrderedDict)
+    strings = _read_strings(_Reader(data, sections["STRS"][0]))
+
+    profile["classes_signatures"] = _read_signatures(
+        _Reader(data, sections["SIGS"][0]), strings, digest_size)
+    profile["classes_xref_tos"] = _read_xrefs(
+        _Reader(data, sections["XREF"][0]), strings)
+    profile["classes_interfaces"] = _read_interfaces(
+        _Reader(data, sections["INTF"][0]), strings)
+    profile["classes_superclass"] = _read_superclasses(
+        _Reader(data, sections["SUPR"][0]), strings)
+    if "MHSH" in sections:
+        profile["classes_minhashes"] = _read_minhashes(
+            _Reader(data, sections["MHSH"][0]), strings)
+
+    return profile
@@ -0,0 +1,216 @@
+# @Description: On-disk cache of solved BIP problems for LibID
+
+"""A persistent cache of the results of `call_graph_matching.match`.
+
+Apps often embed identical copies of a library, so the same class matching
+BIP is solved again and again. The cache is keyed by a hash of the
+canonicalised input of `match` (the potential class matches, method calls,
+superclasses, interfaces, weights and options), and holds the objective value
+and the class matches of the solution.
+
+The cache is a SQLite database, so it is shared by the worker processes and
+kept across runs. Every process (and thread) opens its own connection. When the cache
+holds more than its maximum number of results, the least recently used ones
+are evicted.
+
+Lookups only read the database, so that the worker processes do not wait
+for each other's write lock on every cache hit. The last use of the hits is
+written in batches, and the number of results is counted by every process
+rather than queried on every insert, so the eviction is approximate.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import thread
+import threading
+import time
+
+from module.config import LOGGER
+
+# The version of the BIP formulation and of the cached results, which is part
+# of the key. Increase it when `call_graph_matching.match` or a solver changes
+# its results, so that the results of older versions are no longer used
+CACHE_VERSION = 1
+
+# The input of `match` that does not change its optimal objective value. The
+# warm start and the number of threads may change which of several optimal
+# solutions is found, so a cached result can be a different (equally good)
+# solution than a new solve
+_ignored_args = ("start_class_matches", "threads")
+
+# The number of cache hits whose last use is written at once
+_touch_batch_size = 100
+# The number of results stored by a process before it counts all results of the cache again
+_recount_interval = 1000
+# The fraction of the maximum size that is evicted at once when the cache is full
+_eviction_fraction = 0.1
+
+# The caches by path (see get_cache)
+_caches = dict()
+
+
+def get_key(match_args):
+    """Get the cache key of a BIP problem.
+
+    The warm start (`start_class_matches`) is not part of the key, so that the problem is found in the cache whatever version of the library was matched before. If the problem has several optimal solutions, the cached one may differ from the one a new solve would find.
+
+    Args:
+        match_args (dict): The keyword arguments of `call_graph_matching.match`.
+
+    Returns:
+        str: The SHA-256 hex digest of the canonicalised arguments and CACHE_VERSION.
+    """
+
+    def canonicalise(value):
+        if isinstance(value, dict):
+            return sorted([canonicalise(k), canonicalise(v)] for (k, v) in value.iteritems())
+        elif isinstance(value, tuple):
+            return [canonicalise(v) for v in value]
+        elif isinstance(value, (list, set, frozenset)):
+            # The order of method calls, interfaces, etc. does not matter
+            return sorted(canonicalise(v) for v in value)
+        elif isinstance(value, float):
+            return repr(value)
+        return value
+
+    canonical_args = sorted([name, canonicalise(value)] for (name, value) in match_args.iteritems()
+                            if name not in _ignored_args)
+    canonical_args.insert(0, ["version", CACHE_VERSION])
+
+    return hashlib.sha256(json.dumps(canonical_args, separators=(",", ":"))).hexdigest()
+
+
+def get_cache(path, max_size):
+    """Get the cache of a database, which is shared by all analyzers of the process. The database is only opened when the cache is first used."""
+    if path not in _caches:
+        _caches[path] = BIPCache(path, max_size)
+    return _caches[path]
+
+
+class BIPCache(object):
+    """A least recently used cache of BIP results in a SQLite database."""
+
+    def __init__(self, path, max_size):
+        self.path = os.path.expanduser(path)
+        self.max_size = max_size
+        # The connections by (process id, thread id)
+        self._connections = dict()
+        # The state of the current process (see _get_state)
+        self._state = None
+
+    def _get_state(self):
+        # The pending last uses and the number of results are not shared with forked processes
+        if self._state is None or self._state["pid"] != os.getpid():
+            self._state = dict(pid=os.getpid(),
+                               lock=threading.Lock(),
+                               touched=dict(),
+                               size=None,
+                               puts=0)
+        return self._state
+
+    def _connect(self):
+        # A SQLite connection cannot be shared with forked processes or other threads
+        connection_key = (os.getpid(), thread.get_ident())
+        if connection_key not in self._connections:
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+
+            connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""CREATE TABLE IF NOT EXISTS results (
+                                      key TEXT PRIMARY KEY,
+                                      objective REAL,
+                                      class_matches TEXT,
+                                      last_used REAL)""")
+            connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+            connection.commit()
+            self._connections[connection_key] = connection
+
+        return self._connections[connection_key]
+
+    def get(self, key):
+        """Get the result of a BIP problem.
+
+        Args:
+            key (str): The key of the problem (see get_key).
+
+        Returns:
+            tuple: (the objective value, the set of class matches), or None if the result is not cached.
+        """
+
+        try:
+            connection = self._connect()
+            row = connection.execute("SELECT objective, class_matches FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+
+            state = self._get_state()
+            with state["lock"]:
+                state["touched"][key] = time.time()
+                touched = None
+                if len(state["touched"]) >= _touch_batch_size:
+                    (touched, state["touched"]) = (state["touched"], dict())
+            if touched:
+                self._write_last_uses(connection, touched)
+                connection.commit()
+        except sqlite3.Error as e:
+            LOGGER.warning("BIP cache error: %s", e)
+            return None
+
+        (objective, class_matches) = row
+        return objective, set(tuple(pcm) for pcm in json.loads(class_matches))
+
+    def put(self, key, objective, class_matches):
+        """Store the result of a BIP problem, and evict the least recently used results if the cache is full.
+
+        The pending last uses of the cache hits are written too.
+
+        Args:
+            key (str): The key of the problem (see get_key).
+            objective (float): The objective value.
+            class_matches (set): The class matches.
+        """
+
+        try:
+            connection = self._connect()
+            state = self._get_state()
+            with state["lock"]:
+                (touched, state["touched"]) = (state["touched"], dict())
+            self._write_last_uses(connection, touched)
+
+            inserted = connection.execute("INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?)",
+                                          (key, objective, json.dumps(sorted(class_matches)), time.time())).rowcount
+            if not inserted:
+                connection.execute("UPDATE results SET objective = ?, class_matches = ?, last_used = ? WHERE key = ?",
+                                   (objective, json.dumps(sorted(class_matches)), time.time(), key))
+
+            with state["lock"]:
+                state["puts"] += 1
+                if state["size"] is None or state["puts"] % _recount_interval == 0:
+                    # Other processes store results too
+                    state["size"] = None
+                else:
+                    state["size"] += inserted
+                size = state["size"]
+            if size is None or size > self.max_size:
+                (size,) = connection.execute("SELECT COUNT(*) FROM results").fetchone()
+                if size > self.max_size:
+                    # Evict more than needed, so that the cache is not full again after the next insert
+                    evicted_num = size - self.max_size + int(self.max_size * _eviction_fraction)
+                    connection.execute("""DELETE FROM results WHERE key IN (
+                                              SELECT key FROM results ORDER BY last_used LIMIT ?)""",
+                                       (evicted_num,))
+                    size = max(size - evicted_num, 0)
+                with state["lock"]:
+                    state["size"] = size
+            connection.commit()
+        except sqlite3.Error as e:
+            LOGGER.warning("BIP cache error: %s", e)
+
+    def _write_last_uses(self, connection, touched):
+        if touched:
+            connection.executemany("UPDATE results SET last_used = ? WHERE key = ?",
+                                   [(last_used, key) for (key, last_used) in touched.iteritems()])
@@ -1,27 +1,105 @@
-import itertools
-from os.path import basename
-from collections import namedtuple
+import time
+from os.path import basename, dirname
+from collections import Counter, namedtuple
 
-from gurobipy import GRB, LinExpr, Model, and_
+import networkx as nx
+import numpy as np
+from scipy.optimize import linear_sum_assignment
 
-from module.config import LOGGER
+from module import solvers
+from module.config import BIP_NODE_LIMIT, BIP_THREADS, BIP_TIME_LIMIT, LOGGER
+from module.solvers import LinExpr, Model
 
 ROOT_PKG = '<ROOT>'
 
+# The solvers that approximate the BIP without an integer programming solver
+GREEDY_SOLVER = 'greedy'
+ASSIGNMENT_SOLVER = 'assignment'
+
+# The solvers that can be used by `match`
+SOLVERS = list(solvers.SOLVERS) + [GREEDY_SOLVER, ASSIGNMENT_SOLVER]
+
 Method = namedtuple(
     'Method', ['class1', 'class2', 'parameters1', 'parameters2', 'count'])
 
 
-def get_method_matching_candidates(lib_method_calls, app_method_calls):
-    res1 = itertools.product(lib_method_calls, app_method_calls)
-    res2 = [(r[0], r[1], i) for i, r in enumerate(res1) if r[0].parameters1 ==
-            r[1].parameters1 and r[0].parameters2 == r[1].parameters2 and r[0].count >= r[1].count]
-    return res2
+def get_method_matching_candidates(lib_method_calls, app_method_calls, potential_class_matches=None):
+    """Get the pairs of lib and app method calls that can be matched.
+
+    Rather than comparing all pairs, the app method calls are indexed by their parameters (and their caller class if `potential_class_matches` is given), so that every lib method call is only compared with the app method calls that have the same parameters.
+
+    Args:
+        lib_method_calls (list): The lib method calls.
+        app_method_calls (list): The app method calls.
+        potential_class_matches (set, optional): Defaults to None. If given, only the pairs whose caller and callee classes can be matched are returned.
+
+    Returns:
+        list: The (lib method call, app method call, index) tuples sorted by index, which identifies the pair (it is the index of the pair in the product of the method calls).
+    """
+    app_method_calls_num = len(app_method_calls)
+
+    if potential_class_matches is None:
+        app_method_calls_index = {}
+        for j, app_method_call in enumerate(app_method_calls):
+            key = (app_method_call.parameters1, app_method_call.parameters2)
+            app_method_calls_index.setdefault(key, []).append((j, app_method_call))
+
+        candidates = []
+        for i, lib_method_call in enumerate(lib_method_calls):
+            key = (lib_method_call.parameters1, lib_method_call.parameters2)
+            for (j, app_method_call) in app_method_calls_index.get(key, ()):
+                if lib_method_call.count >= app_method_call.count:
+                    candidates.append((lib_method_call, app_method_call, i * app_method_calls_num + j))
+
+        return candidates
+
+    lib_class_candidates = {}
+    for (lib_class, app_class) in potential_class_matches:
+        lib_class_candidates.setdefault(lib_class, []).append(app_class)
+
+    app_method_calls_index = {}
+    for j, app_method_call in enumerate(app_method_calls):
+        key = (app_method_call.parameters1, app_method_call.parameters2, app_method_call.class1)
+        app_method_calls_index.setdefault(key, []).append((j, app_method_call))
+
+    candidates = []
+    for i, lib_method_call in enumerate(lib_method_calls):
+        for app_class1 in lib_class_candidates.get(lib_method_call.class1, ()):
+            key = (lib_method_call.parameters1, lib_method_call.parameters2, app_class1)
+            for (j, app_method_call) in app_method_calls_index.get(key, ()):
+                if lib_method_call.count >= app_method_call.count and \
+                        (lib_method_call.class2, app_method_call.class2) in potential_class_matches:
+                    candidates.append((lib_method_call, app_method_call, i * app_method_calls_num + j))
+
+    candidates.sort(key=lambda candidate: candidate[2])
+    return candidates
 
 
 def match(lib_classnames, app_classnames, potential_class_matches, lib_method_calls, app_method_calls, app_class_weights, lib_class_parents=None, app_class_parents=None,
           lib_class_interfaces=None, app_class_interfaces=None, use_pkg_hierarchy=True, assume_flattened_package=False,
-          flattened_app_pkgs_allowed=None, use_call_graph_constraints=True):
+          flattened_app_pkgs_allowed=None, use_call_graph_constraints=True, solver='gurobi', start_class_matches=None, threads=None):
+    """Match the lib classes to the app classes by solving a BIP problem.
+
+    `start_class_matches` (e.g., the class matches of another version of the library) is given to the solver as the initial solution of the class match variables.
+
+    The independent components of the BIP are solved by `threads` threads in parallel (config.BIP_THREADS if `threads` is None).
+
+    The solver stops at config.BIP_TIME_LIMIT and config.BIP_NODE_LIMIT. If it stops before finding any solution, the objective value and the class matches are None.
+
+    Returns:
+        tuple: (the objective value, the set of class matches, the solver status: solvers.SOLVED, solvers.INCUMBENT or solvers.NO_SOLUTION, or solvers.HEURISTIC for the GREEDY_SOLVER and ASSIGNMENT_SOLVER)
+    """
+
+    if solver == GREEDY_SOLVER:
+        return match_greedy(lib_classnames, app_classnames, potential_class_matches, lib_method_calls, app_method_calls, app_class_weights,
+                            lib_class_parents, app_class_parents, lib_class_interfaces, app_class_interfaces, use_pkg_hierarchy,
+                            assume_flattened_package, flattened_app_pkgs_allowed, use_call_graph_constraints)
+    elif solver == ASSIGNMENT_SOLVER:
+        return match_assignment(lib_classnames, app_classnames, potential_class_matches, lib_method_calls, app_method_calls,
+                                app_class_weights, lib_class_parents, app_class_parents, lib_class_interfaces, app_class_interfaces,
+                                use_pkg_hierarchy, assume_flattened_package, flattened_app_pkgs_allowed, use_call_graph_constraints)
+
+    build_start_time = time.time()
 
     m = Model("")
 
@@ -31,13 +109,20 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
         LOGGER.debug('%d lib methods, %d app methods', len(lib_method_calls), len(app_method_calls))
     else:
         m.setParam('OutputFlag', False)
+    m.setParam('TimeLimit', BIP_TIME_LIMIT)
+    m.setParam('NodeLimit', BIP_NODE_LIMIT)
 
     class_match_vars = {}
     lib_class_match_count_exprs = {}
     app_class_match_count_exprs = {}
+    # The app classes that every lib class can match
+    lib_class_app_matches = {}
     for pcm in potential_class_matches:
-        class_match_vars[pcm] = m.addVar(vtype=GRB.BINARY)
+        class_match_vars[pcm] = m.addVar()
+        if start_class_matches is not None:
+            class_match_vars[pcm].start = 1 if pcm in start_class_matches else 0
         (lib_class, app_class) = pcm
+        lib_class_app_matches.setdefault(lib_class, set()).add(app_class)
 
         if lib_class not in lib_class_match_count_exprs:
             lib_class_match_count_exprs[lib_class] = LinExpr(0)
@@ -55,7 +140,7 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
 
     app_class_used_vars = {}
     for app_class in app_classnames:
-        app_class_used_vars[app_class] = m.addVar(vtype=GRB.BINARY)
+        app_class_used_vars[app_class] = m.addVar()
         if app_class in app_class_match_count_exprs:
             m.addConstr(app_class_used_vars[app_class]
                         == app_class_match_count_exprs[app_class])
@@ -66,8 +151,8 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
 
     methods_matched_total_expr = LinExpr(0)
     if use_call_graph_constraints:
-        method_matching_candidates = [cand for cand in get_method_matching_candidates(
-            lib_method_calls, app_method_calls)]
+        method_matching_candidates = get_method_matching_candidates(
+            lib_method_calls, app_method_calls, class_match_vars)
 
         lib_method_match_count_exprs = {}
         app_method_match_count_exprs = {}
@@ -85,7 +170,7 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
             lib_app_class1 = (lib_method_call.class1, app_method_call.class1)
             lib_app_class2 = (lib_method_call.class2, app_method_call.class2)
             if lib_app_class1 in class_match_vars and lib_app_class2 in class_match_vars:
-                method_matching_vars[mm] = m.addVar(vtype=GRB.BINARY)
+                method_matching_vars[mm] = m.addVar()
                 m.addConstr(
                     method_matching_vars[mm] <= class_match_vars[lib_app_class1])
                 m.addConstr(
@@ -104,9 +189,9 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
         for app_method_call, expr in app_method_match_count_exprs.iteritems():
             app_method_class1 = app_method_call.class1
             app_method_class2 = app_method_call.class2
-            tmp = m.addVar(vtype=GRB.BINARY)
-            m.addConstr(tmp == and_(
-                app_class_used_vars[app_method_class1], app_class_used_vars[app_method_class2]))
+            tmp = m.addVar()
+            m.addGenConstrAnd(
+                tmp, [app_class_used_vars[app_method_class1], app_class_used_vars[app_method_class2]])
             m.addConstr(expr == tmp)
 
     if use_pkg_hierarchy:
@@ -133,13 +218,19 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
         LOGGER.debug('All lib packages: %s', all_lib_pkgs)
         LOGGER.debug('All app packages: %s', all_app_pkgs)
 
-        potential_package_matches = list(
-            itertools.product(all_lib_pkgs, all_app_pkgs))
+        # Only the packages of the potential class matches (and their parent packages) need to be matched
+        potential_package_matches = set()
+        for (lib_class, app_class) in potential_class_matches:
+            potential_package_matches.update(_get_ancestor_package_matches(
+                lib_class_pkg_dict[lib_class], app_class_pkg_dict[app_class], lib_pkg_parent_dict, app_pkg_parent_dict))
+        potential_package_matches = sorted(potential_package_matches)
+
+        LOGGER.debug('%d potential package matches (instead of %d package pairs)',
+                     len(potential_package_matches), len(all_lib_pkgs) * len(all_app_pkgs))
 
         package_matches_vars = {}
         for (lib_pkg, app_pkg) in potential_package_matches:
-            match_var = m.addVar(vtype=GRB.BINARY, name=(
-                '%s/%s' % (lib_pkg, app_pkg)))
+            match_var = m.addVar(name=('%s/%s' % (lib_pkg, app_pkg)))
             package_matches_vars[(lib_pkg, app_pkg)] = match_var
 
             if lib_pkg not in lib_pkg_match_cnt_exprs:
@@ -179,7 +270,7 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
             app_class_pkg = app_class_pkg_dict[app_class]
             ppm = (lib_class_pkg, app_class_pkg)
 
-            if ppm in potential_package_matches:
+            if ppm in package_matches_vars:
                 m.addConstr(class_match_vars[pcm] <= package_matches_vars[ppm])
             else:
                 m.addConstr(class_match_vars[pcm] == 0)
@@ -200,7 +291,7 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
             flattened_app_pkgs_allowed = ['/' + pkg for pkg in flattened_app_pkgs_allowed]
 
         for pkg in flattened_app_pkgs_allowed:
-            app_pkg_active_vars[pkg] = m.addVar(vtype=GRB.BINARY, name=('%s' % pkg))
+            app_pkg_active_vars[pkg] = m.addVar(name=('%s' % pkg))
             active_pkgs_cnt_expr += app_pkg_active_vars[pkg]
 
         m.addConstr(active_pkgs_cnt_expr <= 1)
@@ -220,12 +311,12 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
     if lib_class_parents:
         for pcm in potential_class_matches:
             (lib_class, app_class) = pcm
-            parent_lib = lib_class_parents[lib_class] if lib_class in lib_class_parents else None
-            parent_app = app_class_parents[app_class] if app_class in app_class_parents else None
+            parent_lib = lib_class_parents.get(lib_class)
+            parent_app = app_class_parents.get(app_class)
             if parent_lib:
                 if parent_app:
                     parents_match = (parent_lib, parent_app)
-                    if parents_match in class_match_vars.keys():
+                    if parents_match in class_match_vars:
                         if not assume_flattened_package or (basename(lib_class) == basename(parent_lib) and basename(app_class) == basename(parent_app)):
                             m.addConstr(
                                 class_match_vars[pcm] <= class_match_vars[parents_match])
@@ -239,42 +330,51 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
         
         for app_class, app_class_parent in app_class_parents.iteritems():
             if app_class in app_class_used_vars and app_class_parent in app_class_used_vars:
-                app_class_and_parent_matched = m.addVar(vtype=GRB.BINARY)
+                app_class_and_parent_matched = m.addVar()
                 m.addConstr(app_class_used_vars[app_class] >= app_class_and_parent_matched)
                 m.addConstr(app_class_used_vars[app_class_parent] >= app_class_and_parent_matched)
                 app_parents_and_interf_matched_expr += app_class_and_parent_matched
 
     # Interface matching
     if lib_class_interfaces:
+        # The number of matched interfaces of every lib class and app class
+        matched_lib_interfaces_exprs = {}
+        matched_app_interfaces_exprs = {}
+        app_interfaces_sets = {}
         for pcm in potential_class_matches:
             (lib_class, app_class) = pcm
-            interfaces_lib_class = lib_class_interfaces[lib_class] if lib_class in lib_class_interfaces else []
-            interfaces_app_class = app_class_interfaces[app_class] if app_class in app_class_interfaces else []
-
-            matched_interfaces_expr = LinExpr(0)
-            for lib_interface in interfaces_lib_class:
+            interfaces_lib_class = lib_class_interfaces.get(lib_class, [])
+
+            if lib_class not in matched_lib_interfaces_exprs:
+                matched_lib_interfaces_expr = LinExpr(0)
+                for lib_interface in interfaces_lib_class:
+                    if lib_interface in lib_class_match_count_exprs:
+                        matched_lib_interfaces_expr += lib_class_match_count_exprs[lib_interface]
+                matched_lib_interfaces_exprs[lib_class] = matched_lib_interfaces_expr
+
+            if app_class not in matched_app_interfaces_exprs:
+                interfaces_app_class = app_class_interfaces.get(app_class, [])
+                matched_app_interfaces_expr = LinExpr(0)
                 for app_interface in interfaces_app_class:
-                    interfaces_match = (lib_interface, app_interface)
-                    if interfaces_match in class_match_vars:
-                        if not assume_flattened_package or (basename(lib_class) == basename(lib_interface) and basename(app_class) == basename(app_interface)):
-                            matched_interfaces_expr += class_match_vars[interfaces_match]
+                    if app_interface in app_class_match_count_exprs:
+                        matched_app_interfaces_expr += app_class_match_count_exprs[app_interface]
+                matched_app_interfaces_exprs[app_class] = matched_app_interfaces_expr
+                app_interfaces_sets[app_class] = set(interfaces_app_class)
 
-            matched_lib_interfaces_expr = LinExpr(0)
-            matched_app_interfaces_expr = LinExpr(0)
+            # The interfaces of the lib class that can match the interfaces of the app class
+            matched_interfaces_expr = LinExpr(0)
             for lib_interface in interfaces_lib_class:
-                if lib_interface in lib_class_match_count_exprs:
-                    matched_lib_interfaces_expr += lib_class_match_count_exprs[lib_interface]
-            for app_interface in interfaces_app_class:
-                if app_interface in app_class_match_count_exprs:
-                    matched_app_interfaces_expr += app_class_match_count_exprs[app_interface]
+                for app_interface in app_interfaces_sets[app_class].intersection(lib_class_app_matches.get(lib_interface, ())):
+                    if not assume_flattened_package or (basename(lib_class) == basename(lib_interface) and basename(app_class) == basename(app_interface)):
+                        matched_interfaces_expr += class_match_vars[(lib_interface, app_interface)]
 
             m.addConstr(2 * matched_interfaces_expr ==
-                        matched_app_interfaces_expr + matched_lib_interfaces_expr)
+                        matched_app_interfaces_exprs[app_class] + matched_lib_interfaces_exprs[lib_class])
 
         for app_class, app_class_interfaces in app_class_interfaces.iteritems():
             for interface in app_class_interfaces:
                 if app_class in app_class_used_vars and interface in app_class_used_vars:
-                    app_class_and_interface_matched = m.addVar(vtype=GRB.BINARY)
+                    app_class_and_interface_matched = m.addVar()
                     m.addConstr(app_class_used_vars[app_class] >= app_class_and_interface_matched)
                     m.addConstr(app_class_used_vars[interface] >= app_class_and_interface_matched)
                     app_parents_and_interf_matched_expr += app_class_and_interface_matched
@@ -287,11 +387,19 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
     for app_class in app_classnames:
         weight = app_class_weights[app_class]
         objective_expr += weight * app_class_used_vars[app_class]
-    m.setObjective(objective_expr, GRB.MAXIMIZE)
+    m.setObjective(objective_expr)
 
+    optimize_start_time = time.time()
+    LOGGER.debug('Model built in %fs: %d variables, %d constraints',
+                 optimize_start_time - build_start_time, len(m.vars), len(m.constrs))
     LOGGER.debug('Optimizing...')
 
-    m.optimize()
+    m.optimize(solver, threads=threads if threads else BIP_THREADS)
+
+    LOGGER.debug('Optimized in %fs', time.time() - optimize_start_time)
+
+    if m.status == solvers.NO_SOLUTION:
+        return (None, None, m.status)
 
     matched_app_classes = set()
     class_matches = set()
@@ -367,7 +475,331 @@ def match(lib_classnames, app_classnames, potential_class_matches, lib_method_ca
 
         LOGGER.debug('Objective value: %0.4f', m.objval)
 
-    return (m.objval, class_matches)
+    return (m.objval, class_matches, m.status)
+
+
+def _get_ancestor_package_matches(lib_pkg, app_pkg, lib_pkg_parent_dict, app_pkg_parent_dict):
+    """Get the package matches required by matching `lib_pkg` to `app_pkg`: the match itself and the matches of their parent packages, up to the root package of either side."""
+    package_matches = [(lib_pkg, app_pkg)]
+    while lib_pkg != ROOT_PKG and app_pkg != ROOT_PKG:
+        lib_pkg = lib_pkg_parent_dict[lib_pkg]
+        app_pkg = app_pkg_parent_dict[app_pkg]
+        package_matches.append((lib_pkg, app_pkg))
+
+    return package_matches
+
+
+def _get_class_match_supports(potential_class_matches, lib_method_calls, app_method_calls, lib_class_parents, app_class_parents,
+                              use_call_graph_constraints):
+    """Count the method calls and superclasses that support every potential class match, i.e., that could be matched if the class is matched."""
+    supports = dict.fromkeys(potential_class_matches, 0)
+
+    if use_call_graph_constraints:
+        for (lib_method_call, app_method_call, _) in get_method_matching_candidates(lib_method_calls, app_method_calls, supports):
+            lib_app_class1 = (lib_method_call.class1, app_method_call.class1)
+            lib_app_class2 = (lib_method_call.class2, app_method_call.class2)
+            if lib_app_class1 in supports and lib_app_class2 in supports:
+                supports[lib_app_class1] += 1
+                supports[lib_app_class2] += 1
+
+    if lib_class_parents:
+        for (lib_class, app_class) in potential_class_matches:
+            parents_match = (lib_class_parents.get(lib_class), app_class_parents.get(app_class))
+            if parents_match in supports:
+                supports[(lib_class, app_class)] += 1
+                supports[parents_match] += 1
+
+    return supports
+
+
+def _get_unmatched_method_calls(lib_to_app, lib_method_calls, app_method_calls):
+    """Get the app method calls between matched app classes that cannot be matched to distinct lib method calls between the corresponding lib classes (the method call constraints of `match`).
+
+    Returns:
+        list: The (app class, app class) pairs of the calls that cannot be matched.
+    """
+    matched_app_classes = set(lib_to_app.itervalues())
+
+    app_method_call_counts = {}
+    for app_method_call in set(app_method_calls):
+        if app_method_call.class1 in matched_app_classes and app_method_call.class2 in matched_app_classes:
+            key = (app_method_call.class1, app_method_call.class2, app_method_call.parameters1, app_method_call.parameters2)
+            app_method_call_counts.setdefault(key, []).append(app_method_call.count)
+
+    lib_method_call_counts = {}
+    for lib_method_call in set(lib_method_calls):
+        key = (lib_to_app.get(lib_method_call.class1), lib_to_app.get(lib_method_call.class2),
+               lib_method_call.parameters1, lib_method_call.parameters2)
+        if key in app_method_call_counts:
+            lib_method_call_counts.setdefault(key, []).append(lib_method_call.count)
+
+    unmatched_method_calls = []
+    for key, app_counts in sorted(app_method_call_counts.iteritems()):
+        # A lib method call can only be matched to an app method call with a smaller or equal count, so all calls can be matched iff the i-th largest lib count is at least the i-th largest app count
+        app_counts.sort(reverse=True)
+        lib_counts = sorted(lib_method_call_counts.get(key, ()), reverse=True)
+        if len(lib_counts) < len(app_counts) or any(lib_count < app_count for (lib_count, app_count) in zip(lib_counts, app_counts)):
+            unmatched_method_calls.append(key[:2])
+
+    return unmatched_method_calls
+
+
+def _remove_inconsistent_matches(class_matches, potential_class_matches, lib_method_calls, app_method_calls, app_class_weights,
+                                 lib_class_parents, app_class_parents, lib_class_interfaces, app_class_interfaces,
+                                 assume_flattened_package, use_call_graph_constraints):
+    """Remove the class matches that violate the method call, superclass or interface constraints of `match` until there are none.
+
+    If an app method call between matched classes cannot be matched to a lib method call, the match of its class with the smaller weight is removed.
+    """
+    lib_to_app = dict(class_matches)
+    app_to_lib = dict((app_class, lib_class) for (lib_class, app_class) in class_matches)
+
+    def related_classes_match(lib_class, app_class, lib_related, app_related):
+        if not assume_flattened_package:
+            return True
+        return basename(lib_class) == basename(lib_related) and basename(app_class) == basename(app_related)
+
+    def remove(lib_class):
+        del app_to_lib[lib_to_app.pop(lib_class)]
+
+    removed = True
+    while removed:
+        removed = False
+
+        # Method call matching: removing class matches never makes other method calls unmatched
+        if use_call_graph_constraints:
+            for (app_class1, app_class2) in _get_unmatched_method_calls(lib_to_app, lib_method_calls, app_method_calls):
+                if app_class1 in app_to_lib and app_class2 in app_to_lib:
+                    app_class = min((app_class1, app_class2), key=lambda c: (app_class_weights[c], c))
+                    remove(app_to_lib[app_class])
+                    removed = True
+
+        # Superclass matching
+        if lib_class_parents:
+            for (lib_class, app_class) in sorted(lib_to_app.items()):
+                parent_lib = lib_class_parents.get(lib_class)
+                parent_app = app_class_parents.get(app_class)
+                if parent_lib and parent_app:
+                    if (parent_lib, parent_app) not in potential_class_matches:
+                        consistent = False
+                    elif related_classes_match(lib_class, app_class, parent_lib, parent_app):
+                        consistent = lib_to_app.get(parent_lib) == parent_app
+                    else:
+                        consistent = True
+                elif parent_lib:
+                    consistent = False
+                else:
+                    consistent = not parent_app or parent_app not in app_to_lib
+
+                if not consistent and lib_to_app.get(lib_class) == app_class:
+                    remove(lib_class)
+                    removed = True
+
+        # Interface matching: the matched interfaces of the classes of every potential match must be matched together
+        if lib_class_interfaces:
+            for (lib_class, app_class) in potential_class_matches:
+                interfaces_lib_class = lib_class_interfaces.get(lib_class, [])
+                interfaces_app_class = app_class_interfaces.get(app_class, [])
+
+                for lib_interface in interfaces_lib_class:
+                    app_interface = lib_to_app.get(lib_interface)
+                    if app_interface is not None and not (app_interface in interfaces_app_class and related_classes_match(
+                            lib_class, app_class, lib_interface, app_interface)):
+                        remove(lib_interface)
+                        removed = True
+
+                for app_interface in interfaces_app_class:
+                    lib_interface = app_to_lib.get(app_interface)
+                    if lib_interface is not None and not (lib_interface in interfaces_lib_class and related_classes_match(
+                            lib_class, app_class, lib_interface, app_interface)):
+                        remove(lib_interface)
+                        removed = True
+
+    return set(lib_to_app.iteritems())
+
+
+def match_greedy(lib_classnames, app_classnames, potential_class_matches, lib_method_calls, app_method_calls, app_class_weights,
+                 lib_class_parents=None, app_class_parents=None, lib_class_interfaces=None, app_class_interfaces=None,
+                 use_pkg_hierarchy=True, assume_flattened_package=False, flattened_app_pkgs_allowed=None,
+                 use_call_graph_constraints=True):
+    """Approximate `match` without an integer programming solver.
+
+    The potential class matches are accepted one-to-one in the decreasing order of the number of method calls and superclasses that support them (then of their weights), if their packages are consistent with those of the accepted matches (or if they are in the same flattened package). The accepted matches that violate the method call, superclass or interface constraints are then removed, so the class matches are a feasible (but not necessarily optimal) solution of the BIP.
+
+    Returns:
+        tuple: (the objective value, the set of class matches, solvers.HEURISTIC)
+    """
+    potential_class_matches = set(potential_class_matches)
+    supports = _get_class_match_supports(potential_class_matches, lib_method_calls, app_method_calls, lib_class_parents,
+                                         app_class_parents, use_call_graph_constraints)
+
+    ordered_class_matches = sorted(potential_class_matches, key=lambda pcm: (-supports[pcm], -app_class_weights[pcm[1]], pcm))
+
+    return _accept_class_matches_in_order(ordered_class_matches, lib_classnames, app_classnames, potential_class_matches,
+                                          lib_method_calls, app_method_calls, app_class_weights, lib_class_parents, app_class_parents, lib_class_interfaces,
+                                          app_class_interfaces, use_pkg_hierarchy, assume_flattened_package,
+                                          flattened_app_pkgs_allowed, use_call_graph_constraints)
+
+
+def match_assignment(lib_classnames, app_classnames, potential_class_matches, lib_method_calls, app_method_calls, app_class_weights,
+                     lib_class_parents=None, app_class_parents=None, lib_class_interfaces=None, app_class_interfaces=None,
+                     use_pkg_hierarchy=True, assume_flattened_package=False, flattened_app_pkgs_allowed=None,
+                     use_call_graph_constraints=True):
+    """Approximate `match` with a maximum-weight one-to-one assignment between the lib and app classes.
+
+    The weight of a potential class match is the number of method calls and superclasses that support it plus the weight of its app class. The assignment is solved by the Hungarian algorithm (scipy.optimize.linear_sum_assignment) for every connected component of the potential class matches. It is solved twice: the second time, every potential class match also gets the number of class matches of the first assignment in the same lib and app packages. The assigned class matches are then accepted as in `match_greedy`, so that they satisfy the package, method call, superclass and interface constraints.
+
+    It needs no solver, and in the LibID-S mode (without the relationship constraints) it is much more accurate than `match_greedy`.
+
+    Returns:
+        tuple: (the objective value, the set of class matches, solvers.HEURISTIC)
+    """
+    potential_class_matches = set(potential_class_matches)
+    supports = _get_class_match_supports(potential_class_matches, lib_method_calls, app_method_calls, lib_class_parents,
+                                         app_class_parents, use_call_graph_constraints)
+
+    # Most class matches agree on their packages, so the package pairs of a first assignment vote for the class matches of a second one
+    class_match_weights = dict((pcm, supports[pcm] + app_class_weights[pcm[1]]) for pcm in potential_class_matches)
+    assigned_class_matches = _get_max_weight_assignment(potential_class_matches, class_match_weights)
+    package_pair_votes = Counter((dirname(lib_class), dirname(app_class)) for (lib_class, app_class) in assigned_class_matches)
+    for pcm in potential_class_matches:
+        class_match_weights[pcm] += package_pair_votes[(dirname(pcm[0]), dirname(pcm[1]))]
+    assigned_class_matches = _get_max_weight_assignment(potential_class_matches, class_match_weights)
+
+    LOGGER.debug('%d of %d potential class matches assigned', len(assigned_class_matches), len(potential_class_matches))
+
+    ordered_class_matches = sorted(assigned_class_matches, key=lambda pcm: (-class_match_weights[pcm], pcm))
+
+    return _accept_class_matches_in_order(ordered_class_matches, lib_classnames, app_classnames, potential_class_matches,
+                                          lib_method_calls, app_method_calls, app_class_weights, lib_class_parents, app_class_parents, lib_class_interfaces,
+                                          app_class_interfaces, use_pkg_hierarchy, assume_flattened_package,
+                                          flattened_app_pkgs_allowed, use_call_graph_constraints)
+
+
+def _get_max_weight_assignment(potential_class_matches, class_match_weights):
+    """Get the one-to-one assignment of the potential class matches with the maximum weight, solved by the Hungarian algorithm for every connected component."""
+    assigned_class_matches = []
+    for component in _get_class_match_components(potential_class_matches):
+        lib_classes = sorted(set(lib_class for (lib_class, _) in component))
+        app_classes = sorted(set(app_class for (_, app_class) in component))
+        lib_indices = dict((lib_class, i) for i, lib_class in enumerate(lib_classes))
+        app_indices = dict((app_class, j) for j, app_class in enumerate(app_classes))
+
+        # Every weight is positive, so that the pairs without a potential class match (weight 0) are never preferred
+        weights = np.zeros((len(lib_classes), len(app_classes)))
+        for pcm in component:
+            weights[lib_indices[pcm[0]], app_indices[pcm[1]]] = class_match_weights[pcm]
+
+        for (i, j) in zip(*linear_sum_assignment(-weights)):
+            if weights[i, j] > 0:
+                assigned_class_matches.append((lib_classes[i], app_classes[j]))
+
+    return assigned_class_matches
+
+
+def _get_class_match_components(potential_class_matches):
+    """Split the potential class matches into the connected components of the bipartite graph between the lib and app classes."""
+    G = nx.Graph()
+    # Lib and app classes may have the same name
+    G.add_edges_from(((0, lib_class), (1, app_class)) for (lib_class, app_class) in potential_class_matches)
+
+    lib_class_components = {}
+    for component_index, nodes in enumerate(nx.connected_components(G)):
+        for (side, class_name) in nodes:
+            if side == 0:
+                lib_class_components[class_name] = component_index
+
+    components = [[] for _ in xrange(len(set(lib_class_components.itervalues())))]
+    for pcm in potential_class_matches:
+        components[lib_class_components[pcm[0]]].append(pcm)
+
+    return components
+
+
+def _accept_class_matches_in_order(ordered_class_matches, lib_classnames, app_classnames, potential_class_matches,
+                                   lib_method_calls, app_method_calls, app_class_weights, lib_class_parents, app_class_parents, lib_class_interfaces,
+                                   app_class_interfaces, use_pkg_hierarchy, assume_flattened_package,
+                                   flattened_app_pkgs_allowed, use_call_graph_constraints):
+    """Accept the class matches one-to-one in the given order if their packages are consistent with those of the accepted matches, and then remove the accepted matches that violate the method call, superclass or interface constraints.
+
+    Returns:
+        tuple: (the objective value, the set of class matches, solvers.HEURISTIC)
+    """
+    lib_pkg_parent_dict = {}
+    lib_class_pkg_dict = {}
+    app_pkg_parent_dict = {}
+    app_class_pkg_dict = {}
+    process_class_hierarchy(
+        lib_classnames, lib_pkg_parent_dict, lib_class_pkg_dict, ROOT_PKG)
+    process_class_hierarchy(
+        app_classnames, app_pkg_parent_dict, app_class_pkg_dict, ROOT_PKG)
+
+    if assume_flattened_package:
+        if flattened_app_pkgs_allowed is None:
+            flattened_app_pkgs_allowed = set(app_pkg_parent_dict.keys())
+        else:
+            flattened_app_pkgs_allowed = set('/' + pkg for pkg in flattened_app_pkgs_allowed)
+    active_app_pkg = None
+
+    lib_to_app = {}
+    app_to_lib = {}
+    lib_pkg_matches = {}
+    app_pkg_matches = {}
+    for pcm in ordered_class_matches:
+        (lib_class, app_class) = pcm
+        if lib_class in lib_to_app or app_class in app_to_lib:
+            continue
+
+        if use_pkg_hierarchy:
+            # The packages of the classes and their parent packages must match one-to-one
+            package_matches = _get_ancestor_package_matches(
+                lib_class_pkg_dict[lib_class], app_class_pkg_dict[app_class], lib_pkg_parent_dict, app_pkg_parent_dict)
+
+            if not all(lib_pkg_matches.get(lib_pkg, app_pkg) == app_pkg and app_pkg_matches.get(app_pkg, lib_pkg) == lib_pkg
+                       for (lib_pkg, app_pkg) in package_matches):
+                continue
+            for (lib_pkg, app_pkg) in package_matches:
+                lib_pkg_matches[lib_pkg] = app_pkg
+                app_pkg_matches[app_pkg] = lib_pkg
+
+        elif assume_flattened_package:
+            # All matched app classes must be in one package
+            app_class_pkg = app_class_pkg_dict[app_class]
+            if app_class_pkg not in flattened_app_pkgs_allowed or active_app_pkg not in (None, app_class_pkg):
+                continue
+            active_app_pkg = app_class_pkg
+
+        lib_to_app[lib_class] = app_class
+        app_to_lib[app_class] = lib_class
+
+    class_matches = _remove_inconsistent_matches(set(lib_to_app.iteritems()), potential_class_matches, lib_method_calls,
+                                                 app_method_calls, app_class_weights, lib_class_parents, app_class_parents,
+                                                 lib_class_interfaces, app_class_interfaces, assume_flattened_package,
+                                                 use_call_graph_constraints)
+
+    matched_app_classes = set(pcm[1] for pcm in class_matches)
+    objective = sum(app_class_weights[app_class] for app_class in matched_app_classes)
+    if use_call_graph_constraints:
+        # Every app method call between matched classes is matched to one lib method call
+        methods_matched = sum(1 for app_method_call in set(app_method_calls)
+                              if app_method_call.class1 in matched_app_classes and app_method_call.class2 in matched_app_classes)
+        objective += 0.0001 * methods_matched
+
+        app_parents_and_interf_matched = 0
+        if lib_class_parents:
+            app_parents_and_interf_matched += sum(
+                1 for (app_class, app_class_parent) in app_class_parents.iteritems()
+                if app_class in matched_app_classes and app_class_parent in matched_app_classes)
+        if lib_class_interfaces:
+            app_parents_and_interf_matched += sum(
+                1 for (app_class, interfaces) in app_class_interfaces.iteritems() for interface in interfaces
+                if app_class in matched_app_classes and interface in matched_app_classes)
+        objective += 0.0001 * app_parents_and_interf_matched
+
+    LOGGER.debug('Class matches: %s', class_matches)
+    LOGGER.debug('Objective value: %0.4f', objective)
+
+    return (objective, class_matches, solvers.HEURISTIC)
 
 
 def process_class_hierarchy(classnames, parent_pkg_dict, class_pkg_dict, root):
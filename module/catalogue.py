@@ -0,0 +1,76 @@
+# @Description: Catalogue of the libraries and classes indexed by LibID
+
+"""Numeric ids for the libraries and classes of an LSH index.
+
+Every class of a library is indexed in the LSH under a key that repeats the
+library information: "lib_name|root_package|class_num|sig_num|category|->class_name"
+(see profiler.py). A `LibraryCatalogue` parses every key once, when the LSH
+is loaded, into arrays indexed by library id and by LSH entry id. The
+analyzers then aggregate the LSH candidates of an app with numpy instead of
+splitting the keys of the candidates of every app class again.
+"""
+
+import numpy as np
+
+
+class LibraryCatalogue(object):
+    """The libraries and classes indexed in an LSH.
+
+    The libraries are numbered in the order they are found in the LSH. The
+    classes are numbered by their LSH entry ids (see
+    `MinHashLSHEnsemble.query_many_ids`), which are kept until the LSH is
+    rebalanced, so the catalogue must be built again after rebalancing.
+
+    Args:
+        lsh (MinHashLSHEnsemble): The indexed LSH.
+
+    Attributes:
+        names (list): The library name ("lib_name_version") of every library.
+        root_packages (list): The root package of every library.
+        categories (list): The category of every library.
+        class_nums (numpy.array): The number of classes of every library.
+        signature_nums (numpy.array): The number of signatures of every library.
+        class_libs (numpy.array): The library id of every class, or -1 for the entry ids that are not indexed.
+        class_names (list): The name of every class, or None for the entry ids that are not indexed.
+    """
+
+    def __init__(self, lsh):
+        self.names = []
+        self.root_packages = []
+        self.categories = []
+        class_nums = []
+        signature_nums = []
+
+        lib_ids = dict()
+        class_ids = []
+        class_libs = []
+        class_names = []
+        for key, class_id in lsh.key_ids():
+            # key = "lib_name|root_package|class_num|sig_num|category|->class_name"
+            lib, class_name = key.split("->", 1)
+            if lib not in lib_ids:
+                [lib_name, root_package, class_num, signature_num,
+                 category, _] = lib.split("|")
+                lib_ids[lib] = len(self.names)
+                self.names.append(lib_name)
+                self.root_packages.append(root_package)
+                self.categories.append(category)
+                class_nums.append(int(class_num))
+                signature_nums.append(int(signature_num))
+            class_ids.append(class_id)
+            class_libs.append(lib_ids[lib])
+            class_names.append(class_name)
+
+        self.class_nums = np.array(class_nums, dtype=np.int32)
+        self.signature_nums = np.array(signature_nums, dtype=np.int32)
+
+        size = max(class_ids) + 1 if class_ids else 0
+        self.class_libs = np.empty(size, dtype=np.int32)
+        self.class_libs.fill(-1)
+        self.class_libs[class_ids] = class_libs
+        self.class_names = [None] * size
+        for class_id, class_name in zip(class_ids, class_names):
+            self.class_names[class_id] = class_name
+
+    def __len__(self):
+        return len(self.names)
@@ -6,6 +6,7 @@ from datetime import datetime
 from enum import Enum
 
 LSH_PERM_NUM = 256
+LSH_SEED = 1
 LSH_THRESHOLD = 0.8
 
 SHRINK_THRESHOLD_ACCURATE = 0.1         # The minimum percentage of library classes needed to make a decision (LibID-A mode)
@@ -14,6 +15,14 @@ SHRINK_MINIMUM_NUMBER = 5               # The minimum number of classes needed t
 PROBABILITY_THRESHOLD_ACCURATE = 0.8    # The minimum percentage of app classes needed to make a decision (LibID-A mode)
 PROBABILITY_THRESHOLD_SCALABLE = 0.8    # The minimum percentage of app classes needed to make a decision (LibID-S mode)
 
+BIP_SOLVER = 'gurobi'                   # The solver of the BIP problem. Either 'gurobi', 'cbc', 'greedy' or 'assignment'
+BIP_THREADS = 1                         # The number of threads that solve the independent parts of a BIP problem in parallel
+LIB_MATCHING_THREADS = 1                # The number of threads that match different libraries to an app in parallel
+BIP_TIME_LIMIT = 300                    # The maximum time (seconds) of solving a BIP problem. None for no limit
+BIP_NODE_LIMIT = None                   # The maximum number of branch-and-bound nodes of solving a BIP problem. None for no limit
+BIP_CACHE_PATH = None                   # The cache of solved BIP problems (e.g., ~/.cache/LibID/bip_cache.sqlite, see --bip-cache). None for no cache
+BIP_CACHE_SIZE = 100000                 # The maximum number of BIP results in the cache
+
 ANDROID_SDK_PATH = os.path.join(
     os.path.dirname(__file__), '../data/ANDROID_SDK_26.data')
 
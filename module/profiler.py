@@ -5,16 +5,21 @@
 # @Last Modified Time: Feb 12, 2019 3:31 PM
 # @Description: Profiller for LibID
 
+import base64
 import json
 import time
+from collections import OrderedDict
 from itertools import izip, repeat
 from multiprocessing import Pool
 from os import makedirs, path
 
+import numpy as np
 from datasketch import LeanMinHash, MinHash
 
+from module import binary_profile
 from module.analyzer import LibAnalyzer
-from module.config import LOGGER, LSH_PERM_NUM, MODE, SHRINK_MINIMUM_NUMBER
+from module.config import (LOGGER, LSH_PERM_NUM, LSH_SEED, MODE,
+                           SHRINK_MINIMUM_NUMBER)
 
 
 # Helper methods
@@ -29,24 +34,152 @@ def write_to_json(file_path, obj):
         fd.write(json_string)
 
 
+def write_to_binary(file_path, obj):
+    path_dir = path.dirname(file_path)
+    if not path.exists(path_dir):
+        makedirs(path_dir)
+
+    binary_profile.write_binary_profile(file_path, obj)
+
+
+# The supported profile formats: format -> (extension, writer)
+PROFILE_FORMATS = OrderedDict([
+    ("json", (".json", write_to_json)),
+    ("binary", (binary_profile.EXTENSION, write_to_binary)),
+])
+
+
+def _get_classes_minhashes(classes_signatures):
+    """Compute the MinHashes of the classes that have signatures.
+
+    Returns:
+        tuple: (the class names, the numbers of class signatures, the hash values of the class MinHashes)
+    """
+    class_names = [
+        class_name for class_name in classes_signatures
+        if classes_signatures[class_name]
+    ]
+    minhashes = MinHash.bulk(
+        [[signature.encode('utf8')
+          for signature in classes_signatures[class_name]]
+         for class_name in class_names],
+        num_perm=LSH_PERM_NUM,
+        seed=LSH_SEED)
+
+    return (class_names,
+            [len(classes_signatures[class_name]) for class_name in class_names],
+            [m.hashvalues for m in minhashes])
+
+
+def _get_signature_num(classes_signatures):
+    signature_set = set()
+    for class_name in classes_signatures:
+        signature_set.update(classes_signatures[class_name])
+
+    return len(signature_set)
+
+
+def _get_classes_minhashes_json_info(classes_signatures):
+    (class_names, sizes, hashvalues) = _get_classes_minhashes(
+        classes_signatures)
+
+    return OrderedDict([
+        ('seed', LSH_SEED),
+        ('num_perm', LSH_PERM_NUM),
+        ('signature_num', _get_signature_num(classes_signatures)),
+        ('classes', class_names),
+        ('sizes', sizes),
+        # The hash values fit in 32 bits (see datasketch/minhash.py)
+        ('hashvalues', base64.b64encode(
+            np.array(hashvalues, dtype='<u4').tobytes())),
+    ])
+
+
+def _get_profile_classes_minhashes(analyzer, lib_name_version):
+    """Get the MinHashes precomputed in a library profile.
+
+    Returns:
+        tuple: (the class names, the numbers of class signatures, the number of library signatures, the hash values of the class MinHashes), or None if the profile has no (up-to-date) MinHashes.
+    """
+    info = analyzer.classes_minhashes
+    if not info:
+        return None
+
+    if info["seed"] != LSH_SEED or info["num_perm"] != LSH_PERM_NUM:
+        LOGGER.warning(
+            "The MinHashes in the %s profile are stale (seed: %s, num_perm: %s). Recomputing",
+            lib_name_version, info["seed"], info["num_perm"])
+        return None
+
+    hashvalues = info["hashvalues"]
+    # JSON profiles store the hash values as base64
+    if isinstance(hashvalues, basestring):
+        hashvalues = np.frombuffer(
+            base64.b64decode(hashvalues), dtype='<u4')
+
+    return (info["classes"], info["sizes"], info["signature_num"],
+            hashvalues.reshape(-1, LSH_PERM_NUM))
+
+
 # Profilling related methods
 # ----------------------------------------------
 
 
+def get_profile_path(file_path, output_folder, profile_type,
+                     profile_format="json"):
+    """Get the path of the profile of a binary.
+
+    Args:
+        file_path (str): The path of the binary.
+        output_folder (str): The folder to store profiles.
+        profile_type (str): Either 'app' or 'lib'.
+        profile_format (str, optional): Defaults to "json". The profile format. Either "json" or "binary".
+    """
+    extension = PROFILE_FORMATS[profile_format][0]
+    name = path.splitext(path.basename(file_path))[0] + extension
+
+    return path.join(output_folder, profile_type, name)
+
+
+def write_profile(analyzer,
+                  profile_path,
+                  profile_type,
+                  profile_format="json",
+                  minhash=False):
+    """Write the profile of a binary loaded by an analyzer.
+
+    Args:
+        analyzer (LibAnalyzer): The analyzer of the binary.
+        profile_path (str): The path of the profile.
+        profile_type (str): Either 'app' or 'lib'.
+        profile_format (str, optional): Defaults to "json". The profile format. Either "json" or "binary".
+        minhash (bool, optional): Defaults to False. Should LibID store the MinHashes of library classes in library profiles?
+    """
+    json_info = analyzer.get_classes_signatures_json_info(
+    ) if profile_type == "app" else analyzer.get_lib_classes_signatures_json_info(
+    )
+    if minhash and profile_type == "lib":
+        json_info["classes_minhashes"] = _get_classes_minhashes_json_info(
+            json_info["classes_signatures"])
+    PROFILE_FORMATS[profile_format][1](profile_path, json_info)
+    LOGGER.info("The binary profile is stored at %s", profile_path)
+
+
 def _profiling_binary(profiling_info):
-    (file_path, output_dir, profile_type, overwrite) = profiling_info
-    name = path.splitext(path.basename(file_path))[0] + ".json"
+    (file_path, output_dir, profile_type, overwrite, profile_format,
+     minhash) = profiling_info
 
-    json_file_path = path.join(output_dir, profile_type, name)
+    json_file_path = get_profile_path(file_path, output_dir, profile_type,
+                                      profile_format)
     if overwrite or not path.exists(json_file_path):
         try:
             analyzer = LibAnalyzer(file_path)
-
-            json_info = analyzer.get_classes_signatures_json_info(
-            ) if profile_type == "app" else analyzer.get_lib_classes_signatures_json_info(
-            )
-            write_to_json(json_file_path, json_info)
-            LOGGER.info("The binary profile is stored at %s", json_file_path)
+            write_profile(
+                analyzer,
+                json_file_path,
+                profile_type,
+                profile_format=profile_format,
+                minhash=minhash)
         except Exception, e:
             LOGGER.error("error: %s", e)
             return file_path
@@ -60,8 +193,10 @@ def parallel_profiling_binaries(paths,
                                 output_folder,
                                 profile_type,
                                 processes=1,
-                                overwrite=False):
-    """Profiling Android app/library binaries to JSON files.
+                                overwrite=False,
+                                profile_format="json",
+                                minhash=False):
+    """Profiling Android app/library binaries to JSON (or binary) files.
     
     Args:
         paths (list): The list of binaries.
@@ -69,6 +204,8 @@ def parallel_profiling_binaries(paths,
         profile_type (str): Either 'app' or 'lib'.
         processes (int, optional): Defaults to 1. The number of processes to use.
         overwrite (bool, optional): Defaults to False. Should LibID overwrite the binary profile if it exists?
+        profile_format (str, optional): Defaults to "json". The profile format. Either "json" or "binary". See module/binary_profile.py for the binary format.
+        minhash (bool, optional): Defaults to False. Should LibID store the MinHashes of library classes in library profiles? This avoids computing them every time the profiles are loaded.
     """
 
     start_time = time.time()
@@ -77,13 +214,13 @@ def parallel_profiling_binaries(paths,
         failed_binaries = map(
             _profiling_binary,
             izip(paths, repeat(output_folder), repeat(profile_type),
-                 repeat(overwrite)))
+                 repeat(overwrite), repeat(profile_format), repeat(minhash)))
     else:
         pool = Pool(processes=processes)
         failed_binaries = pool.map(
             _profiling_binary,
             izip(paths, repeat(output_folder), repeat(profile_type),
-                 repeat(overwrite)))
+                 repeat(overwrite), repeat(profile_format), repeat(minhash)))
 
     end_time = time.time()
 
@@ -110,28 +247,25 @@ def _load_lib_profile(profile_path_n_mode_n_repackage):
         if mode == MODE.ACCURATE:
             relationship_graphs = analyzer.get_relationship_graphs(repackage)
 
-        classes_signatures = analyzer.get_classes_signatures()
-        signature_set = set()
-        lib_class_num = 0
-
-        for class_name in classes_signatures:
-            if classes_signatures[class_name]:
-                signature_set.update(classes_signatures[class_name])
-                lib_class_num += 1
-
-        for class_name in classes_signatures:
-            class_signatures = classes_signatures[class_name]
-
-            if class_signatures:
-                m = MinHash(num_perm=LSH_PERM_NUM)
-                for signature in class_signatures:
-                    m.update(signature.encode('utf8'))
-
-                lm = LeanMinHash(m)
-                key = "{}|{}|{}|{}|{}|->{}".format(
-                    lib_name_version, analyzer.root_package, lib_class_num,
-                    len(signature_set), analyzer.category, class_name)
-                minhash_list.append((key, lm, len(class_signatures)))
+        precomputed = _get_profile_classes_minhashes(analyzer,
+                                                     lib_name_version)
+        if precomputed:
+            (class_names, sizes, signature_num, hashvalues) = precomputed
+        else:
+            classes_signatures = analyzer.get_classes_signatures()
+            signature_num = _get_signature_num(classes_signatures)
+            (class_names, sizes, hashvalues) = _get_classes_minhashes(
+                classes_signatures)
+
+        lib_class_num = len(class_names)
+
+        for class_name, size, hvs in izip(class_names, sizes, hashvalues):
+            lm = object.__new__(LeanMinHash)
+            lm._initialize_slots(LSH_SEED, hvs)
+            key = "{}|{}|{}|{}|{}|->{}".format(
+                lib_name_version, analyzer.root_package, lib_class_num,
+                signature_num, analyzer.category, class_name)
+            minhash_list.append((key, lm, size))
 
     return (lib_name_version, minhash_list, relationship_graphs)
 
@@ -178,3 +312,53 @@ def parallel_load_libs_profile(lib_profiles,
             lib_relationship_graphs_dict[result[0]] = result[2]
 
     return (minhash_list, lib_relationship_graphs_dict)
+
+
+def _load_lib_relationship_graphs(profile_path_n_repackage):
+    (profile_path, repackage) = profile_path_n_repackage
+
+    analyzer = LibAnalyzer(profile_path)
+    lib_name_version = "{}_{}".format(analyzer.lib_name, analyzer.lib_version)
+
+    relationship_graphs = None
+    if len(analyzer.classes_names) >= SHRINK_MINIMUM_NUMBER:
+        relationship_graphs = analyzer.get_relationship_graphs(repackage)
+
+    return (lib_name_version, relationship_graphs)
+
+
+def parallel_load_libs_relationship_graphs(lib_profiles,
+                                           repackage=False,
+                                           processes=1):
+    """Loading the relation graphs of library profiles without computing their MinHashes.
+
+    This is used in the LibID-A mode when the LSH is opened from an index file.
+
+    Args:
+        lib_profiles (list): The list of library profiles.
+        repackage (bool, optional): Defaults to False. Should LibID consider classes repackaging? This should only be enabled if already know classes repackaging is applied.
+        processes (int, optional): Defaults to 1. The number of processes to use.
+
+    Returns:
+        dict: The relation graph dictionary.
+    """
+
+    LOGGER.info("Loading relation graphs of %d library profiles ...",
+                len(lib_profiles))
+
+    start_time = time.time()
+
+    if processes == 1:
+        results = map(_load_lib_relationship_graphs,
+                      izip(lib_profiles, repeat(repackage)))
+    else:
+        pool = Pool(processes=processes)
+        results = pool.map(_load_lib_relationship_graphs,
+                           izip(lib_profiles, repeat(repackage)))
+
+    end_time = time.time()
+
+    LOGGER.info("Library relation graphs loaded. Duration: %fs",
+                end_time - start_time)
+
+    return dict(results)
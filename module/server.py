@@ -0,0 +1,145 @@
+# @Description: Detection daemon for LibID
+
+import json
+import os
+import tempfile
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from multiprocessing import Pool
+from SocketServer import ThreadingMixIn
+
+from module.config import LOGGER
+
+
+class _DetectionRequestHandler(BaseHTTPRequestHandler):
+    """Handle the HTTP requests of a `DetectionServer`.
+
+    GET /status returns the server status. POST /detect runs the detection on
+    an app and returns the same JSON as the output files of the `detect`
+    subcommand. The request body is either {"path": "<app profile or binary>"}
+    or an app profile.
+    """
+
+    def do_GET(self):
+        if self.path != "/status":
+            self._send_json(404, {"error": "Not found: %s" % self.path})
+            return
+
+        self._send_json(200, {
+            "status": "ok",
+            "processes": self.server.processes,
+            "pending": self.server.pending,
+            "queue_size": self.server.queue_size
+        })
+
+    def do_POST(self):
+        if self.path != "/detect":
+            self._send_json(404, {"error": "Not found: %s" % self.path})
+            return
+
+        try:
+            length = int(self.headers.getheader("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+        except ValueError, e:
+            self._send_json(400, {"error": "Invalid request: %s" % e})
+            return
+
+        if isinstance(request, dict) and "path" in request:
+            self._detect(request["path"])
+        elif isinstance(request, dict) and "classes_signatures" in request:
+            # Posted app profiles are handed to the workers as files
+            (fd, profile_path) = tempfile.mkstemp(suffix=".json")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    json.dump(request, f)
+                self._detect(profile_path)
+            finally:
+                os.remove(profile_path)
+        else:
+            self._send_json(400, {
+                "error": "The request must contain an app path or profile"
+            })
+
+    def _detect(self, app_path):
+        if not self.server.acquire():
+            self._send_json(503, {"error": "The request queue is full"})
+            return
+
+        try:
+            result = self.server.detect(app_path)
+        except Exception, e:
+            self._send_json(500, {"error": "%s failed: %s" % (app_path, e)})
+        else:
+            self._send_json(200, result)
+        finally:
+            self.server.release()
+
+    def _send_json(self, code, obj):
+        body = json.dumps(obj)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOGGER.debug("%s - %s", self.address_string(), format % args)
+
+
+class DetectionServer(ThreadingMixIn, HTTPServer):
+    """An HTTP server that runs detections in a pool of worker processes.
+
+    The workers are forked when the server is created, so everything loaded
+    before (e.g., the LSH and the library relation graphs) is shared with them
+    instead of being loaded again for every detection. At most `queue_size`
+    requests are queued or running at the same time; further requests are
+    rejected with 503.
+
+    Args:
+        address (tuple): The (host, port) to listen on.
+        detect (function): The detection function run by the workers. It is called with (app_path, ) + detect_args and returns a JSON serializable result.
+        detect_args (tuple, optional): Defaults to (). The extra arguments of `detect`.
+        processes (int, optional): Defaults to None. The number of worker processes. If processes is None then the number returned by cpu_count() is used.
+        queue_size (int, optional): Defaults to 64. The maximum number of queued and running requests.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self,
+                 address,
+                 detect,
+                 detect_args=(),
+                 processes=None,
+                 queue_size=64):
+        HTTPServer.__init__(self, address, _DetectionRequestHandler)
+
+        self._detect = detect
+        self._detect_args = detect_args
+        self.queue_size = queue_size
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._pool = Pool(processes=processes)
+        self.processes = self._pool._processes
+
+    def acquire(self):
+        with self._lock:
+            if self.pending >= self.queue_size:
+                return False
+            self.pending += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.pending -= 1
+
+    def detect(self, app_path):
+        # A timeout keeps the waiting thread interruptible
+        return self._pool.apply_async(
+            self._detect, ((app_path, ) + self._detect_args, )).get(
+                timeout=365 * 24 * 3600)
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self._pool.terminate()
+        self._pool.join()
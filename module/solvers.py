@@ -0,0 +1,489 @@
+# @Description: Binary integer programming (BIP) solvers for LibID
+
+"""A small modelling layer for the binary integer programs (BIP) built by
+module/call_graph_matching.py, and the solvers that can optimize them.
+
+The model mirrors the subset of the gurobipy API used by LibID (addVar,
+addConstr, addGenConstrAnd, setParam, setObjective, optimize, objval,
+Var.start and Var.x), so that it can be solved by any of the SOLVERS:
+
+* gurobi: Gurobi Optimizer (requires gurobipy and a license)
+* cbc: COIN-OR CBC through PuLP, with the CBC binary of PuLP or on the PATH
+
+A model is split into its independent components (sets of variables that
+share no constraint). Small components are solved by enumeration, and the
+others by the solver, in parallel if several threads are used.
+
+The solver stops at the TimeLimit (seconds) and NodeLimit (branch-and-bound
+nodes) parameters, if they are set. The outcome is given by Model.status.
+"""
+
+import itertools
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from module.config import LOGGER
+
+LESS_EQUAL = '<='
+GREATER_EQUAL = '>='
+EQUAL = '=='
+
+# The components with at most this number of variables are solved by enumeration
+MAX_ENUMERATED_VARS = 6
+
+# Model.status after optimize
+SOLVED = 'solved'               # The solver finishes without reaching a limit
+INCUMBENT = 'incumbent'         # A limit is reached. The best solution found is used
+NO_SOLUTION = 'no_solution'     # A limit is reached before any solution is found
+HEURISTIC = 'heuristic'         # A feasible solution found without a solver, which may not be optimal
+
+
+class LinExpr(object):
+    """A linear expression of binary variables."""
+
+    def __init__(self, constant=0):
+        # The coefficients of the variables (by variable index)
+        self.coefs = dict()
+        self.constant = constant
+
+    def copy(self):
+        expr = LinExpr(self.constant)
+        expr.coefs = dict(self.coefs)
+        return expr
+
+    def _add(self, other, sign):
+        if isinstance(other, Var):
+            self.coefs[other.index] = self.coefs.get(other.index, 0) + sign
+        elif isinstance(other, LinExpr):
+            for index, coef in other.coefs.iteritems():
+                self.coefs[index] = self.coefs.get(index, 0) + sign * coef
+            self.constant += sign * other.constant
+        else:
+            self.constant += sign * other
+        return self
+
+    def _scale(self, k):
+        expr = LinExpr(k * self.constant)
+        expr.coefs = dict(
+            (index, k * coef) for index, coef in self.coefs.iteritems())
+        return expr
+
+    def __iadd__(self, other):
+        return self._add(other, 1)
+
+    def __isub__(self, other):
+        return self._add(other, -1)
+
+    def __add__(self, other):
+        return self.copy()._add(other, 1)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self.copy()._add(other, -1)
+
+    def __rsub__(self, other):
+        return self._scale(-1)._add(other, 1)
+
+    def __neg__(self):
+        return self._scale(-1)
+
+    def __mul__(self, k):
+        return self._scale(k)
+
+    __rmul__ = __mul__
+
+    def __le__(self, other):
+        return Constr(self - other, LESS_EQUAL)
+
+    def __ge__(self, other):
+        return Constr(self - other, GREATER_EQUAL)
+
+    def __eq__(self, other):
+        return Constr(self - other, EQUAL)
+
+    def get_value(self, values):
+        """Evaluate the expression given the values of all variables."""
+        return self.constant + sum(
+            coef * values[index] for index, coef in self.coefs.iteritems())
+
+
+class Var(object):
+    """A binary variable. `x` is its value in the solution, and `start` its value in the initial solution given to the solver (None if unknown)."""
+
+    __slots__ = ('index', 'name', 'x', 'start')
+
+    def __init__(self, index, name=''):
+        self.index = index
+        self.name = name
+        self.x = None
+        self.start = None
+
+    def _expr(self):
+        expr = LinExpr()
+        expr.coefs[self.index] = 1
+        return expr
+
+    def __add__(self, other):
+        return self._expr()._add(other, 1)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return self._expr()._add(other, -1)
+
+    def __rsub__(self, other):
+        return (-self._expr())._add(other, 1)
+
+    def __neg__(self):
+        return -self._expr()
+
+    def __mul__(self, k):
+        return self._expr()._scale(k)
+
+    __rmul__ = __mul__
+
+    def __le__(self, other):
+        return self._expr() <= other
+
+    def __ge__(self, other):
+        return self._expr() >= other
+
+    def __eq__(self, other):
+        return self._expr() == other
+
+
+class Constr(object):
+    """A linear constraint `expr` (<=, >= or ==) 0."""
+
+    __slots__ = ('expr', 'sense')
+
+    def __init__(self, expr, sense):
+        self.expr = expr
+        self.sense = sense
+
+    def is_satisfied(self, values):
+        value = self.expr.get_value(values)
+        if self.sense == LESS_EQUAL:
+            return value <= 1e-6
+        elif self.sense == GREATER_EQUAL:
+            return value >= -1e-6
+        return abs(value) <= 1e-6
+
+
+class Model(object):
+    """A binary integer program that maximizes its objective."""
+
+    def __init__(self, name=''):
+        self.name = name
+        self.vars = []
+        self.constrs = []
+        self.objective = LinExpr()
+        self.params = {'OutputFlag': True, 'TimeLimit': None, 'NodeLimit': None}
+        self.objval = None
+        self.status = None
+
+    def addVar(self, name=''):
+        var = Var(len(self.vars), name)
+        self.vars.append(var)
+        return var
+
+    def addConstr(self, constr):
+        # Constraints without variables are checked right away
+        if not constr.expr.coefs:
+            if not constr.is_satisfied([]):
+                raise ValueError("Infeasible constraint: %s %s 0" %
+                                 (constr.expr.constant, constr.sense))
+            return
+        self.constrs.append(constr)
+
+    def addGenConstrAnd(self, resvar, variables):
+        """Add the constraint resvar == AND(variables)."""
+        for var in variables:
+            self.addConstr(resvar <= var)
+        self.addConstr(resvar >= LinExpr(1 - len(variables)) + sum(
+            variables, LinExpr()))
+
+    def setParam(self, name, value):
+        self.params[name] = value
+
+    def setObjective(self, expr):
+        self.objective = expr if isinstance(expr, LinExpr) else LinExpr(expr)
+
+    def _get_components(self):
+        """Split the model into its independent components.
+
+        Returns:
+            list: The (variable indices, constraints) of every component.
+        """
+        parents = range(len(self.vars))
+
+        def find(index):
+            while parents[index] != index:
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+
+        for constr in self.constrs:
+            indices = iter(constr.expr.coefs)
+            root = find(next(indices))
+            for index in indices:
+                other_root = find(index)
+                if other_root != root:
+                    parents[other_root] = root
+
+        components = OrderedDict()
+        for index in xrange(len(self.vars)):
+            components.setdefault(find(index), ([], []))[0].append(index)
+        for constr in self.constrs:
+            components[find(next(iter(constr.expr.coefs)))][1].append(constr)
+
+        return components.values()
+
+    def _get_submodel(self, var_indices, constrs):
+        """Get the model of some components, whose variables are numbered in the order of `var_indices`."""
+        submodel = Model(self.name)
+        submodel.params = dict(self.params)
+
+        local_indices = dict()
+        for index in var_indices:
+            var = submodel.addVar(self.vars[index].name)
+            var.start = self.vars[index].start
+            local_indices[index] = var.index
+
+        for constr in constrs:
+            expr = LinExpr(constr.expr.constant)
+            expr.coefs = dict((local_indices[index], coef)
+                              for index, coef in constr.expr.coefs.iteritems())
+            submodel.constrs.append(Constr(expr, constr.sense))
+
+        submodel.objective.coefs = dict(
+            (local_indices[index], self.objective.coefs[index])
+            for index in var_indices if index in self.objective.coefs)
+
+        return submodel
+
+    def optimize(self, solver='gurobi', threads=1):
+        """Maximize the objective with one of the SOLVERS.
+
+        The model is split into its independent components. The components with at most MAX_ENUMERATED_VARS variables are solved by enumerating their solutions, without the solver. The other components are split into `threads` balanced groups, which are solved in parallel.
+
+        The values of the variables are then stored in their `x` attribute, the objective value in `objval` and the outcome (one of SOLVED, INCUMBENT and NO_SOLUTION) in `status`. If a group stops at a limit before finding a solution, its variables are set to 0 and the status is INCUMBENT, unless that is infeasible, in which case the status is NO_SOLUTION and `x` and `objval` are None.
+        """
+        values = [0] * len(self.vars)
+
+        solver_components = []
+        enumerated_components_num = 0
+        for (var_indices, constrs) in self._get_components():
+            component_values = None
+            if len(var_indices) <= MAX_ENUMERATED_VARS:
+                component_values = _optimize_by_enumeration(
+                    self._get_submodel(var_indices, constrs))
+
+            # Infeasible components are left to the solver
+            if component_values is None:
+                solver_components.append((var_indices, constrs))
+            else:
+                enumerated_components_num += 1
+                for index, value in zip(var_indices, component_values):
+                    values[index] = value
+
+        # Balance the groups by their number of variables
+        groups = [([], []) for _ in xrange(min(threads, len(solver_components)))]
+        for (var_indices, constrs) in sorted(solver_components, key=lambda c: -len(c[0])):
+            group = min(groups, key=lambda g: len(g[0]))
+            group[0].extend(var_indices)
+            group[1].extend(constrs)
+
+        LOGGER.debug('Optimizing with %s: %d variables, %d constraints, %d components (%d solved by enumeration)',
+                     solver, len(self.vars), len(self.constrs), enumerated_components_num + len(solver_components),
+                     enumerated_components_num)
+
+        submodels = [self._get_submodel(var_indices, constrs) for (var_indices, constrs) in groups]
+        if len(submodels) > 1:
+            pool = ThreadPool(len(submodels))
+            results = pool.map(SOLVERS[solver], submodels)
+            pool.close()
+            pool.join()
+        else:
+            results = [SOLVERS[solver](submodel) for submodel in submodels]
+
+        self.status = SOLVED
+        for ((var_indices, constrs), (status, group_values)) in zip(groups, results):
+            if status == NO_SOLUTION:
+                # Setting all variables of the group to 0 keeps the solutions of the other groups (it is feasible for the BIP of LibID)
+                if not all(constr.is_satisfied(values) for constr in constrs):
+                    self.status = NO_SOLUTION
+                    break
+                LOGGER.warning('%s stopped at a limit before finding a solution of a group of %d variables, which are set to 0',
+                               solver, len(var_indices))
+                status = INCUMBENT
+                group_values = [0] * len(var_indices)
+            if status == INCUMBENT:
+                self.status = INCUMBENT
+            for index, value in zip(var_indices, group_values):
+                values[index] = value
+
+        if self.status == NO_SOLUTION:
+            LOGGER.warning('%s stopped at a limit before finding a solution', solver)
+            for var in self.vars:
+                var.x = None
+            self.objval = None
+            return
+        elif self.status == INCUMBENT:
+            LOGGER.warning('%s stopped at a limit, the best solution found is used', solver)
+
+        for var, value in zip(self.vars, values):
+            var.x = value
+        self.objval = self.objective.get_value(values)
+
+
+def _optimize_by_enumeration(model):
+    """Find the best solution of a small model by enumerating all assignments of its variables.
+
+    Returns:
+        list: The values of the variables, or None if the model is infeasible.
+    """
+    best_objval = None
+    best_values = None
+    for values in itertools.product((0, 1), repeat=len(model.vars)):
+        if all(constr.is_satisfied(values) for constr in model.constrs):
+            objval = model.objective.get_value(values)
+            if best_objval is None or objval > best_objval + 1e-9:
+                (best_objval, best_values) = (objval, list(values))
+
+    return best_values
+
+
+# Solver backends
+# ----------------------------------------------
+# A backend takes a model and returns its status (SOLVED, INCUMBENT or
+# NO_SOLUTION) and the values of its variables (None if NO_SOLUTION)
+
+
+# The Gurobi environment of every thread. Gurobi environments are not
+# thread-safe, and models are solved in parallel threads (by Model.optimize
+# and by the analyzers that match several libraries at once)
+_gurobi_envs = threading.local()
+
+
+def _optimize_with_gurobi(model):
+    try:
+        from gurobipy import GRB, Env, LinExpr as GurobiLinExpr, Model as GurobiModel
+    except ImportError:
+        raise ImportError(
+            "The gurobi solver requires gurobipy. Use another solver (e.g., --solver cbc) if Gurobi is not installed"
+        )
+
+    if not hasattr(_gurobi_envs, 'env'):
+        _gurobi_envs.env = Env()
+    m = GurobiModel(model.name, env=_gurobi_envs.env)
+    m.setParam('OutputFlag', model.params['OutputFlag'])
+    if model.params['TimeLimit'] is not None:
+        m.setParam('TimeLimit', model.params['TimeLimit'])
+    if model.params['NodeLimit'] is not None:
+        m.setParam('NodeLimit', model.params['NodeLimit'])
+
+    gurobi_vars = [m.addVar(vtype=GRB.BINARY, name=var.name)
+                   for var in model.vars]
+    for var, gurobi_var in zip(model.vars, gurobi_vars):
+        if var.start is not None:
+            gurobi_var.start = var.start
+
+    def to_gurobi_expr(expr):
+        items = expr.coefs.items()
+        return GurobiLinExpr([coef for (_, coef) in items],
+                             [gurobi_vars[index] for (index, _) in items])
+
+    for constr in model.constrs:
+        lhs = to_gurobi_expr(constr.expr)
+        rhs = -constr.expr.constant
+        if constr.sense == LESS_EQUAL:
+            m.addConstr(lhs <= rhs)
+        elif constr.sense == GREATER_EQUAL:
+            m.addConstr(lhs >= rhs)
+        else:
+            m.addConstr(lhs == rhs)
+
+    m.setObjective(to_gurobi_expr(model.objective), GRB.MAXIMIZE)
+    m.optimize()
+
+    if m.SolCount == 0:
+        return NO_SOLUTION, None
+    status = INCUMBENT if m.status in (GRB.TIME_LIMIT, GRB.NODE_LIMIT) else SOLVED
+
+    return status, [var.x for var in gurobi_vars]
+
+
+def _optimize_with_cbc(model):
+    try:
+        import pulp
+    except ImportError:
+        raise ImportError(
+            "The cbc solver requires PuLP, which can be installed by: pip install pulp==2.4"
+        )
+
+    senses = {
+        LESS_EQUAL: pulp.LpConstraintLE,
+        GREATER_EQUAL: pulp.LpConstraintGE,
+        EQUAL: pulp.LpConstraintEQ,
+    }
+
+    problem = pulp.LpProblem(model.name or 'LibID', pulp.LpMaximize)
+    pulp_vars = [pulp.LpVariable('x%d' % var.index, cat=pulp.LpBinary)
+                 for var in model.vars]
+    warm_start = False
+    for var, pulp_var in zip(model.vars, pulp_vars):
+        if var.start is not None:
+            pulp_var.setInitialValue(var.start)
+            warm_start = True
+
+    def to_pulp_expr(expr):
+        return pulp.LpAffineExpression(
+            [(pulp_vars[index], coef)
+             for index, coef in expr.coefs.iteritems()])
+
+    problem += to_pulp_expr(model.objective)
+    for constr in model.constrs:
+        problem += pulp.LpConstraint(
+            to_pulp_expr(constr.expr),
+            sense=senses[constr.sense],
+            rhs=-constr.expr.constant)
+
+    options = []
+    if model.params['NodeLimit'] is not None:
+        options.append('maxNodes %d' % model.params['NodeLimit'])
+
+    cbc_args = dict(msg=bool(model.params['OutputFlag']), warmStart=warm_start,
+                    timeLimit=model.params['TimeLimit'], options=options)
+    cbc = pulp.PULP_CBC_CMD(**cbc_args)
+    if not cbc.available():
+        # The CBC binary is not shipped with every PuLP distribution (e.g., the source distribution installed by Python 2)
+        cbc = pulp.COIN_CMD(**cbc_args)
+        if not cbc.available():
+            raise RuntimeError(
+                "The cbc solver requires a CBC binary, which can be installed by: apt-get install coinor-cbc"
+            )
+    problem.solve(cbc)
+
+    if problem.sol_status == pulp.LpSolutionNoSolutionFound:
+        return NO_SOLUTION, None
+    values = [var.varValue or 0 for var in pulp_vars]
+
+    if problem.sol_status == pulp.LpSolutionIntegerFeasible:
+        # CBC may stop at a limit with the solution of the LP relaxation
+        if any(abs(value - round(value)) > 1e-6 for value in values):
+            return NO_SOLUTION, None
+        values = [round(value) for value in values]
+        if not all(constr.is_satisfied(values) for constr in model.constrs):
+            return NO_SOLUTION, None
+        return INCUMBENT, values
+
+    return SOLVED, values
+
+
+SOLVERS = OrderedDict([
+    ('gurobi', _optimize_with_gurobi),
+    ('cbc', _optimize_with_cbc),
+])